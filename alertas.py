@@ -0,0 +1,330 @@
+"""
+Alertas de proximidad: detecciones nuevas cerca de localidades, rutas y áreas protegidas
+
+Referencias:
+    datos/localidades.csv        localidades (nombre, lat, lon; centro urbano aproximado)
+    datos/referencias.geojson    opcional: Point (localidad), LineString (ruta),
+                                 Polygon/MultiPolygon (área protegida); propiedades
+                                 'nombre' y opcionalmente 'tipo' y 'umbral_km'
+
+Cada referencia se indexa en una grilla (geometria.IndiceGrilla) ampliada por
+su umbral, así cada detección se compara sólo con las referencias de su celda
+y las distancias se calculan por lotes. ALERTAS_ESTADO recuerda, por salida,
+las alertas ya enviadas para no repetirlas entre corridas. Si una salida falla,
+la etapa 'alerts' termina con error y no queda en caché. En el próximo intento
+las alertas se reenvían sólo a las salidas que no las recibieron. El pipeline
+corre esa etapa aparte: su fallo no frena la publicación del dashboard.
+
+Salidas (ALERTAS_SALIDAS, separadas por coma):
+    archivo:alertas.jsonl     una línea JSON por alerta
+    webhook:https://...       POST {"alertas": [...]}
+    tabla:alertas             upsert en una tabla de Supabase (clave 'id')
+"""
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from geometria import IndiceGrilla, haversine_km, distancia_linea_km, distancia_poligono_km
+
+DIRECTORIO_DATOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos')
+ARCHIVO_LOCALIDADES = os.path.join(DIRECTORIO_DATOS, 'localidades.csv')
+ARCHIVO_REFERENCIAS = os.environ.get("REFERENCIAS_ALERTAS", os.path.join(DIRECTORIO_DATOS, 'referencias.geojson'))
+ARCHIVO_ESTADO = os.environ.get("ALERTAS_ESTADO", "alertas_estado.json")
+
+# Distancia a partir de la cual una detección genera alerta, por tipo de referencia
+UMBRALES_KM = {
+    'localidad': 10.0,
+    'ruta': 2.0,
+    'area_protegida': 5.0
+}
+
+# Sólo se consideran nuevas las detecciones de las últimas horas
+VENTANA_HORAS = 48
+
+# Días que se recuerdan las alertas enviadas
+RETENCION_DIAS = 14
+
+TIPOS_GEOMETRIA = {
+    'Point': 'localidad',
+    'LineString': 'ruta',
+    'MultiLineString': 'ruta',
+    'Polygon': 'area_protegida',
+    'MultiPolygon': 'area_protegida'
+}
+
+
+# ============================================================
+# REFERENCIAS
+# ============================================================
+
+class Referencias:
+    """Localidades, rutas y áreas protegidas indexadas en una grilla"""
+
+    def __init__(self, paso_indice=0.5):
+        self.elementos = []  # dicts: nombre, tipo, umbral_km, geometria, partes
+        self.indice = IndiceGrilla(paso_indice)
+
+    @classmethod
+    def cargar(cls, localidades=ARCHIVO_LOCALIDADES, geojson=ARCHIVO_REFERENCIAS):
+        referencias = cls()
+        if os.path.exists(localidades):
+            for fila in pd.read_csv(localidades).itertuples(index=False):
+                referencias.agregar(fila.nombre, 'localidad', 'Point', [[[fila.lon, fila.lat]]])
+        if geojson and os.path.exists(geojson):
+            with open(geojson, encoding='utf-8') as f:
+                for feature in json.load(f).get('features', []):
+                    referencias.agregar_feature(feature)
+        print(f"📍 Referencias para alertas: {referencias.resumen()}")
+        return referencias
+
+    def agregar_feature(self, feature):
+        geometria = feature['geometry']
+        propiedades = feature.get('properties') or {}
+        tipo_geometria = geometria['type']
+        if tipo_geometria not in TIPOS_GEOMETRIA:
+            return
+        tipo = propiedades.get('tipo') or TIPOS_GEOMETRIA[tipo_geometria]
+        coordenadas = geometria['coordinates']
+        # Normalizar a una lista de partes con la forma de cada tipo simple
+        if tipo_geometria == 'Point':
+            partes = [[coordenadas]]
+        elif tipo_geometria in ('LineString', 'Polygon'):
+            partes = [coordenadas]
+        else:
+            partes = coordenadas
+        self.agregar(propiedades.get('nombre', 'sin nombre'), tipo, tipo_geometria.replace('Multi', ''),
+                     partes, propiedades.get('umbral_km'))
+
+    def agregar(self, nombre, tipo, geometria, partes, umbral_km=None):
+        """
+        geometria: 'Point', 'LineString' o 'Polygon'
+        partes: lista de partes; cada una [[lon, lat]] (punto), [[lon, lat], ...] (línea)
+                o [anillo_exterior, agujero, ...] (polígono)
+        """
+        umbral_km = float(umbral_km if umbral_km is not None else UMBRALES_KM.get(tipo, 5.0))
+        if geometria == 'Polygon':
+            partes = [[np.asarray(anillo, dtype=float) for anillo in poligono] for poligono in partes]
+            vertices = np.concatenate([poligono[0] for poligono in partes])
+        else:
+            partes = [np.asarray(parte, dtype=float) for parte in partes]
+            vertices = np.concatenate(partes)
+
+        identificador = len(self.elementos)
+        self.elementos.append({'nombre': nombre, 'tipo': tipo, 'umbral_km': umbral_km,
+                               'geometria': geometria, 'partes': partes})
+        self.indice.agregar(identificador, vertices[:, 1].min(), vertices[:, 0].min(),
+                            vertices[:, 1].max(), vertices[:, 0].max(), margen_km=umbral_km)
+
+    def resumen(self):
+        tipos = pd.Series([e['tipo'] for e in self.elementos], dtype=object).value_counts()
+        return ', '.join(f"{cantidad} {tipo}" for tipo, cantidad in tipos.items()) or 'ninguna'
+
+    def distancias(self, identificador, lat, lon):
+        """Distancia en km de cada punto a una referencia"""
+        elemento = self.elementos[identificador]
+        if elemento['geometria'] == 'Point':
+            return np.min([haversine_km(lat, lon, p[0, 1], p[0, 0]) for p in elemento['partes']], axis=0)
+        if elemento['geometria'] == 'LineString':
+            return np.min([distancia_linea_km(lat, lon, p) for p in elemento['partes']], axis=0)
+        return np.min([distancia_poligono_km(lat, lon, p) for p in elemento['partes']], axis=0)
+
+    def evaluar(self, df):
+        """
+        Alertas para un lote de detecciones: una fila por (detección, referencia)
+        a menos del umbral de la referencia
+        """
+        lat = df['latitude'].to_numpy(dtype=float)
+        lon = df['longitude'].to_numpy(dtype=float)
+        filas = []
+        for identificador, indices in self.indice.candidatos(lat, lon).items():
+            elemento = self.elementos[identificador]
+            distancia = self.distancias(identificador, lat[indices], lon[indices])
+            cerca = distancia <= elemento['umbral_km']
+            if cerca.any():
+                filas.append(pd.DataFrame({
+                    'posicion': indices[cerca],
+                    'referencia': elemento['nombre'],
+                    'tipo': elemento['tipo'],
+                    'distancia_km': np.round(distancia[cerca], 2)
+                }))
+        if not filas:
+            return pd.DataFrame(columns=['posicion', 'referencia', 'tipo', 'distancia_km'])
+        return pd.concat(filas, ignore_index=True).sort_values(['posicion', 'distancia_km'], ignore_index=True)
+
+
+# ============================================================
+# SALIDAS
+# ============================================================
+
+class SalidaArchivo:
+    """Agrega las alertas a un archivo JSONL"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.clave = f"archivo:{ruta}"
+
+    def enviar(self, alertas):
+        with open(self.ruta, 'a', encoding='utf-8') as f:
+            for alerta in alertas:
+                f.write(json.dumps(alerta, ensure_ascii=False) + "\n")
+
+
+class SalidaWebhook:
+    """Envía las alertas por POST a una URL"""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+        self.clave = f"webhook:{url}"
+
+    def enviar(self, alertas):
+        import requests
+        respuesta = requests.post(self.url, json={'alertas': alertas}, timeout=self.timeout)
+        respuesta.raise_for_status()
+
+
+class SalidaTabla:
+    """Upsert de las alertas en una tabla de Supabase (idempotente por 'id')"""
+
+    def __init__(self, tabla='alertas', cliente=None):
+        self.tabla = tabla
+        self.cliente = cliente
+        self.clave = f"tabla:{tabla}"
+
+    def enviar(self, alertas):
+        if self.cliente is None:
+            from supabase import create_client
+            from publicacion import SUPABASE_URL, clave_escritura
+            self.cliente = create_client(SUPABASE_URL, clave_escritura())
+        self.cliente.table(self.tabla).upsert(alertas).execute()
+
+
+TIPOS_SALIDA = {
+    'archivo': SalidaArchivo,
+    'webhook': SalidaWebhook,
+    'tabla': SalidaTabla
+}
+
+
+def salidas_desde_entorno(valor=None):
+    """Salidas configuradas como 'tipo:destino' separadas por coma"""
+    valor = valor if valor is not None else os.environ.get("ALERTAS_SALIDAS", "archivo:alertas.jsonl")
+    salidas = []
+    for especificacion in filter(None, (v.strip() for v in valor.split(','))):
+        tipo, _, destino = especificacion.partition(':')
+        if tipo not in TIPOS_SALIDA:
+            raise ValueError(f"Salida de alertas desconocida: {tipo} (opciones: {', '.join(TIPOS_SALIDA)})")
+        salidas.append(TIPOS_SALIDA[tipo](destino) if destino else TIPOS_SALIDA[tipo]())
+    return salidas
+
+
+# ============================================================
+# PROCESO
+# ============================================================
+
+def id_alerta(fila):
+    """Id estable de una alerta: detección + referencia"""
+    clave = f"{fila['latitude']:.4f},{fila['longitude']:.4f},{fila['fecha_deteccion']}|{fila['tipo']}|{fila['referencia']}"
+    return hashlib.sha256(clave.encode('utf-8')).hexdigest()[:16]
+
+
+def _cargar_estado(ruta, salidas):
+    """{clave de salida: {id de alerta: fecha de detección}} de las alertas ya enviadas"""
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if estado and 'salidas' not in estado:
+        # Formato anterior ({id: fecha} para todas las salidas juntas)
+        return {salida.clave: dict(estado) for salida in salidas}
+    return estado.get('salidas', {})
+
+
+def _guardar_estado(ruta, estado, ahora):
+    limite = (ahora - timedelta(days=RETENCION_DIAS)).strftime('%Y-%m-%dT%H:%M')
+    estado = {'salidas': {salida: {clave: fecha for clave, fecha in enviadas.items() if fecha >= limite}
+                          for salida, enviadas in estado.items()}}
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(estado, f)
+    os.replace(temporal, ruta)
+
+
+def procesar_alertas(df, referencias=None, salidas=None, ahora=None, ruta_estado=ARCHIVO_ESTADO,
+                     notificar=None):
+    """
+    Evalúa las detecciones recientes, envía a cada salida las alertas que todavía
+    no recibió y las recuerda por salida. Retorna el DataFrame de alertas nuevas
+    (las que no había recibido ninguna salida)
+    ahora: fecha de referencia; sin zona horaria se toma como hora local. Todo se compara en UTC
+    Lanza RuntimeError si alguna salida falla (después de intentar con todas y
+    de guardar lo que sí se envió)
+    """
+    ahora = (ahora or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    referencias = referencias if referencias is not None else Referencias.cargar()
+    salidas = salidas if salidas is not None else salidas_desde_entorno()
+
+    if df is None or len(df) == 0 or not referencias.elementos:
+        return pd.DataFrame()
+
+    # Hora de adquisición (UTC, HHMM) → marca de tiempo
+    hora = df['acq_time'].astype(int)
+    fecha_deteccion = (pd.to_datetime(df['acq_date']).dt.tz_localize('UTC')
+                       + pd.to_timedelta(hora // 100, unit='h') + pd.to_timedelta(hora % 100, unit='m'))
+    recientes = df.loc[fecha_deteccion >= ahora - timedelta(hours=VENTANA_HORAS)]
+    recientes = recientes.assign(fecha_deteccion=fecha_deteccion[recientes.index].dt.strftime('%Y-%m-%dT%H:%M'))
+
+    cercanas = referencias.evaluar(recientes)
+    if cercanas.empty:
+        print(f"🔔 Alertas: ninguna detección reciente cerca de las referencias ({len(recientes)} evaluadas)")
+        return pd.DataFrame()
+
+    detalle = recientes.iloc[cercanas['posicion'].to_numpy()].reset_index(drop=True)
+    alertas = pd.DataFrame({
+        'latitude': detalle['latitude'].round(4),
+        'longitude': detalle['longitude'].round(4),
+        'fecha_deteccion': detalle['fecha_deteccion'],
+        'frp': detalle['frp'],
+        'referencia': cercanas['referencia'],
+        'tipo': cercanas['tipo'],
+        'distancia_km': cercanas['distancia_km']
+    })
+    alertas.insert(0, 'id', alertas.apply(id_alerta, axis=1))
+
+    estado = _cargar_estado(ruta_estado, salidas)
+    alertas = alertas.drop_duplicates('id')
+    ya_enviadas = set().union(*estado.values()) if estado else set()
+    nuevas = alertas[~alertas['id'].isin(ya_enviadas)]
+    pendientes = {salida.clave: alertas[~alertas['id'].isin(estado.get(salida.clave, {}))] for salida in salidas}
+    print(f"🔔 Alertas: {len(nuevas)} nuevas ({len(alertas) - len(nuevas)} ya enviadas) "
+          f"de {len(recientes)} detecciones recientes")
+
+    fallidas = []
+    for salida in salidas:
+        if pendientes[salida.clave].empty:
+            continue
+        registros = json.loads(pendientes[salida.clave].to_json(orient='records', force_ascii=False))
+        try:
+            salida.enviar(registros)
+        except Exception as e:
+            print(f"⚠️  No se pudieron enviar {len(registros)} alertas a {salida.clave}: {e}")
+            fallidas.append(f"{salida.clave}: {e}")
+            continue
+        estado.setdefault(salida.clave, {}).update({r['id']: r['fecha_deteccion'] for r in registros})
+    _guardar_estado(ruta_estado, estado, ahora)
+
+    if notificar is not None:
+        # Al dashboard van las nuevas que llegaron a alguna salida (las demás se anuncian al reintentar)
+        entregadas = nuevas[nuevas['id'].isin(set().union(*estado.values()) if estado else set())]
+        for registro in json.loads(entregadas.to_json(orient='records', force_ascii=False)):
+            notificar('alerta', **{k: registro[k] for k in ('referencia', 'tipo', 'distancia_km', 'fecha_deteccion')})
+
+    # Lo no enviado queda pendiente sólo para las salidas que fallaron: se reintenta en la próxima corrida
+    if fallidas:
+        raise RuntimeError(f"Alertas sin enviar ({'; '.join(fallidas)})")
+    return nuevas
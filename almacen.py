@@ -0,0 +1,133 @@
+"""
+Almacén de detecciones particionado por mes
+
+Cada mes es un archivo Parquet (<directorio>/<AAAA-MM>.parquet), así las
+corridas de investigación sobre varias temporadas procesan una partición por
+vez y la memoria queda acotada a un mes de detecciones, sin importar cuántos
+años haya en el archivo.
+
+Uso:
+    python almacen.py ingerir 2023-01-01 2025-12-31 --fuente VIIRS_SNPP_SP
+    python almacen.py procesar --confianza 70
+"""
+import os
+import sys
+import glob
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+DIRECTORIO_ALMACEN = os.environ.get("ALMACEN_DETECCIONES", "almacen_detecciones")
+
+# Columnas que identifican una detección (mismo criterio que obtener_datos_rango_fechas)
+CLAVE_DETECCION = ['latitude', 'longitude', 'acq_date', 'acq_time']
+
+
+def nombre_particion(fecha):
+    """Partición ('AAAA-MM') de una fecha o de un texto 'AAAA-MM[-DD]'"""
+    if isinstance(fecha, str):
+        return fecha[:7]
+    return fecha.strftime('%Y-%m')
+
+
+class AlmacenDetecciones:
+    """Detecciones en archivos Parquet mensuales"""
+
+    def __init__(self, directorio=DIRECTORIO_ALMACEN):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, particion):
+        return os.path.join(self.directorio, f"{particion}.parquet")
+
+    def particiones(self, desde=None, hasta=None):
+        """Particiones existentes, en orden, opcionalmente limitadas a un rango de meses"""
+        nombres = sorted(
+            os.path.basename(ruta)[:-len('.parquet')]
+            for ruta in glob.glob(os.path.join(self.directorio, '*.parquet'))
+        )
+        if desde is not None:
+            nombres = [n for n in nombres if n >= nombre_particion(desde)]
+        if hasta is not None:
+            nombres = [n for n in nombres if n <= nombre_particion(hasta)]
+        return nombres
+
+    def leer(self, particion, columnas=None):
+        """DataFrame de una partición (vacío si no existe)"""
+        if not os.path.exists(self._ruta(particion)):
+            return pd.DataFrame(columns=columnas or CLAVE_DETECCION)
+        return pd.read_parquet(self._ruta(particion), columns=columnas)
+
+    def iterar(self, desde=None, hasta=None, columnas=None):
+        """Genera (partición, DataFrame) de a una partición por vez"""
+        for particion in self.particiones(desde, hasta):
+            yield particion, self.leer(particion, columnas)
+
+    def escribir(self, particion, df):
+        """Reemplaza una partición (escritura atómica)"""
+        temporal = self._ruta(particion) + '.tmp'
+        df.to_parquet(temporal, index=False)
+        os.replace(temporal, self._ruta(particion))
+
+    def agregar(self, df):
+        """
+        Incorpora detecciones a sus particiones sin duplicar las ya guardadas
+        Retorna la cantidad de detecciones nuevas
+        """
+        nuevas = 0
+        for particion, grupo in df.groupby(df['acq_date'].dt.strftime('%Y-%m'), sort=True):
+            existente = self.leer(particion)
+            combinado = (pd.concat([existente, grupo], ignore_index=True)
+                         if len(existente) else grupo.reset_index(drop=True))
+            combinado = combinado.drop_duplicates(subset=CLAVE_DETECCION).sort_values(
+                ['acq_date', 'acq_time'], kind='stable', ignore_index=True)
+            nuevas += len(combinado) - len(existente)
+            self.escribir(particion, combinado)
+        return nuevas
+
+    def procesar(self, funcion, destino, desde=None, hasta=None):
+        """
+        Aplica funcion(df) → df a cada partición y guarda el resultado en otro almacén
+        Sólo una partición está en memoria a la vez. Retorna las particiones escritas
+        """
+        escritas = []
+        for particion, df in self.iterar(desde, hasta):
+            resultado = funcion(df)
+            if resultado is not None and len(resultado) > 0:
+                destino.escribir(particion, resultado)
+                escritas.append(particion)
+        return escritas
+
+
+if __name__ == "__main__":
+    from incendios_v2 import AnalizadorIncendiosHistorico
+
+    parser = argparse.ArgumentParser(description="Almacén de detecciones particionado por mes")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    ingerir = subcomandos.add_parser('ingerir', help="descargar un rango de FIRMS al almacén")
+    ingerir.add_argument('desde', type=datetime.fromisoformat)
+    ingerir.add_argument('hasta', type=datetime.fromisoformat)
+    ingerir.add_argument('--fuente', default='VIIRS_SNPP_NRT')
+
+    procesar = subcomandos.add_parser('procesar', help="filtrar y analizar el almacén partición por partición")
+    procesar.add_argument('--confianza', type=int, default=70)
+    procesar.add_argument('--desde')
+    procesar.add_argument('--hasta')
+    procesar.add_argument('--destino', default=DIRECTORIO_ALMACEN + '_procesado')
+
+    args = parser.parse_args()
+    analizador = AnalizadorIncendiosHistorico(os.environ.get("MAP_KEY", "a66ff23e6b0f370791cb4bd2dd3123d0"))
+    almacen = AlmacenDetecciones()
+
+    if args.comando == 'ingerir':
+        _, fallidos = analizador.ingerir_en_almacen(almacen, args.desde, args.hasta, args.fuente)
+        # Con bloques sin descargar se sale con error: volver a correr completa lo que falta
+        if fallidos:
+            sys.exit(1)
+    else:
+        analizador.generar_reporte_particionado(
+            almacen, AlmacenDetecciones(args.destino), confianza_minima=args.confianza,
+            desde=args.desde, hasta=args.hasta
+        )
@@ -0,0 +1,125 @@
+"""
+Archivo de respuestas de FIRMS y Open-Meteo para reconstrucciones sin red
+
+Modo 'grabar': cada respuesta se guarda comprimida (gzip) y direccionada por
+contenido en objetos/, y la sesión registra qué respuesta correspondió a cada
+pedido en sesiones/<id>.jsonl. Respuestas repetidas entre sesiones se guardan
+una sola vez.
+
+Modo 'reproducir': los pedidos se responden desde una sesión grabada (la más
+reciente o la indicada), con la misma fecha de referencia que la grabación.
+Un pedido que no está en la sesión lanza RespuestaNoArchivada y corta la
+reconstrucción: no se reemplaza por los valores por defecto de un error de red.
+
+Se activa con variables de entorno:
+    ARCHIVO_RESPUESTAS=grabar|reproducir
+    ARCHIVO_RESPUESTAS_DIR=archivo_respuestas   (opcional)
+    ARCHIVO_RESPUESTAS_SESION=<id>              (opcional, para reproducir)
+"""
+import os
+import json
+import gzip
+import glob
+import hashlib
+from datetime import datetime
+
+MODOS = ('grabar', 'reproducir')
+
+
+class RespuestaNoArchivada(KeyError):
+    """El pedido no figura en la sesión que se está reproduciendo"""
+
+
+def clave_pedido(url, params=None):
+    """Clave estable de un pedido: URL + parámetros ordenados"""
+    contenido = json.dumps({'url': url, 'params': params or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+class ArchivoRespuestas:
+    """Graba o reproduce respuestas HTTP de texto"""
+
+    def __init__(self, directorio='archivo_respuestas', modo='grabar', sesion=None):
+        if modo not in MODOS:
+            raise ValueError(f"Modo inválido: {modo} (usar {' o '.join(MODOS)})")
+
+        self.directorio = directorio
+        self.modo = modo
+        os.makedirs(os.path.join(directorio, 'objetos'), exist_ok=True)
+        os.makedirs(os.path.join(directorio, 'sesiones'), exist_ok=True)
+
+        if modo == 'grabar':
+            self.fecha_referencia = datetime.now()
+            self.sesion = sesion or self.fecha_referencia.strftime('%Y%m%dT%H%M%S')
+            self._respuestas = {}
+            self._escribir_linea({'fecha_referencia': self.fecha_referencia.isoformat()})
+        else:
+            self.sesion = sesion or self._ultima_sesion()
+            self._cargar_sesion()
+
+    @classmethod
+    def desde_entorno(cls):
+        """Archivo configurado por variables de entorno, o None si no está activado"""
+        modo = os.environ.get("ARCHIVO_RESPUESTAS")
+        if not modo:
+            return None
+        return cls(
+            directorio=os.environ.get("ARCHIVO_RESPUESTAS_DIR", "archivo_respuestas"),
+            modo=modo,
+            sesion=os.environ.get("ARCHIVO_RESPUESTAS_SESION")
+        )
+
+    @property
+    def reproduciendo(self):
+        return self.modo == 'reproducir'
+
+    def _ruta_sesion(self, sesion=None):
+        return os.path.join(self.directorio, 'sesiones', f"{sesion or self.sesion}.jsonl")
+
+    def _ruta_objeto(self, digest):
+        return os.path.join(self.directorio, 'objetos', digest[:2], f"{digest}.gz")
+
+    def _ultima_sesion(self):
+        sesiones = sorted(glob.glob(os.path.join(self.directorio, 'sesiones', '*.jsonl')))
+        if not sesiones:
+            raise FileNotFoundError(f"No hay sesiones grabadas en {self.directorio}")
+        return os.path.basename(sesiones[-1])[:-len('.jsonl')]
+
+    def _escribir_linea(self, registro):
+        with open(self._ruta_sesion(), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    def _cargar_sesion(self):
+        self._respuestas = {}
+        with open(self._ruta_sesion(), encoding='utf-8') as f:
+            cabecera = json.loads(f.readline())
+            self.fecha_referencia = datetime.fromisoformat(cabecera['fecha_referencia'])
+            for linea in f:
+                registro = json.loads(linea)
+                self._respuestas[registro['clave']] = registro['objeto']
+        print(f"📼 Reproduciendo sesión {self.sesion} ({len(self._respuestas)} respuestas, "
+              f"referencia {self.fecha_referencia.strftime('%d/%m/%Y %H:%M')})")
+
+    def guardar(self, url, params, texto):
+        """Archiva una respuesta (sólo en modo grabar)"""
+        datos = texto.encode('utf-8')
+        digest = hashlib.sha256(datos).hexdigest()
+        ruta = self._ruta_objeto(digest)
+        if not os.path.exists(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            temporal = ruta + '.tmp'
+            with gzip.open(temporal, 'wb') as f:
+                f.write(datos)
+            os.replace(temporal, ruta)
+
+        clave = clave_pedido(url, params)
+        self._respuestas[clave] = digest
+        self._escribir_linea({'clave': clave, 'objeto': digest, 'url': url, 'params': params})
+
+    def leer(self, url, params):
+        """Texto archivado para un pedido (sólo en modo reproducir)"""
+        digest = self._respuestas.get(clave_pedido(url, params))
+        if digest is None:
+            raise RespuestaNoArchivada(f"Pedido no archivado en la sesión {self.sesion}: {url}")
+        with gzip.open(self._ruta_objeto(digest), 'rb') as f:
+            return f.read().decode('utf-8')
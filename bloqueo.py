@@ -0,0 +1,68 @@
+"""
+Bloqueo de ejecución del pipeline compartido por la app web y el planificador
+
+El proceso del pipeline toma un flock exclusivo sobre ARCHIVO_BLOQUEO y lo
+mantiene mientras corre; el sistema lo libera al terminar, aunque el proceso
+muera sin limpiar. Quien quiera saber si hay una corrida en curso intenta
+tomarlo sin esperar: no hace falta leer PIDs ni recolectar procesos hijos.
+
+Un pipeline lanzado mientras otro corre no espera: sale con CODIGO_EN_CURSO.
+Así dos lanzamientos simultáneos nunca ejecutan dos corridas a la vez.
+"""
+import os
+import sys
+import fcntl
+import subprocess
+
+DIRECTORIO_APP = os.path.dirname(os.path.abspath(__file__))
+
+ARCHIVO_BLOQUEO = os.environ.get("BLOQUEO_PIPELINE", os.path.join(DIRECTORIO_APP, ".pipeline.lock"))
+LOG_PIPELINE = os.environ.get("LOG_PIPELINE", os.path.join(DIRECTORIO_APP, "pipeline.log"))
+
+# Código de salida del pipeline cuando ya había otra corrida (EX_TEMPFAIL)
+CODIGO_EN_CURSO = 75
+
+
+def tomar_bloqueo(ruta=ARCHIVO_BLOQUEO):
+    """
+    Toma el bloqueo sin esperar; retorna el archivo abierto (mantenerlo abierto
+    mientras dure la corrida) o None si otro proceso lo tiene
+    """
+    archivo = open(ruta, 'a+')
+    try:
+        fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        archivo.close()
+        return None
+    # El PID queda sólo como dato para quien mire el archivo
+    archivo.seek(0)
+    archivo.truncate()
+    archivo.write(f"{os.getpid()}\n")
+    archivo.flush()
+    return archivo
+
+
+def pipeline_en_curso(ruta=ARCHIVO_BLOQUEO):
+    """True si algún proceso tiene tomado el bloqueo del pipeline"""
+    try:
+        archivo = open(ruta)
+    except FileNotFoundError:
+        return False
+    with archivo:
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(archivo, fcntl.LOCK_UN)
+        return False
+
+
+def lanzar_pipeline(*argumentos, nueva_sesion=False):
+    """Lanza 'pipeline.py <argumentos>' en un proceso aparte con la salida en LOG_PIPELINE"""
+    with open(LOG_PIPELINE, 'ab') as log:
+        return subprocess.Popen(
+            [sys.executable, 'pipeline.py', *argumentos],
+            cwd=DIRECTORIO_APP,
+            stdout=log, stderr=subprocess.STDOUT,
+            start_new_session=nueva_sesion
+        )
@@ -0,0 +1,254 @@
+"""
+Líneas de base climatológicas por día de temporada
+
+Las temporadas históricas se descargan una sola vez al almacén de detecciones
+(almacen.py) y de ellas se precalcula, para cada día de la temporada, la media
+y los percentiles de focos diarios, focos acumulados y FRP total. El resultado
+es un JSON chico (365 filas) que el pipeline lee para comparar la temporada
+actual sin volver a recorrer el historial.
+
+Los días se identifican por mes y día, no por día del año: así el 1 de marzo
+es el mismo día en años bisiestos y no bisiestos. El 29 de febrero se suma al
+28: en los totales diarios cuenta el promedio de los dos días, y en el
+acumulado el del 29.
+
+Uso:
+    python climatologia.py ingerir 2018 2025 --fuente VIIRS_SNPP_SP
+    python climatologia.py calcular --confianza 70
+"""
+import os
+import json
+import hashlib
+import argparse
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ARCHIVO_LINEA_BASE = os.environ.get("LINEA_BASE", "linea_base.json")
+
+# Percentiles guardados para cada serie
+PERCENTILES = (10, 50, 90)
+
+# Series de la línea de base: nombre → columna de la evolución diaria
+SERIES = {
+    'focos': 'focos_nuevos',
+    'acumulado': 'focos_acumulados',
+    'frp': 'frp_total'
+}
+
+DIAS_TEMPORADA = 365
+
+# Cambia si cambia la forma de indexar los días (los archivos de otra versión se ignoran)
+VERSION_LINEA_BASE = 2
+
+
+def dia_temporada(fechas):
+    """
+    Día de la temporada (1 = 1 de enero, 365 = 31 de diciembre) de una serie de fechas
+    según mes y día: en los bisiestos el 29 de febrero es el mismo día que el 28
+    """
+    dia = fechas.dt.dayofyear
+    # En bisiestos, del 29 de febrero (día 60) en adelante se corre un día
+    return dia - (fechas.dt.is_leap_year & (dia >= 60)).astype(int)
+
+
+def _archivo_temporadas(almacen):
+    return os.path.join(almacen.directorio, 'temporadas.json')
+
+
+def temporadas_ingeridas(almacen):
+    """Temporadas completas ya descargadas al almacén"""
+    try:
+        with open(_archivo_temporadas(almacen), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def ingerir_temporadas(analizador, almacen, temporadas, fuente="VIIRS_SNPP_SP"):
+    """
+    Descarga al almacén las temporadas que todavía no están; una temporada queda
+    marcada como ingerida sólo si se descargaron todos sus bloques
+    """
+    ingeridas = temporadas_ingeridas(almacen)
+    for temporada in temporadas:
+        if temporada in ingeridas:
+            print(f"⏩ Temporada {temporada}: ya está en el almacén")
+            continue
+        print(f"\n📥 Temporada {temporada}")
+        _, fallidos = analizador.ingerir_en_almacen(almacen, datetime(temporada, 1, 1),
+                                                    datetime(temporada, 12, 31), fuente)
+        if fallidos:
+            # Sin marcar: volver a correr 'ingerir' completa los bloques que faltan
+            # (sin ellos la línea de base contaría esos días como sin focos)
+            print(f"⚠️  Temporada {temporada} incompleta: queda pendiente para el próximo 'ingerir'")
+            continue
+        ingeridas = sorted(set(ingeridas) | {temporada})
+        with open(_archivo_temporadas(almacen), 'w', encoding='utf-8') as f:
+            json.dump(ingeridas, f)
+    return ingeridas
+
+
+def calcular_linea_base(analizador, almacen, temporadas=None, confianza_minima=70,
+                        ruta=ARCHIVO_LINEA_BASE):
+    """
+    Precalcula la línea de base de las temporadas indicadas (por defecto todas las
+    ingeridas salvo la actual) recorriendo el almacén partición por partición
+    """
+    actual = analizador.ahora().year
+    temporadas = sorted(temporadas or [t for t in temporadas_ingeridas(almacen) if t != actual])
+    if not temporadas:
+        print("❌ No hay temporadas históricas en el almacén (usar 'ingerir' primero)")
+        return None
+
+    print(f"\n📐 Calculando línea de base con {len(temporadas)} temporadas: {', '.join(map(str, temporadas))}")
+    matrices = {serie: np.full((len(temporadas), DIAS_TEMPORADA), np.nan) for serie in SERIES}
+
+    for fila, temporada in enumerate(temporadas):
+        diarios = []
+        columnas = ['latitude', 'longitude', 'acq_date', 'frp', 'confidence']
+        for _, df in almacen.iterar(f"{temporada}-01", f"{temporada}-12", columnas=columnas):
+            # Mismos filtros que la temporada actual
+            df = analizador.filtrar_por_confianza(analizador.filtrar_territorio(df), confianza_minima)
+            if len(df) > 0:
+                diarios.append(analizador._agregar_por_dia(df))
+
+        # Días sin detecciones cuentan como 0 focos
+        dias = pd.date_range(datetime(temporada, 1, 1), datetime(temporada, 12, 31), name='acq_date')
+        if diarios:
+            diario = pd.concat(diarios, ignore_index=True).set_index('acq_date').reindex(dias, fill_value=0)
+        else:
+            diario = pd.DataFrame({'focos_nuevos': 0, 'frp_total': 0.0}, index=dias)
+        diario['focos_acumulados'] = diario['focos_nuevos'].cumsum()
+
+        # Un valor por mes y día (el 29 de febrero se junta con el 28)
+        diario = diario.groupby(dia_temporada(dias.to_series()).to_numpy()).agg(
+            {'focos_nuevos': 'mean', 'frp_total': 'mean', 'focos_acumulados': 'last'})
+        for serie, columna in SERIES.items():
+            matrices[serie][fila, :] = diario[columna].to_numpy(dtype=float)
+
+    linea_base = {
+        'version': VERSION_LINEA_BASE,
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'temporadas': temporadas,
+        'confianza_minima': confianza_minima,
+        # Mes y día de cada posición (de un año no bisiesto)
+        'dia': pd.date_range('2001-01-01', '2001-12-31').strftime('%m-%d').tolist()
+    }
+    def lista(valores):
+        return [None if np.isnan(v) else v for v in np.round(valores, 2).tolist()]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # columnas sin datos
+        for serie, matriz in matrices.items():
+            linea_base[serie] = {'media': lista(np.nanmean(matriz, axis=0))}
+            for p in PERCENTILES:
+                linea_base[serie][f"p{p}"] = lista(np.nanpercentile(matriz, p, axis=0))
+
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(linea_base, f, separators=(',', ':'))
+    os.replace(temporal, ruta)
+    print(f"✅ Línea de base guardada: {ruta}")
+    return linea_base
+
+
+def huella_linea_base(ruta=ARCHIVO_LINEA_BASE):
+    """Hash del archivo de línea de base (None si no existe): invalida las etapas que lo usan"""
+    try:
+        with open(ruta, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except OSError:
+        return None
+
+
+def cargar_linea_base(ruta=ARCHIVO_LINEA_BASE):
+    """Línea de base precalculada, o None si todavía no se generó (o es de otra versión)"""
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            linea_base = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if linea_base.get('version') != VERSION_LINEA_BASE:
+        print(f"⚠️  {ruta} es de una versión anterior (días por día del año): volver a correr 'climatologia.py calcular'")
+        return None
+    return linea_base
+
+
+def linea_base_en_fechas(linea_base, fechas):
+    """DataFrame con la línea de base alineada a las fechas (columnas <serie>_<estadístico>)"""
+    posiciones = dia_temporada(pd.Series(fechas)).to_numpy() - 1
+    columnas = {'acq_date': pd.Series(fechas).to_numpy()}
+    for serie in SERIES:
+        for estadistico, valores in linea_base[serie].items():
+            columnas[f"{serie}_{estadistico}"] = np.asarray(valores, dtype=float)[posiciones]
+    return pd.DataFrame(columnas)
+
+
+def comparar_con_linea_base(evolucion, linea_base, fecha):
+    """
+    Focos acumulados de la temporada actual hasta 'fecha' (la de referencia de la
+    corrida, no la del último foco) contra lo normal al mismo mes y día
+    Retorna un dict con los valores y un texto corto para el dashboard
+    """
+    if linea_base is None:
+        return None
+    fecha = pd.Timestamp(fecha).normalize()
+    hasta_fecha = evolucion[pd.to_datetime(evolucion['acq_date']) <= fecha]
+    # Sin focos todavía el acumulado es 0, que también se compara con lo normal
+    acumulado = float(hasta_fecha['focos_acumulados'].iloc[-1]) if len(hasta_fecha) else 0.0
+    dia = int(dia_temporada(pd.Series([fecha])).iloc[0])
+    normal = linea_base['acumulado']['p50'][dia - 1]
+    p10, p90 = linea_base['acumulado']['p10'][dia - 1], linea_base['acumulado']['p90'][dia - 1]
+    if normal is None:
+        return None
+
+    diferencia = (acumulado / normal - 1) * 100 if normal else None
+    if acumulado > p90:
+        categoria = 'muy por encima de lo normal'
+    elif acumulado < p10:
+        categoria = 'muy por debajo de lo normal'
+    else:
+        categoria = 'dentro de lo normal'
+
+    texto = f"{diferencia:+.0f}% vs normal" if diferencia is not None else categoria
+    return {
+        'fecha': fecha.strftime('%Y-%m-%d'),
+        'dia': dia,
+        'acumulado': acumulado,
+        'normal': normal,
+        'p10': p10,
+        'p90': p90,
+        'diferencia_pct': round(diferencia, 1) if diferencia is not None else None,
+        'categoria': categoria,
+        'texto': texto,
+        'temporadas': f"{linea_base['temporadas'][0]}-{linea_base['temporadas'][-1]}"
+    }
+
+
+if __name__ == "__main__":
+    from almacen import AlmacenDetecciones
+    from incendios_v2 import AnalizadorIncendiosHistorico
+
+    parser = argparse.ArgumentParser(description="Líneas de base climatológicas de incendios")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    ingerir = subcomandos.add_parser('ingerir', help="descargar temporadas históricas al almacén")
+    ingerir.add_argument('desde', type=int)
+    ingerir.add_argument('hasta', type=int)
+    ingerir.add_argument('--fuente', default='VIIRS_SNPP_SP')
+
+    calcular = subcomandos.add_parser('calcular', help="precalcular la línea de base")
+    calcular.add_argument('--confianza', type=int, default=70)
+    calcular.add_argument('--temporadas', type=int, nargs='*')
+
+    args = parser.parse_args()
+    analizador = AnalizadorIncendiosHistorico(os.environ.get("MAP_KEY", "a66ff23e6b0f370791cb4bd2dd3123d0"))
+    almacen = AlmacenDetecciones()
+
+    if args.comando == 'ingerir':
+        ingerir_temporadas(analizador, almacen, range(args.desde, args.hasta + 1), args.fuente)
+    else:
+        calcular_linea_base(analizador, almacen, args.temporadas, args.confianza)
@@ -0,0 +1,82 @@
+-- Tablas que escriben persistencia.py (etapa 'persist' del pipeline) e historial.py
+-- Se crean desde el editor SQL de Supabase; se puede volver a correr entero sin errores
+--
+-- Row level security: sólo hay políticas de lectura, así la clave anon (la de la
+-- app web, SUPABASE_KEY) no puede escribir. El pipeline escribe con la clave
+-- service_role (variable SUPABASE_SERVICE_KEY), que no pasa por RLS
+
+create table if not exists detecciones (
+    id text primary key,                -- hash de latitud, longitud, fecha y hora de adquisición
+    latitude double precision not null,
+    longitude double precision not null,
+    acq_date date not null,
+    acq_time integer not null,          -- HHMM (UTC)
+    fecha_deteccion timestamptz not null,
+    satellite text,
+    instrument text,
+    daynight text,
+    confidence real,
+    frp real,
+    bright_ti4 real,
+    bright_ti5 real,
+    provincia text,
+    viento_kmh real,
+    humedad_relativa real,
+    temperatura_c real,
+    lluvia_7d_mm real,
+    ffmc real,
+    dmc real,
+    dc real,
+    isi real,
+    bui real,
+    fwi real,
+    indice_riesgo real,
+    nivel_riesgo text
+);
+
+create index if not exists detecciones_fecha on detecciones (acq_date);
+create index if not exists detecciones_provincia on detecciones (provincia, acq_date);
+
+create table if not exists focos_diarios (
+    fecha date primary key,
+    focos_nuevos integer not null,
+    focos_acumulados integer not null,
+    frp_total real,
+    frp_promedio real,
+    frp_maximo real,
+    confianza real,
+    superficie_estimada_ha real,
+    indice_riesgo_promedio real,
+    focos_riesgo_alto integer
+);
+
+-- Lectura pública (la clave anon del dashboard); la escritura queda para la clave service_role del pipeline
+alter table detecciones enable row level security;
+alter table focos_diarios enable row level security;
+drop policy if exists "lectura publica" on detecciones;
+drop policy if exists "lectura publica" on focos_diarios;
+create policy "lectura publica" on detecciones for select using (true);
+create policy "lectura publica" on focos_diarios for select using (true);
+
+-- Historial de estadísticas (historial.py): una fila por publicación, sólo se agrega
+create table if not exists stats_historial (
+    id bigint generated always as identity primary key,
+    generado timestamptz not null,      -- UTC
+    total_focos integer not null,
+    focos_alta_confianza integer,
+    frp_promedio real,
+    frp_maximo real,
+    indice_riesgo_promedio real,
+    focos_riesgo_alto integer,
+    porcentaje_riesgo_alto real,
+    superficie_estimada_ha real,
+    nivel_predominante text,
+    fecha_inicio date,
+    fecha_fin date
+);
+
+create index if not exists stats_historial_generado on stats_historial (generado);
+
+alter table stats_historial enable row level security;
+drop policy if exists "lectura publica" on stats_historial;
+create policy "lectura publica" on stats_historial for select using (true);
@@ -0,0 +1,194 @@
+"""
+Eventos de progreso del pipeline
+
+El proceso del pipeline agrega una línea JSON por evento a ARCHIVO_EVENTOS
+(cada corrida lo reemplaza por uno nuevo). La app web lo sigue con un único
+hilo por worker (Difusor) que reparte los eventos a todos los clientes SSE
+conectados, así que leer el archivo no escala con la cantidad de clientes.
+Cada corrida tiene un id único (hora UTC y PID del pipeline) que va en su
+evento 'inicio', la primera línea del archivo. El id de cada evento SSE es
+"<corrida>:<posición en bytes>". Un cliente que se reconecta con Last-Event-ID
+retoma desde esa posición sólo si la corrida coincide con la actual o con la
+anterior. Si no coincide, recibe la corrida actual desde el principio. El
+inodo sólo sirve para notar que el archivo fue reemplazado: el sistema puede
+reutilizarlo para otra corrida.
+"""
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+
+ARCHIVO_EVENTOS = os.environ.get(
+    "ARCHIVO_EVENTOS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "eventos_pipeline.jsonl")
+)
+
+# Cada cuánto el difusor revisa si el archivo creció
+INTERVALO_LECTURA = 0.5
+
+# Cada cuánto se envía un comentario SSE para mantener viva la conexión
+INTERVALO_KEEPALIVE = 15
+
+
+# ============================================================
+# LADO PIPELINE: escribir eventos
+# ============================================================
+
+def _linea(tipo, **datos):
+    evento = {'tipo': tipo, 'hora': datetime.now(timezone.utc).isoformat(timespec='seconds'), **datos}
+    return json.dumps(evento, ensure_ascii=False, default=str) + "\n"
+
+
+def iniciar_corrida(objetivo):
+    """Reemplaza el archivo de eventos por uno que ya empieza con el evento 'inicio' de la corrida"""
+    corrida = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{os.getpid()}"
+    temporal = ARCHIVO_EVENTOS + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(_linea('inicio', objetivo=objetivo, pid=os.getpid(), corrida=corrida))
+    os.replace(temporal, ARCHIVO_EVENTOS)
+
+
+def emitir(tipo, **datos):
+    """Agrega un evento al archivo (una línea JSON escrita de una sola vez)"""
+    with open(ARCHIVO_EVENTOS, 'a', encoding='utf-8') as f:
+        f.write(_linea(tipo, **datos))
+
+
+# ============================================================
+# LADO WEB: seguir el archivo y difundir a clientes SSE
+# ============================================================
+
+class Difusor:
+    """Sigue el archivo de eventos y despierta a los clientes que esperan eventos nuevos"""
+
+    def __init__(self, ruta=ARCHIVO_EVENTOS):
+        self.ruta = ruta
+        self.eventos = []        # [(posición_final, línea)] de la corrida actual
+        self.corrida = None      # id de la corrida actual (el de su evento 'inicio')
+        self.anterior = (None, [])  # (corrida, eventos) de la corrida previa
+        self._inodo = None       # inodo del archivo que se está leyendo
+        self._archivo = None
+        self._posicion = 0
+        self._resto = b''
+        self._condicion = threading.Condition()
+        self._hilo = None
+
+    def iniciar(self):
+        """Lee lo ya escrito y arranca el hilo lector la primera vez que se lo necesita"""
+        with self._condicion:
+            if self._hilo is None:
+                self._leer()
+                self._hilo = threading.Thread(target=self._seguir, daemon=True)
+                self._hilo.start()
+
+    def _seguir(self):
+        while True:
+            time.sleep(INTERVALO_LECTURA)
+            with self._condicion:
+                self._leer()
+
+    def _leer(self):
+        """Incorpora las líneas nuevas del archivo (llamar con la condición tomada)"""
+        # Terminar de leer el archivo abierto aunque ya lo hayan reemplazado: no se pierden eventos
+        if self._archivo is not None:
+            self._incorporar(self._archivo.read())
+
+        try:
+            inodo = os.stat(self.ruta).st_ino
+        except OSError:
+            return
+        if inodo == self._inodo:
+            return
+
+        # Archivo nuevo: nueva corrida
+        try:
+            archivo = open(self.ruta, 'rb')
+        except OSError:
+            return
+        if self._archivo is not None:
+            self._archivo.close()
+        self._archivo = archivo
+        self._posicion, self._resto = 0, b''
+        self.anterior = (self.corrida, self.eventos)
+        self.eventos = []
+        self._inodo = os.fstat(archivo.fileno()).st_ino
+        self._incorporar(archivo.read())
+        self.corrida = self._id_corrida()
+        self._condicion.notify_all()
+
+    def _id_corrida(self):
+        """Id de la corrida según su evento 'inicio' (el inodo en archivos que no lo traen)"""
+        if self.eventos:
+            corrida = json.loads(self.eventos[0][1]).get('corrida')
+            if corrida:
+                return corrida
+        return f"inodo-{self._inodo}"
+
+    def _incorporar(self, datos):
+        if not datos:
+            return
+        inicio = self._posicion - len(self._resto)
+        self._posicion += len(datos)
+        lineas = (self._resto + datos).split(b'\n')
+        self._resto = lineas.pop()  # última línea incompleta (si la hay)
+        for linea in lineas:
+            inicio += len(linea) + 1
+            if linea.strip():
+                self.eventos.append((inicio, linea.decode('utf-8')))
+        self._condicion.notify_all()
+
+    def reanudacion(self, ultimo_id):
+        """(corrida, posición) desde donde seguir según Last-Event-ID: la corrida actual desde 0 si no coincide"""
+        with self._condicion:
+            corrida, _, posicion = (ultimo_id or '').rpartition(':')
+            if posicion.isdigit() and corrida and corrida in (self.corrida, self.anterior[0]):
+                return corrida, int(posicion)
+            return self.corrida, 0
+
+    def esperar(self, desde, corrida, timeout):
+        """
+        Eventos posteriores a la posición 'desde' de la corrida 'corrida'
+        (bloquea hasta timeout si no hay). Retorna [(corrida, posición, línea)];
+        si empezó otra corrida incluye lo que faltaba de la anterior y todo lo de la nueva
+        """
+        with self._condicion:
+            def hay_nuevos():
+                return self.corrida != corrida or bool(self.eventos and self.eventos[-1][0] > desde)
+            if timeout:
+                self._condicion.wait_for(hay_nuevos, timeout=timeout)
+
+            if self.corrida == corrida:
+                return [(corrida, p, l) for p, l in self.eventos if p > desde]
+
+            pendientes = []
+            corrida_anterior, eventos_anteriores = self.anterior
+            if corrida is not None and corrida == corrida_anterior:
+                pendientes = [(corrida, p, l) for p, l in eventos_anteriores if p > desde]
+            return pendientes + [(self.corrida, p, l) for p, l in self.eventos]
+
+
+_difusor = Difusor()
+
+
+def flujo_sse(ultimo_id=None):
+    """
+    Generador de mensajes SSE para un cliente (Last-Event-ID opcional)
+    Primero envía lo ya ocurrido en la corrida y un evento 'sincronizado',
+    después cada evento nuevo a medida que llega
+    """
+    _difusor.iniciar()
+    corrida, desde = _difusor.reanudacion(ultimo_id)
+    timeout = 0
+
+    yield "retry: 5000\n\n"
+    while True:
+        eventos = _difusor.esperar(desde, corrida, timeout)
+        for corrida, desde, linea in eventos:
+            tipo = json.loads(linea).get('tipo', 'mensaje')
+            yield f"id: {corrida}:{desde}\nevent: {tipo}\ndata: {linea}\n\n"
+        if timeout == 0:
+            yield "event: sincronizado\ndata: {}\n\n"
+            timeout = INTERVALO_KEEPALIVE
+        elif not eventos:
+            yield ": keepalive\n\n"
@@ -0,0 +1,244 @@
+"""
+Exportación filtrada de detecciones en CSV, GeoJSON y Parquet (/api/export)
+
+El pipeline deja el último dataset enriquecido en un Parquet ordenado por fecha
+y escrito en grupos de filas (guardar_dataset). La exportación lo recorre de a
+lotes, salteando los grupos cuyas estadísticas (fecha, lat, lon, riesgo) no
+pueden coincidir con el filtro, y envía cada lote apenas está filtrado: la
+respuesta empieza enseguida y la memoria no depende del tamaño del resultado.
+
+pyarrow se importa recién al exportar, no al arrancar la app web.
+"""
+import os
+import json
+from datetime import datetime, timedelta
+
+ARCHIVO_DATASET = os.environ.get(
+    "DATASET_EXPORTACION",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos_export", "detecciones.parquet")
+)
+
+# Filas por grupo del Parquet (unidad mínima de lectura) y por lote enviado
+FILAS_POR_GRUPO = 50_000
+FILAS_POR_LOTE = 5_000
+
+FORMATOS = {
+    'csv': ('text/csv', 'csv'),
+    'geojson': ('application/geo+json', 'geojson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+
+class FiltroInvalido(ValueError):
+    """Parámetro de filtro mal formado (la API responde 400)"""
+
+
+# ============================================================
+# LADO PIPELINE: guardar el dataset
+# ============================================================
+
+def guardar_dataset(df, ruta=ARCHIVO_DATASET):
+    """Escribe el dataset ordenado por fecha, en grupos de filas, y lo reemplaza de forma atómica"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + '.tmp'
+    df.sort_values(['acq_date', 'acq_time'], kind='stable').to_parquet(
+        temporal, index=False, row_group_size=FILAS_POR_GRUPO
+    )
+    os.replace(temporal, ruta)
+    return ruta
+
+
+# ============================================================
+# LADO WEB: filtros y exportación por lotes
+# ============================================================
+
+def leer_filtros(args):
+    """
+    Filtros desde los parámetros de la URL:
+        bbox=oeste,sur,este,norte   desde=AAAA-MM-DD   hasta=AAAA-MM-DD
+        riesgo_min=<0-100>          nivel=ALTO,EXTREMO
+    """
+    filtros = {}
+    try:
+        if args.get('bbox'):
+            valores = [float(v) for v in args['bbox'].split(',')]
+            if len(valores) != 4 or valores[0] > valores[2] or valores[1] > valores[3]:
+                raise FiltroInvalido("bbox debe ser oeste,sur,este,norte")
+            filtros['bbox'] = tuple(valores)
+        if args.get('desde'):
+            filtros['desde'] = datetime.strptime(args['desde'], '%Y-%m-%d')
+        if args.get('hasta'):
+            # 'hasta' incluye el día completo
+            filtros['hasta'] = datetime.strptime(args['hasta'], '%Y-%m-%d') + timedelta(days=1)
+        if args.get('riesgo_min'):
+            filtros['riesgo_min'] = float(args['riesgo_min'])
+        if args.get('nivel'):
+            filtros['nivel'] = [n.strip().upper() for n in args['nivel'].split(',') if n.strip()]
+    except FiltroInvalido:
+        raise
+    except ValueError as e:
+        raise FiltroInvalido(f"Filtro inválido: {e}")
+    return filtros
+
+
+def _puede_coincidir(estadisticas, filtros):
+    """False si las estadísticas de un grupo de filas descartan el grupo completo"""
+    def rango(columna):
+        e = estadisticas.get(columna)
+        return (e.min, e.max) if e is not None and e.has_min_max else (None, None)
+
+    minimo, maximo = rango('acq_date')
+    if minimo is not None:
+        if 'desde' in filtros and maximo < filtros['desde']:
+            return False
+        if 'hasta' in filtros and minimo >= filtros['hasta']:
+            return False
+    if 'bbox' in filtros:
+        oeste, sur, este, norte = filtros['bbox']
+        for columna, bajo, alto in (('latitude', sur, norte), ('longitude', oeste, este)):
+            minimo, maximo = rango(columna)
+            if minimo is not None and (maximo < bajo or minimo > alto):
+                return False
+    minimo, maximo = rango('indice_riesgo')
+    if 'riesgo_min' in filtros and maximo is not None and maximo < filtros['riesgo_min']:
+        return False
+    return True
+
+
+def _mascara(lote, filtros):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    condiciones = []
+    if 'bbox' in filtros:
+        oeste, sur, este, norte = filtros['bbox']
+        condiciones += [
+            pc.greater_equal(lote['latitude'], sur), pc.less_equal(lote['latitude'], norte),
+            pc.greater_equal(lote['longitude'], oeste), pc.less_equal(lote['longitude'], este)
+        ]
+    tipo_fecha = lote.schema.field('acq_date').type
+    if 'desde' in filtros:
+        condiciones.append(pc.greater_equal(lote['acq_date'], pa.scalar(filtros['desde'], type=tipo_fecha)))
+    if 'hasta' in filtros:
+        condiciones.append(pc.less(lote['acq_date'], pa.scalar(filtros['hasta'], type=tipo_fecha)))
+    if 'riesgo_min' in filtros:
+        condiciones.append(pc.greater_equal(lote['indice_riesgo'], filtros['riesgo_min']))
+    if 'nivel' in filtros:
+        condiciones.append(pc.is_in(lote['nivel_riesgo'], value_set=pa.array(filtros['nivel'])))
+
+    if not condiciones:
+        return None
+    mascara = condiciones[0]
+    for condicion in condiciones[1:]:
+        mascara = pc.and_(mascara, condicion)
+    return pc.fill_null(mascara, False)
+
+
+def _lotes(filtros, ruta=ARCHIVO_DATASET):
+    """Genera lotes (pyarrow.RecordBatch) ya filtrados, leyendo sólo los grupos de filas necesarios"""
+    import pyarrow.parquet as pq
+
+    # El archivo queda abierto: si el pipeline lo reemplaza durante la exportación se sigue leyendo la versión anterior
+    archivo = pq.ParquetFile(ruta)
+    nombres = archivo.schema_arrow.names
+    grupos = []
+    for i in range(archivo.metadata.num_row_groups):
+        grupo = archivo.metadata.row_group(i)
+        estadisticas = {
+            nombres[j]: grupo.column(j).statistics for j in range(grupo.num_columns)
+            if nombres[j] in ('acq_date', 'latitude', 'longitude', 'indice_riesgo')
+        }
+        if _puede_coincidir(estadisticas, filtros):
+            grupos.append(i)
+
+    if grupos:
+        for lote in archivo.iter_batches(batch_size=FILAS_POR_LOTE, row_groups=grupos):
+            mascara = _mascara(lote, filtros)
+            if mascara is not None:
+                lote = lote.filter(mascara)
+            if lote.num_rows:
+                yield lote
+    archivo.close()
+
+
+def esquema(ruta=ARCHIVO_DATASET):
+    import pyarrow.parquet as pq
+    return pq.read_schema(ruta)
+
+
+def exportar_csv(filtros, ruta=ARCHIVO_DATASET):
+    import io
+    import pyarrow.csv as pcsv
+
+    buffer = io.BytesIO()
+    # El encabezado sale aunque no haya filas
+    pcsv.write_csv(esquema(ruta).empty_table(), buffer)
+    yield buffer.getvalue()
+    opciones = pcsv.WriteOptions(include_header=False)
+    for lote in _lotes(filtros, ruta):
+        buffer = io.BytesIO()
+        pcsv.write_csv(lote, buffer, write_options=opciones)
+        yield buffer.getvalue()
+
+
+def exportar_geojson(filtros, ruta=ARCHIVO_DATASET):
+    yield b'{"type":"FeatureCollection","features":['
+    primero = True
+    for lote in _lotes(filtros, ruta):
+        features = []
+        for fila in lote.to_pylist():
+            geometria = {'type': 'Point', 'coordinates': [fila['longitude'], fila['latitude']]}
+            features.append(json.dumps({'type': 'Feature', 'geometry': geometria, 'properties': fila},
+                                       ensure_ascii=False, default=str))
+        texto = ','.join(features)
+        yield (texto if primero else ',' + texto).encode('utf-8')
+        primero = False
+    yield b']}'
+
+
+class _Sumidero:
+    """Archivo de sólo escritura que acumula lo escrito hasta que se lo vacía"""
+
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+        self.closed = False
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def exportar_parquet(filtros, ruta=ARCHIVO_DATASET):
+    import pyarrow.parquet as pq
+
+    sumidero = _Sumidero()
+    escritor = pq.ParquetWriter(sumidero, esquema(ruta))
+    for lote in _lotes(filtros, ruta):
+        # Cada lote es un grupo de filas: se envía apenas se escribe
+        escritor.write_batch(lote)
+        yield sumidero.vaciar()
+    escritor.close()
+    yield sumidero.vaciar()
+
+
+EXPORTADORES = {
+    'csv': exportar_csv,
+    'geojson': exportar_geojson,
+    'parquet': exportar_parquet
+}
@@ -0,0 +1,232 @@
+"""
+Sistema canadiense de índices meteorológicos de incendio (FWI)
+
+Ecuaciones de Van Wagner (1987) para los tres códigos de humedad del
+combustible (FFMC, DMC, DC) y los índices de comportamiento (ISI, BUI, FWI),
+con los factores de duración del día ajustados por latitud (Lawson y Armitage
+2008) para el hemisferio sur. Todas las funciones operan sobre arreglos de
+celdas: la recurrencia diaria sólo itera sobre los días.
+
+Entradas por día y celda, tomadas al mediodía local: temperatura (°C), humedad
+relativa (%), viento (km/h) y lluvia de las 24 horas previas (mm).
+
+Los códigos de humedad tienen memoria: el estado de la última corrida se guarda
+en disco y cada actualización procesa sólo los días nuevos.
+"""
+import os
+
+import numpy as np
+
+ARCHIVO_ESTADO = os.environ.get("FWI_ESTADO", "fwi_estado.npz")
+
+# Valores iniciales estándar al comenzar la serie (sin estado previo)
+FFMC_INICIAL = 85.0
+DMC_INICIAL = 6.0
+DC_INICIAL = 15.0
+
+CODIGOS = ('ffmc', 'dmc', 'dc')
+INDICES = ('ffmc', 'dmc', 'dc', 'isi', 'bui', 'fwi')
+
+# Duración efectiva del día para el DMC (por mes) según la banda de latitud
+DIA_DMC = {
+    'norte': [6.5, 7.5, 9.0, 12.8, 13.9, 13.9, 12.4, 10.9, 9.4, 8.0, 7.0, 6.0],      # lat >= 30
+    'norte_bajo': [7.9, 8.4, 8.9, 9.5, 9.9, 10.2, 10.1, 9.7, 9.1, 8.6, 8.1, 7.8],   # 10 <= lat < 30
+    'sur_bajo': [10.1, 9.6, 9.1, 8.5, 8.1, 7.8, 7.9, 8.3, 8.9, 9.4, 9.9, 10.2],     # -30 < lat <= -10
+    'sur': [11.5, 10.5, 9.2, 7.9, 6.8, 6.2, 6.5, 7.4, 8.7, 10.0, 11.2, 11.8]        # lat <= -30
+}
+
+# Factor de duración del día para el DC (por mes)
+DIA_DC = {
+    'norte': [-1.6, -1.6, -1.6, 0.9, 3.8, 5.8, 6.4, 5.0, 2.4, 0.4, -1.6, -1.6],     # lat > 20
+    'sur': [6.4, 5.0, 2.4, 0.4, -1.6, -1.6, -1.6, -1.6, -1.6, 0.9, 3.8, 5.8]        # lat <= -20
+}
+
+# Correspondencia FWI → índice 0-100 del dashboard: los límites de clase de
+# peligro de EFFIS (5.2, 11.2, 21.3, 38, 50) caen en los umbrales de nivel
+ESCALA_FWI = ([0.0, 5.2, 11.2, 21.3, 38.0, 50.0], [0.0, 20.0, 40.0, 60.0, 80.0, 99.9])
+
+
+def _dia_dmc(mes, lat):
+    i = mes - 1
+    return np.select(
+        [lat >= 30, lat >= 10, lat > -10, lat > -30],
+        [DIA_DMC['norte'][i], DIA_DMC['norte_bajo'][i], 9.0, DIA_DMC['sur_bajo'][i]],
+        DIA_DMC['sur'][i]
+    )
+
+
+def _dia_dc(mes, lat):
+    i = mes - 1
+    return np.select([lat > 20, lat <= -20], [DIA_DC['norte'][i], DIA_DC['sur'][i]], 1.4)
+
+
+def ffmc(ffmc_ayer, temp, hr, viento, lluvia):
+    """Código de humedad de combustibles finos"""
+    mo = 147.2 * (101.0 - ffmc_ayer) / (59.5 + ffmc_ayer)
+
+    # Mojado por lluvia (sólo lo que supera 0.5 mm)
+    rf = np.maximum(lluvia - 0.5, 1e-9)
+    with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        mojado = mo + 42.5 * rf * np.exp(-100.0 / (251.0 - mo)) * (1.0 - np.exp(-6.93 / rf))
+        mojado = np.where(mo > 150.0, mojado + 0.0015 * (mo - 150.0) ** 2 * np.sqrt(rf), mojado)
+    mo = np.where(lluvia > 0.5, np.minimum(mojado, 250.0), mo)
+
+    # Humedad de equilibrio de secado y de humedecimiento
+    ed = 0.942 * hr ** 0.679 + 11.0 * np.exp((hr - 100.0) / 10.0) + 0.18 * (21.1 - temp) * (1.0 - np.exp(-0.115 * hr))
+    ew = 0.618 * hr ** 0.753 + 10.0 * np.exp((hr - 100.0) / 10.0) + 0.18 * (21.1 - temp) * (1.0 - np.exp(-0.115 * hr))
+
+    ko = 0.424 * (1.0 - (hr / 100.0) ** 1.7) + 0.0694 * np.sqrt(viento) * (1.0 - (hr / 100.0) ** 8)
+    kd = ko * 0.581 * np.exp(0.0365 * temp)
+    k1 = 0.424 * (1.0 - ((100.0 - hr) / 100.0) ** 1.7) + 0.0694 * np.sqrt(viento) * (1.0 - ((100.0 - hr) / 100.0) ** 8)
+    kw = k1 * 0.581 * np.exp(0.0365 * temp)
+
+    m = np.where(mo > ed, ed + (mo - ed) * 10.0 ** (-kd),
+                 np.where(mo < ew, ew - (ew - mo) * 10.0 ** (-kw), mo))
+    return np.clip(59.5 * (250.0 - m) / (147.2 + m), 0.0, 101.0)
+
+
+def dmc(dmc_ayer, temp, hr, lluvia, mes, lat):
+    """Código de humedad del mantillo (duff)"""
+    temp = np.maximum(temp, -1.1)
+    secado = 1.894 * (temp + 1.1) * (100.0 - hr) * _dia_dmc(mes, lat) * 1e-4
+
+    # Mojado por lluvia (sólo si supera 1.5 mm)
+    re = np.maximum(0.92 * lluvia - 1.27, 1e-9)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mo = 20.0 + np.exp(5.6348 - dmc_ayer / 43.43)
+        b = np.where(dmc_ayer <= 33.0, 100.0 / (0.5 + 0.3 * dmc_ayer),
+                     np.where(dmc_ayer <= 65.0, 14.0 - 1.3 * np.log(dmc_ayer), 6.2 * np.log(dmc_ayer) - 17.2))
+        mr = mo + 1000.0 * re / (48.77 + b * re)
+        mojado = 244.72 - 43.43 * np.log(mr - 20.0)
+    previo = np.where(lluvia > 1.5, np.maximum(mojado, 0.0), dmc_ayer)
+    return np.maximum(previo + secado, 0.0)
+
+
+def dc(dc_ayer, temp, lluvia, mes, lat):
+    """Código de sequía"""
+    temp = np.maximum(temp, -2.8)
+    secado = np.maximum((0.36 * (temp + 2.8) + _dia_dc(mes, lat)) / 2.0, 0.0)
+
+    # Mojado por lluvia (sólo si supera 2.8 mm)
+    rd = np.maximum(0.83 * lluvia - 1.27, 0.0)
+    qo = 800.0 * np.exp(-dc_ayer / 400.0)
+    mojado = np.maximum(dc_ayer - 400.0 * np.log(1.0 + 3.937 * rd / qo), 0.0)
+    previo = np.where(lluvia > 2.8, mojado, dc_ayer)
+    return previo + secado
+
+
+def isi(ffmc_hoy, viento):
+    """Índice de propagación inicial"""
+    fm = 147.2 * (101.0 - ffmc_hoy) / (59.5 + ffmc_hoy)
+    sf = 19.115 * np.exp(-0.1386 * fm) * (1.0 + fm ** 5.31 / 4.93e7)
+    return sf * np.exp(0.05039 * viento)
+
+
+def bui(dmc_hoy, dc_hoy):
+    """Índice de combustible disponible"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bajo = 0.8 * dc_hoy * dmc_hoy / (dmc_hoy + 0.4 * dc_hoy)
+        alto = dmc_hoy - (1.0 - 0.8 * dc_hoy / (dmc_hoy + 0.4 * dc_hoy)) * (0.92 + (0.0114 * dmc_hoy) ** 1.7)
+    valor = np.where(dmc_hoy <= 0.4 * dc_hoy, bajo, alto)
+    return np.where((dmc_hoy == 0) & (dc_hoy == 0), 0.0, np.maximum(valor, 0.0))
+
+
+def fwi(isi_hoy, bui_hoy):
+    """Índice meteorológico de incendio"""
+    with np.errstate(over='ignore'):
+        fd = np.where(bui_hoy <= 80.0, 0.626 * bui_hoy ** 0.809 + 2.0,
+                      1000.0 / (25.0 + 108.64 * np.exp(-0.023 * bui_hoy)))
+    b = 0.1 * isi_hoy * fd
+    with np.errstate(divide='ignore', invalid='ignore'):
+        escalado = np.exp(2.72 * (0.434 * np.log(b)) ** 0.647)
+    return np.where(b > 1.0, escalado, b)
+
+
+def estado_inicial(celdas):
+    return {
+        'ffmc': np.full(celdas, FFMC_INICIAL),
+        'dmc': np.full(celdas, DMC_INICIAL),
+        'dc': np.full(celdas, DC_INICIAL)
+    }
+
+
+def paso_diario(estado, temp, hr, viento, lluvia, mes, lat):
+    """
+    Un día del sistema completo para todas las celdas
+    Las celdas sin datos (NaN) conservan los códigos del día anterior
+    Retorna los seis índices; los tres códigos son el estado del día siguiente
+    """
+    temp, hr, viento, lluvia, lat = (np.asarray(v, dtype=float) for v in (temp, hr, viento, lluvia, lat))
+    hr = np.clip(hr, 0.0, 100.0)
+    viento = np.maximum(viento, 0.0)
+    lluvia = np.maximum(lluvia, 0.0)
+    valido = ~(np.isnan(temp) | np.isnan(hr) | np.isnan(viento) | np.isnan(lluvia))
+
+    hoy = {
+        'ffmc': np.where(valido, ffmc(estado['ffmc'], temp, hr, viento, lluvia), estado['ffmc']),
+        'dmc': np.where(valido, dmc(estado['dmc'], temp, hr, lluvia, mes, lat), estado['dmc']),
+        'dc': np.where(valido, dc(estado['dc'], temp, lluvia, mes, lat), estado['dc'])
+    }
+    hoy['isi'] = np.where(valido, isi(hoy['ffmc'], viento), np.nan)
+    hoy['bui'] = bui(hoy['dmc'], hoy['dc'])
+    hoy['fwi'] = np.where(valido, fwi(hoy['isi'], hoy['bui']), np.nan)
+    return hoy
+
+
+def calcular_serie(estado, fechas, temp, hr, viento, lluvia, lat):
+    """
+    Recorre los días (filas de las matrices días × celdas) desde el estado dado
+    Retorna los índices del último día, que también queda como nuevo estado
+    """
+    hoy = None
+    for i, fecha in enumerate(fechas):
+        hoy = paso_diario(estado, temp[i], hr[i], viento[i], lluvia[i], int(str(fecha)[5:7]), lat)
+        estado = {codigo: hoy[codigo] for codigo in CODIGOS}
+    return hoy
+
+
+def indice_desde_fwi(valores):
+    """FWI → índice 0-100 del dashboard (100 queda reservado a la alerta 30-30-30)"""
+    return np.interp(np.asarray(valores, dtype=float), *ESCALA_FWI)
+
+
+def cargar_estado(firma, ruta=ARCHIVO_ESTADO):
+    """
+    (fecha del último día procesado, índices de ese día) para una grilla
+    (None, None) si no hay estado guardado para la misma grilla
+    """
+    try:
+        with np.load(ruta) as datos:
+            if str(datos['firma']) != firma:
+                return None, None
+            return str(datos['fecha']), {indice: datos[indice] for indice in INDICES}
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def guardar_estado(firma, fecha, estado, ruta=ARCHIVO_ESTADO):
+    temporal = ruta + '.tmp.npz'
+    np.savez(temporal, firma=firma, fecha=fecha, **{indice: estado[indice] for indice in INDICES})
+    os.replace(temporal, ruta)
+
+
+if __name__ == "__main__":
+    # Validación contra la tabla de referencia de Van Wagner y Pickett (1985):
+    # abril, latitud 46°N, desde los valores iniciales estándar
+    entradas = [(17.0, 42.0, 25.0, 0.0), (20.0, 21.0, 25.0, 2.4), (8.5, 40.0, 17.0, 0.0),
+                (6.5, 25.0, 6.0, 0.0), (13.0, 34.0, 24.0, 0.0)]
+    referencia = [(87.7, 8.5, 19.0, 10.9, 8.5, 10.1), (86.2, 10.4, 23.6, 8.8, 10.4, 9.3),
+                  (87.0, 11.8, 26.1, 6.5, 11.7, 7.6), (88.8, 13.2, 28.2, 4.9, 13.1, 6.2),
+                  (89.1, 15.4, 31.5, 12.6, 15.3, 14.8)]
+    estado = estado_inicial(1)
+    errores = 0
+    print(f"{'día':>3}  " + "  ".join(f"{i.upper():>11}" for i in INDICES))
+    for dia, ((temp, hr, viento, lluvia), esperado) in enumerate(zip(entradas, referencia), 1):
+        hoy = paso_diario(estado, [temp], [hr], [viento], [lluvia], 4, [46.0])
+        estado = {codigo: hoy[codigo] for codigo in CODIGOS}
+        calculado = [round(float(hoy[i][0]), 1) for i in INDICES]
+        difieren = [abs(c - e) > 0.1 for c, e in zip(calculado, esperado)]
+        errores += sum(difieren)
+        print(f"{dia:>3}  " + "  ".join(f"{c:5.1f} ({e:4.1f}){'*' if d else ' '}"
+                                        for c, e, d in zip(calculado, esperado, difieren)))
+    print("✅ Coincide con la tabla de referencia" if not errores else f"❌ {errores} valores fuera de tolerancia")
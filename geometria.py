@@ -0,0 +1,113 @@
+"""
+Geometría vectorizada para coordenadas geográficas (lon/lat en grados)
+
+Las distancias a líneas y polígonos usan una proyección equirectangular local
+(suficiente para umbrales de pocas decenas de km) y las distancias entre
+puntos usan haversine. Todas las funciones reciben arreglos de puntos y
+evalúan el lote completo con numpy.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+RADIO_TIERRA_KM = 6371.0
+KM_POR_GRADO = np.pi * RADIO_TIERRA_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distancia en km entre puntos (admite broadcasting)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _proyectar_km(lat, lon, lat_ref):
+    """Coordenadas x/y en km alrededor de una latitud de referencia"""
+    return (np.asarray(lon, dtype=float) * KM_POR_GRADO * np.cos(np.radians(lat_ref)),
+            np.asarray(lat, dtype=float) * KM_POR_GRADO)
+
+
+def distancia_linea_km(lat, lon, linea):
+    """
+    Distancia mínima en km de cada punto a una polilínea
+    linea: arreglo (m, 2) de vértices [lon, lat]
+    """
+    linea = np.asarray(linea, dtype=float)
+    lat_ref = linea[:, 1].mean()
+    px, py = _proyectar_km(lat, lon, lat_ref)
+    vx, vy = _proyectar_km(linea[:, 1], linea[:, 0], lat_ref)
+    if len(linea) == 1:
+        return np.hypot(px - vx[0], py - vy[0])
+
+    # Puntos (n, 1) contra segmentos (1, m-1)
+    ax, ay, bx, by = vx[:-1], vy[:-1], vx[1:], vy[1:]
+    dx, dy = bx - ax, by - ay
+    largo2 = np.where(dx ** 2 + dy ** 2 == 0, 1e-12, dx ** 2 + dy ** 2)
+    t = np.clip(((px[:, None] - ax) * dx + (py[:, None] - ay) * dy) / largo2, 0, 1)
+    distancias = np.hypot(px[:, None] - (ax + t * dx), py[:, None] - (ay + t * dy))
+    return distancias.min(axis=1)
+
+
+def dentro_anillo(lat, lon, anillo):
+    """True para los puntos dentro de un anillo (arreglo (m, 2) [lon, lat]), por cruce de rayos"""
+    anillo = np.asarray(anillo, dtype=float)
+    x, y = np.asarray(lon, dtype=float)[:, None], np.asarray(lat, dtype=float)[:, None]
+    x1, y1 = anillo[:, 0], anillo[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    cruza = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cruce = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return ((cruza & (x < x_cruce)).sum(axis=1) % 2) == 1
+
+
+def distancia_poligono_km(lat, lon, poligono):
+    """
+    Distancia en km de cada punto a un polígono (0 si está adentro)
+    poligono: lista de anillos [exterior, agujero, ...] como en GeoJSON
+    """
+    exterior, agujeros = poligono[0], poligono[1:]
+    adentro = dentro_anillo(lat, lon, exterior)
+    for agujero in agujeros:
+        adentro &= ~dentro_anillo(lat, lon, agujero)
+    borde = np.min([distancia_linea_km(lat, lon, anillo) for anillo in poligono], axis=0)
+    return np.where(adentro, 0.0, borde)
+
+
+class IndiceGrilla:
+    """
+    Índice espacial simple: cada objeto se registra en las celdas que toca su
+    caja (ampliada por su umbral), y un punto sólo se compara con los objetos
+    de su celda
+    """
+
+    def __init__(self, paso=0.5):
+        self.paso = paso
+        self.celdas = defaultdict(list)
+
+    def _celda(self, lat, lon):
+        return np.floor(np.asarray(lat) / self.paso).astype(int), np.floor(np.asarray(lon) / self.paso).astype(int)
+
+    def agregar(self, identificador, lat_min, lon_min, lat_max, lon_max, margen_km=0.0):
+        """Registra un objeto por su caja envolvente más un margen en km"""
+        margen_lat = margen_km / KM_POR_GRADO
+        margen_lon = margen_km / (KM_POR_GRADO * max(np.cos(np.radians(max(abs(lat_min), abs(lat_max)))), 0.01))
+        fila_min, col_min = self._celda(lat_min - margen_lat, lon_min - margen_lon)
+        fila_max, col_max = self._celda(lat_max + margen_lat, lon_max + margen_lon)
+        for fila in range(int(fila_min), int(fila_max) + 1):
+            for columna in range(int(col_min), int(col_max) + 1):
+                self.celdas[(fila, columna)].append(identificador)
+
+    def candidatos(self, lat, lon):
+        """{identificador: índices de los puntos que caen en alguna de sus celdas}"""
+        filas, columnas = self._celda(lat, lon)
+        puntos = defaultdict(list)
+        claves = np.stack([filas, columnas], axis=1) if len(filas) else np.empty((0, 2), dtype=int)
+        unicas, inversa = np.unique(claves, axis=0, return_inverse=True)
+        inversa = inversa.reshape(-1)
+        for posicion, (fila, columna) in enumerate(unicas):
+            identificadores = self.celdas.get((int(fila), int(columna)))
+            if identificadores:
+                indices = np.flatnonzero(inversa == posicion)
+                for identificador in identificadores:
+                    puntos[identificador].append(indices)
+        return {i: np.concatenate(partes) for i, partes in puntos.items()}
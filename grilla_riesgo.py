@@ -0,0 +1,72 @@
+"""
+Grilla horaria de riesgo sobre toda la zona de monitoreo
+
+La zona (zona_bounds) se divide en celdas de 0.1° con centro en múltiplos de
+0.1° (los mismos puntos que lat/lon redondeadas a un decimal). Cada celda
+tiene un id entero: fila * columnas + columna, con la fila 0 al sur y la
+columna 0 al oeste. Los valores se guardan como arreglos planos indexados por
+ese id, así una detección obtiene su riesgo con un acceso directo al arreglo.
+Los valores son float32: la grilla completa de la Patagonia ocupa unos 80 KB.
+"""
+import numpy as np
+
+# Variables guardadas por celda (mismos nombres que las columnas de las detecciones):
+# meteorología de la hora actual, códigos e índices del sistema FWI e índice de riesgo
+VARIABLES = ('viento_kmh', 'humedad_relativa', 'temperatura_c', 'lluvia_7d_mm',
+             'ffmc', 'dmc', 'dc', 'isi', 'bui', 'fwi', 'indice_riesgo')
+
+
+class GrillaRiesgo:
+    """Definición de la grilla y valores por celda"""
+
+    def __init__(self, lon_min, lat_min, columnas, filas, paso=0.1, hora=None, valores=None):
+        self.lon_min = lon_min
+        self.lat_min = lat_min
+        self.columnas = columnas
+        self.filas = filas
+        self.paso = paso
+        self.hora = hora
+        self.valores = valores if valores is not None else {
+            variable: np.full(columnas * filas, np.nan, dtype=np.float32) for variable in VARIABLES
+        }
+
+    @classmethod
+    def desde_bounds(cls, zona_bounds, paso=0.1):
+        """Grilla que cubre un área "oeste,sur,este,norte" (formato de FIRMS)"""
+        oeste, sur, este, norte = (float(v) for v in zona_bounds.split(','))
+        lon_min = round(oeste / paso) * paso
+        lat_min = round(sur / paso) * paso
+        columnas = int(round((este - lon_min) / paso)) + 1
+        filas = int(round((norte - lat_min) / paso)) + 1
+        return cls(round(lon_min, 6), round(lat_min, 6), columnas, filas, paso)
+
+    def __len__(self):
+        return self.columnas * self.filas
+
+    def centros(self):
+        """Latitud y longitud del centro de cada celda, en orden de id"""
+        ids = np.arange(len(self))
+        lat = self.lat_min + (ids // self.columnas) * self.paso
+        lon = self.lon_min + (ids % self.columnas) * self.paso
+        return np.round(lat, 4), np.round(lon, 4)
+
+    def celda(self, lat, lon):
+        """
+        Id de la celda más cercana a cada punto
+        Los puntos en el borde de la zona caen en la celda del borde
+        """
+        fila = np.clip(np.rint((np.asarray(lat, dtype=float) - self.lat_min) / self.paso), 0, self.filas - 1)
+        columna = np.clip(np.rint((np.asarray(lon, dtype=float) - self.lon_min) / self.paso), 0, self.columnas - 1)
+        return fila.astype(np.int32) * self.columnas + columna.astype(np.int32)
+
+    def bounds(self):
+        """Extremos de la grilla para una capa de imagen: [[sur, oeste], [norte, este]]"""
+        medio = self.paso / 2
+        return [
+            [self.lat_min - medio, self.lon_min - medio],
+            [self.lat_min + (self.filas - 1) * self.paso + medio, self.lon_min + (self.columnas - 1) * self.paso + medio]
+        ]
+
+    def matriz(self, variable='indice_riesgo'):
+        """Valores como matriz (filas, columnas) con la fila 0 al norte, como una imagen"""
+        return self.valores[variable].reshape(self.filas, self.columnas)[::-1]
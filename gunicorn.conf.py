@@ -0,0 +1,14 @@
+import os
+
+# Workers gevent: las conexiones SSE de /api/progreso y las descargas desde
+# Storage esperan sin bloquear el worker, así un worker atiende muchos clientes
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+# Con gevent el timeout sólo vigila que el worker responda, no la duración de
+# cada pedido: los flujos SSE pueden quedar abiertos indefinidamente
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+keepalive = 5
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
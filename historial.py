@@ -0,0 +1,169 @@
+"""
+Historial de estadísticas: una fila por actualización, sólo se agrega
+
+La tabla 'stats' guarda una sola fila (id=1) con textos para mostrar
+("18.2 MW", "1,234 ha") que cada corrida pisa. Cada publicación agrega además
+una fila con valores numéricos y hora en UTC a la tabla 'stats_historial'
+(esquema en esquema.sql; el pipeline escribe con la clave service_role), así
+se puede graficar cómo evolucionaron los totales entre actualizaciones.
+
+/api/stats/history devuelve cada serie reducida a la cantidad de puntos pedida:
+    lttb      Largest-Triangle-Three-Buckets: conserva la forma visual de la curva
+    minmax    mínimo y máximo de cada intervalo de tiempo: conserva los picos
+
+Como el historial sólo crece, cada worker guarda en memoria las filas leídas y
+en cada consulta (cada TTL_HISTORIAL segundos) pide sólo las posteriores a la
+última. Se calcula en Python puro: no importa numpy en la app web.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+TABLA = "stats_historial"
+
+# Series numéricas de cada fila del historial
+SERIES = ('total_focos', 'focos_alta_confianza', 'frp_promedio', 'frp_maximo', 'indice_riesgo_promedio',
+          'focos_riesgo_alto', 'porcentaje_riesgo_alto', 'superficie_estimada_ha')
+
+METODOS = ('lttb', 'minmax')
+
+# Puntos por serie cuando no se pide otra cantidad, y tope
+PUNTOS_POR_DEFECTO = 100
+PUNTOS_MAXIMOS = 2000
+
+# Filas por pedido al leer la tabla (el máximo por defecto de PostgREST)
+FILAS_POR_PAGINA = 1000
+
+# Segundos que un worker reutiliza las filas leídas antes de buscar nuevas
+TTL_HISTORIAL = 30
+
+
+# ============================================================
+# LADO PIPELINE: agregar una fila
+# ============================================================
+
+def fila_historial(resumen, generado=None):
+    """Fila del historial a partir del resumen de la corrida (hora en UTC)"""
+    generado = generado or datetime.now(timezone.utc)
+    return {
+        'generado': generado.isoformat(timespec='seconds'),
+        'total_focos': resumen['total_detecciones'],
+        'focos_alta_confianza': resumen['detecciones_alta_confianza'],
+        'frp_promedio': resumen['frp_promedio'],
+        'frp_maximo': resumen['frp_maximo'],
+        'indice_riesgo_promedio': resumen['indice_riesgo_promedio'],
+        'focos_riesgo_alto': resumen['focos_riesgo_alto'],
+        'porcentaje_riesgo_alto': resumen['porcentaje_riesgo_alto'],
+        'superficie_estimada_ha': resumen['superficie_estimada_ha'],
+        'nivel_predominante': resumen['nivel_predominante'],
+        'fecha_inicio': resumen['fecha_inicio'],
+        'fecha_fin': resumen['fecha_fin']
+    }
+
+
+def agregar_al_historial(cliente, resumen):
+    """Inserta la fila de esta corrida; un error no frena la publicación"""
+    try:
+        cliente.table(TABLA).insert(fila_historial(resumen)).execute()
+        return True
+    except Exception as e:
+        print(f"⚠️  No se pudo agregar la fila al historial ({e}); ¿se creó la tabla {TABLA}?")
+        return False
+
+
+# ============================================================
+# REDUCCIÓN DE SERIES
+# ============================================================
+
+def lttb(puntos, cantidad):
+    """
+    Largest-Triangle-Three-Buckets sobre [(x, y), ...] ordenados por x
+    Conserva el primero y el último; de cada intervalo intermedio elige el punto
+    que forma el triángulo de mayor área con el elegido antes y el promedio del siguiente
+    """
+    if cantidad >= len(puntos):
+        return list(puntos)
+    if cantidad < 3:
+        return [puntos[0], puntos[-1]][:cantidad]
+
+    elegidos = [puntos[0]]
+    ancho = (len(puntos) - 2) / (cantidad - 2)
+    anterior = puntos[0]
+    for i in range(cantidad - 2):
+        inicio, fin = int(i * ancho) + 1, int((i + 1) * ancho) + 1
+        siguiente = puntos[fin:min(int((i + 2) * ancho) + 1, len(puntos))] or [puntos[-1]]
+        x_medio = sum(p[0] for p in siguiente) / len(siguiente)
+        y_medio = sum(p[1] for p in siguiente) / len(siguiente)
+        anterior = max(
+            puntos[inicio:fin],
+            key=lambda p: abs((anterior[0] - x_medio) * (p[1] - anterior[1])
+                              - (anterior[0] - p[0]) * (y_medio - anterior[1]))
+        )
+        elegidos.append(anterior)
+    elegidos.append(puntos[-1])
+    return elegidos
+
+
+def min_max(puntos, cantidad):
+    """Mínimo y máximo (en orden de x) de cantidad // 2 intervalos de igual duración"""
+    if cantidad >= len(puntos) or len(puntos) < 2:
+        return list(puntos)
+    cubetas = max(cantidad // 2, 1)
+    x_inicio, duracion = puntos[0][0], (puntos[-1][0] - puntos[0][0]) or 1
+    grupos = {}
+    for punto in puntos:
+        grupos.setdefault(min(int((punto[0] - x_inicio) / duracion * cubetas), cubetas - 1), []).append(punto)
+    elegidos = []
+    for cubeta in sorted(grupos):
+        grupo = grupos[cubeta]
+        extremos = {min(grupo, key=lambda p: p[1]), max(grupo, key=lambda p: p[1])}
+        elegidos.extend(sorted(extremos))
+    return elegidos
+
+
+REDUCTORES = {'lttb': lttb, 'minmax': min_max}
+
+
+def serie(filas, nombre, cantidad=PUNTOS_POR_DEFECTO, metodo='lttb'):
+    """[[hora UTC ISO, valor], ...] de una serie, reducida a cantidad puntos"""
+    puntos = [(fila['_x'], fila[nombre]) for fila in filas if fila.get(nombre) is not None]
+    return [[datetime.fromtimestamp(x, timezone.utc).isoformat(timespec='seconds'), y]
+            for x, y in REDUCTORES[metodo](puntos, cantidad)]
+
+
+# ============================================================
+# LADO WEB: lectura incremental
+# ============================================================
+
+_filas = []
+_leido = None  # momento de la última lectura (None: todavía no se leyó)
+_cerrojo = threading.Lock()
+
+
+def _marca(iso):
+    return datetime.fromisoformat(iso.replace('Z', '+00:00')).timestamp()
+
+
+def filas_historial(cliente):
+    """Filas del historial ordenadas por hora; sólo se piden las nuevas desde la última lectura"""
+    global _leido
+    with _cerrojo:
+        if _leido is not None and time.monotonic() - _leido < TTL_HISTORIAL:
+            return _filas
+        columnas = ','.join(('generado',) + SERIES)
+        while True:
+            consulta = cliente.table(TABLA).select(columnas).order('generado')
+            if _filas:
+                consulta = consulta.gt('generado', _filas[-1]['generado'])
+            nuevas = consulta.range(0, FILAS_POR_PAGINA - 1).execute().data
+            antes = len(_filas)
+            ultima = _filas[-1]['_x'] if _filas else float('-inf')
+            for fila in nuevas:
+                fila['_x'] = _marca(fila['generado'])
+                if fila['_x'] > ultima:
+                    _filas.append(fila)
+                    ultima = fila['_x']
+            if len(nuevas) < FILAS_POR_PAGINA or len(_filas) == antes:
+                break
+        _leido = time.monotonic()
+        return _filas
@@ -2,6 +2,7 @@ import requests
 import pandas as pd
 import folium
 from folium.plugins import HeatMap, MarkerCluster
+from branca.element import MacroElement, Template
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
@@ -9,6 +10,196 @@ import numpy as np
 from io import StringIO
 import time
 import os
+import json
+import hashlib
+from archivo_respuestas import ArchivoRespuestas, RespuestaNoArchivada
+from grilla_riesgo import GrillaRiesgo
+import fwi
+import territorio
+from climatologia import linea_base_en_fechas
+from resumen import calcular_resumen, fecha_corta, fila_stats
+
+# Colores según riesgo (el orden define el código de nivel en las capas temporales)
+COLORES_RIESGO = {
+    "BAJO": "green",
+    "MODERADO": "lightgreen",
+    "ALTO": "orange",
+    "MUY ALTO": "red",
+    "EXTREMO": "purple"
+}
+
+# Colores de la capa de riesgo horario (RGB de los nombres de COLORES_RIESGO)
+RGB_COLORES = {
+    "green": (0, 128, 0),
+    "lightgreen": (144, 238, 144),
+    "orange": (255, 165, 0),
+    "red": (255, 0, 0),
+    "purple": (128, 0, 128)
+}
+
+# Límites entre niveles de riesgo (ver clasificar_riesgo)
+UMBRALES_RIESGO = [20, 40, 60, 80]
+
+# Datos meteorológicos usados cuando Open-Meteo no responde
+METEO_POR_DEFECTO = {
+    'viento_kmh': 10.0,
+    'humedad_relativa': 50.0,
+    'temperatura_c': 20.0,
+    'lluvia_7d_mm': 0.0
+}
+
+# Nombre de archivo de cada capa según el modo temporal del mapa
+FORMATOS_PERIODO = {
+    'dia': '%Y-%m-%d',
+    'semana': '%G-W%V'
+}
+
+class ControlTemporal(MacroElement):
+    """
+    Slider de períodos para el mapa: descarga cada capa sólo cuando se la
+    selecciona y guarda en caché las que ya se cargaron
+    """
+    _template = Template("""
+        {% macro html(this, kwargs) %}
+        <div id="control-temporal" style="position: fixed; bottom: 20px; left: 50px; width: 380px;
+                    background-color: white; border:2px solid grey; z-index:9999;
+                    font-size:12px; padding: 10px; border-radius: 5px;">
+            <div style="display:flex; align-items:center; gap:8px;">
+                <button id="ct-play" type="button">▶</button>
+                <input id="ct-slider" type="range" min="0" max="0" value="0" style="flex:1;" disabled>
+            </div>
+            <p id="ct-etiqueta" style="margin:6px 0 0 0; font-weight:bold;">Cargando períodos...</p>
+        </div>
+        {% endmacro %}
+
+        {% macro script(this, kwargs) %}
+        (function() {
+            var URL_CAPAS = {{ this.url_capas|tojson }};
+            var ARCHIVO_INDICE = {{ this.archivo_indice|tojson }};
+            var cache = {};
+            var pendientes = {};
+            var periodos = [];
+            var niveles = [];
+            var colores = [];
+            var actual = null;
+            var reproduciendo = null;
+
+            function mapa() { return {{ this._parent.get_name() }}; }
+
+            function popup(c, i) {
+                var nivel = c.nivel[i] >= 0 ? niveles[c.nivel[i]] : 'N/A';
+                return '<b>🔥 Incendio - Riesgo: ' + nivel + '</b><br>' +
+                    '📅 ' + c.fecha[i] + '<br>🕐 ' + c.hora[i] + '<br>' +
+                    '⚡ FRP: ' + c.frp[i] + ' MW<br>✅ Confianza: ' + c.conf[i] + '%<br>' +
+                    '📍 ' + c.lat[i] + ', ' + c.lon[i] + '<br><hr>' +
+                    '<b>🌤️ Datos Meteorológicos:</b><br>' +
+                    '💨 Viento: ' + c.viento[i] + ' km/h<br>💧 Humedad: ' + c.humedad[i] + '%<br>' +
+                    '🌡️ Temperatura: ' + c.temp[i] + '°C<br>🌧️ Lluvia 7d: ' + c.lluvia[i] + ' mm<br>' +
+                    '⚠️ Índice Riesgo: ' + c.indice[i] + '/100';
+            }
+
+            function construirCapa(c) {
+                var renderer = L.canvas();
+                var grupo = L.layerGroup();
+                for (var i = 0; i < c.lat.length; i++) {
+                    var color = c.nivel[i] >= 0 ? colores[c.nivel[i]] : 'gray';
+                    L.circleMarker([c.lat[i], c.lon[i]], {
+                        renderer: renderer, radius: 6, color: color, fillColor: color, fillOpacity: 0.8, weight: 1
+                    }).bindPopup(popup(c, i), {maxWidth: 300}).addTo(grupo);
+                }
+                return grupo;
+            }
+
+            function obtenerCapa(p) {
+                var periodo = p.periodo;
+                if (cache[periodo]) return Promise.resolve(cache[periodo]);
+                if (!pendientes[periodo]) {
+                    pendientes[periodo] = fetch(URL_CAPAS + '/' + p.archivo)
+                        .then(function(r) { if (!r.ok) throw new Error(r.status); return r.json(); })
+                        .then(function(c) { cache[periodo] = construirCapa(c); return cache[periodo]; })
+                        .finally(function() { delete pendientes[periodo]; });
+                }
+                return pendientes[periodo];
+            }
+
+            function mostrar(pos) {
+                var p = periodos[pos];
+                var etiqueta = document.getElementById('ct-etiqueta');
+                etiqueta.textContent = p.periodo + ' — ' + p.focos + ' focos (cargando...)';
+                obtenerCapa(p).then(function(capa) {
+                    // Ignorar respuestas tardías si el slider ya se movió
+                    if (periodos[document.getElementById('ct-slider').value] !== p) return;
+                    if (actual) mapa().removeLayer(actual);
+                    actual = capa.addTo(mapa());
+                    etiqueta.textContent = p.periodo + ' — ' + p.focos + ' focos';
+                }).catch(function(e) {
+                    etiqueta.textContent = p.periodo + ' — error cargando capa (' + e.message + ')';
+                });
+            }
+
+            function iniciar() {
+                fetch(URL_CAPAS + '/' + ARCHIVO_INDICE)
+                    .then(function(r) { return r.json(); })
+                    .then(function(indice) {
+                        periodos = indice.periodos;
+                        niveles = indice.niveles;
+                        colores = indice.colores;
+                        if (periodos.length === 0) {
+                            document.getElementById('ct-etiqueta').textContent = 'Sin períodos disponibles';
+                            return;
+                        }
+                        var slider = document.getElementById('ct-slider');
+                        slider.max = periodos.length - 1;
+                        slider.value = periodos.length - 1;
+                        slider.disabled = false;
+                        slider.addEventListener('input', function() { mostrar(parseInt(slider.value, 10)); });
+                        mostrar(periodos.length - 1);
+                    })
+                    .catch(function() {
+                        document.getElementById('ct-etiqueta').textContent = 'No se pudo cargar el índice de capas';
+                    });
+
+                document.getElementById('ct-play').addEventListener('click', function() {
+                    var boton = this;
+                    if (reproduciendo) {
+                        clearInterval(reproduciendo);
+                        reproduciendo = null;
+                        boton.textContent = '▶';
+                        return;
+                    }
+                    var slider = document.getElementById('ct-slider');
+                    if (parseInt(slider.value, 10) >= periodos.length - 1) slider.value = 0;
+                    boton.textContent = '⏸';
+                    reproduciendo = setInterval(function() {
+                        var siguiente = parseInt(slider.value, 10) + 1;
+                        if (siguiente >= periodos.length) {
+                            clearInterval(reproduciendo);
+                            reproduciendo = null;
+                            boton.textContent = '▶';
+                            return;
+                        }
+                        slider.value = siguiente;
+                        mostrar(siguiente);
+                        // Precargar el período siguiente mientras se muestra el actual
+                        if (siguiente + 1 < periodos.length) obtenerCapa(periodos[siguiente + 1]);
+                    }, 1000);
+                });
+            }
+
+            if (document.readyState === 'loading') {
+                document.addEventListener('DOMContentLoaded', iniciar);
+            } else {
+                iniciar();
+            }
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, url_capas, archivo_indice):
+        super().__init__()
+        self._name = 'ControlTemporal'
+        self.url_capas = url_capas.rstrip('/')
+        self.archivo_indice = archivo_indice
 
 class AnalizadorIncendiosHistorico:
     """
@@ -16,87 +207,152 @@ class AnalizadorIncendiosHistorico:
     Se actualiza automáticamente cada vez que se ejecuta
     """
     
-    def __init__(self, map_key):
+    def __init__(self, map_key, archivo=None):
         self.map_key = map_key
         
+        # Grabación/reproducción de respuestas de FIRMS y Open-Meteo (ver archivo_respuestas.py)
+        self.archivo = archivo if archivo is not None else ArchivoRespuestas.desde_entorno()
+        
+        # Callback opcional de progreso: eventos(tipo, **datos) (ver eventos.py)
+        self.eventos = None
+        
         # Zona ampliada: Patagonia Argentina
         self.zona_bounds = "-72.5,-47,-69,-42"
         
-        self.fecha_inicio_incendios = datetime(2026, 1, 1)
+        # La temporada actual empieza el 1 de enero (las anteriores están en el almacén, ver climatologia.py)
+        self.fecha_inicio_incendios = datetime(self.ahora().year, 1, 1)
         
         # API Open-Meteo (gratis, sin key)
         self.openmeteo_url = "https://api.open-meteo.com/v1/forecast"
     
-    def obtener_datos_meteorologicos(self, lat, lon):
+    def ahora(self):
+        """Fecha de referencia: la de la sesión grabada al reproducir, la actual en otro caso"""
+        if self.archivo is not None:
+            return self.archivo.fecha_referencia
+        return datetime.now()
+    
+    def _get_texto(self, url, params=None, timeout=10):
         """
-        Obtiene datos meteorológicos actuales e históricos de Open-Meteo
-        Retorna: viento (km/h), humedad (%), temperatura (°C), lluvia_7d (mm)
+        GET que retorna el texto de la respuesta, pasando por el archivo de respuestas si está activo
+        La MAP_KEY no forma parte de la clave archivada, así la sesión sirve con otra key
         """
-        try:
-            # Obtener datos actuales y de los últimos 7 días
-            params = {
-                'latitude': lat,
-                'longitude': lon,
-                'hourly': 'temperature_2m,relative_humidity_2m,wind_speed_10m,precipitation',
-                'past_days': 7,  # Últimos 7 días para lluvia acumulada
-                'forecast_days': 0,  # Solo datos históricos/actuales
-                'timezone': 'auto'
-            }
-            
-            response = requests.get(self.openmeteo_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Extraer datos de la hora actual (última hora disponible)
-            hourly = data['hourly']
-            last_idx = len(hourly['time']) - 1
-            
-            viento_kmh = hourly['wind_speed_10m'][last_idx] * 3.6  # m/s a km/h
-            humedad = hourly['relative_humidity_2m'][last_idx]
-            temperatura = hourly['temperature_2m'][last_idx]
-            
-            # Calcular lluvia acumulada a 7 días (suma de precipitación)
-            precipitacion_total = sum(hourly['precipitation'][:last_idx+1])
-            
-            return {
-                'viento_kmh': round(viento_kmh, 1),
-                'humedad_relativa': round(humedad, 1),
-                'temperatura_c': round(temperatura, 1),
-                'lluvia_7d_mm': round(precipitacion_total, 1)
-            }
-            
-        except Exception as e:
-            print(f"⚠️  Error obteniendo datos meteorológicos: {e}")
-            # Datos por defecto en caso de error
-            return {
-                'viento_kmh': 10.0,
-                'humedad_relativa': 50.0,
-                'temperatura_c': 20.0,
-                'lluvia_7d_mm': 0.0
-            }
+        url_archivo = url.replace(self.map_key, 'MAP_KEY') if self.map_key else url
+        if self.archivo is not None and self.archivo.reproduciendo:
+            return self.archivo.leer(url_archivo, params)
+        
+        response = requests.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        
+        if self.archivo is not None:
+            self.archivo.guardar(url_archivo, params, response.text)
+        return response.text
+    
+    def _evento(self, tipo, **datos):
+        """Notifica progreso si hay un callback configurado"""
+        if self.eventos is not None:
+            self.eventos(tipo, **datos)
+    
+    def _pausa(self, segundos):
+        """Pausa para no saturar las APIs (innecesaria al reproducir desde el archivo)"""
+        if self.archivo is None or not self.archivo.reproduciendo:
+            time.sleep(segundos)
+    
+    def _meteo_desde_horario(self, hourly):
+        """Datos de la hora actual (última disponible) y lluvia acumulada de una serie horaria de Open-Meteo"""
+        last_idx = len(hourly['time']) - 1
+        
+        viento_kmh = hourly['wind_speed_10m'][last_idx] * 3.6  # m/s a km/h
+        humedad = hourly['relative_humidity_2m'][last_idx]
+        temperatura = hourly['temperature_2m'][last_idx]
+        
+        # Calcular lluvia acumulada a 7 días (suma de precipitación)
+        precipitacion_total = sum(hourly['precipitation'][:last_idx+1])
+        
+        return {
+            'viento_kmh': round(viento_kmh, 1),
+            'humedad_relativa': round(humedad, 1),
+            'temperatura_c': round(temperatura, 1),
+            'lluvia_7d_mm': round(precipitacion_total, 1)
+        }
     
-    def calcular_riesgo_fwi(self, viento, humedad, lluvia, temperatura):
+    def _meteo_diario_desde_horario(self, hourly):
         """
-        Calcula riesgo basado en la regla 30-30-30 y el índice FWI
+        Entradas diarias del sistema FWI de una serie horaria (hora local): temperatura,
+        humedad y viento al mediodía, y lluvia de las 24 horas que terminan al mediodía
         """
-        # REGLA ORO: Si se cumple 30-30-30, el riesgo es CRÍTICO
-        if temperatura >= 30 and humedad <= 30 and viento >= 30:
-            return 100.0
-            
-        # Si no se cumple la regla, calculamos el riesgo ponderado
-        viento_norm = min(viento / 50, 1.0)
-        humedad_norm = (100 - humedad) / 100
-        lluvia_norm = max(0, 1 - (lluvia / 50))
-        temp_norm = min((temperatura - 10) / 30, 1.0)
+        horas = np.array(hourly['time'])
+        serie = lambda nombre: np.array(hourly[nombre], dtype=float)
+        # Un mediodía sin datos no se procesa: no debe contar como día ya calculado
+        mediodias = np.flatnonzero(np.char.endswith(horas.astype(str), 'T12:00')
+                                   & ~np.isnan(serie('temperature_2m')))
+        lluvia = np.nancumsum(np.concatenate([[0.0], serie('precipitation')]))
+        return {
+            'fechas': [h[:10] for h in horas[mediodias]],
+            'temperatura_c': serie('temperature_2m')[mediodias],
+            'humedad_relativa': serie('relative_humidity_2m')[mediodias],
+            'viento_kmh': serie('wind_speed_10m')[mediodias] * 3.6,
+            'lluvia_24h_mm': lluvia[mediodias + 1] - lluvia[np.maximum(mediodias - 23, 0)]
+        }
+    
+    def calcular_fwi_grilla(self, grilla, diarios, lat):
+        """
+        Sistema FWI sobre todas las celdas, continuando los códigos de humedad de la
+        corrida anterior: sólo se procesan los días posteriores al último guardado
+        diarios: una serie de _meteo_diario_desde_horario por celda (None si no hubo datos)
+        """
+        firma = f"{grilla.lon_min},{grilla.lat_min},{grilla.columnas},{grilla.filas},{grilla.paso}"
+        # Al reproducir una sesión grabada no se lee ni se modifica el estado real
+        reproduciendo = self.archivo is not None and self.archivo.reproduciendo
+        ultima, estado = (None, None) if reproduciendo else fwi.cargar_estado(firma)
+        
+        fechas = sorted({f for d in diarios if d is not None for f in d['fechas']})
+        nuevas = [f for f in fechas if ultima is None or f > ultima]
+        posicion = {f: i for i, f in enumerate(nuevas)}
+        matrices = {v: np.full((len(nuevas), len(grilla)), np.nan)
+                    for v in ('temperatura_c', 'humedad_relativa', 'viento_kmh', 'lluvia_24h_mm')}
+        for celda, diario in enumerate(diarios):
+            if diario is None:
+                continue
+            filas = [posicion.get(f, -1) for f in diario['fechas']]
+            validas = np.array([f >= 0 for f in filas], dtype=bool)
+            for v, matriz in matrices.items():
+                matriz[np.array(filas, dtype=int)[validas], celda] = diario[v][validas]
+        
+        if estado is None:
+            estado = fwi.estado_inicial(len(grilla))
+            print(f"   🔥 FWI: sin estado previo, se inicia con FFMC {fwi.FFMC_INICIAL} / DMC {fwi.DMC_INICIAL} / DC {fwi.DC_INICIAL}")
+        if nuevas:
+            hoy = fwi.calcular_serie(estado, nuevas, matrices['temperatura_c'], matrices['humedad_relativa'],
+                                     matrices['viento_kmh'], matrices['lluvia_24h_mm'], lat)
+            if not reproduciendo:
+                fwi.guardar_estado(firma, nuevas[-1], hoy)
+            print(f"   🔥 FWI actualizado hasta {nuevas[-1]} ({len(nuevas)} días nuevos)")
+        else:
+            # Sin días nuevos: los índices del último día procesado
+            hoy = {indice: estado.get(indice, np.full(len(grilla), np.nan)) for indice in fwi.INDICES}
         
+        for indice in fwi.INDICES:
+            grilla.valores[indice] = np.asarray(hoy[indice], dtype=np.float32)
+        return grilla
+    
+    def calcular_riesgo_vectorizado(self, viento, humedad, lluvia, temperatura):
+        """
+        Índice ponderado (viento, humedad, lluvia, temperatura) con la regla 30-30-30
+        Sólo para las celdas de la grilla sin serie diaria para el FWI
+        """
+        viento, humedad, lluvia, temperatura = (
+            np.asarray(v, dtype=float) for v in (viento, humedad, lluvia, temperatura)
+        )
         indice = (
-            viento_norm * 0.4 +
-            humedad_norm * 0.3 +
-            lluvia_norm * 0.2 +
-            temp_norm * 0.1
+            np.minimum(viento / 50, 1.0) * 0.4 +
+            (100 - humedad) / 100 * 0.3 +
+            np.maximum(0, 1 - (lluvia / 50)) * 0.2 +
+            np.minimum((temperatura - 10) / 30, 1.0) * 0.1
         ) * 100
+        indice = np.round(np.clip(indice, 0, 100), 1)
         
-        return round(max(0, min(indice, 100)), 1)
+        # REGLA ORO: 30-30-30 → riesgo CRÍTICO
+        return np.where((temperatura >= 30) & (humedad <= 30) & (viento >= 30), 100.0, indice)
     
     def clasificar_riesgo(self, indice):
         """
@@ -115,107 +371,8 @@ class AnalizadorIncendiosHistorico:
         else:
             return "EXTREMO"
     
-    def agregar_datos_meteorologicos_rapido(self, df):
-        """
-        Versión RÁPIDA: Agrupa ubicaciones similares para reducir llamadas API
-        """
-        print("\n🌤️  Obteniendo datos meteorológicos (modo rápido)...")
-        
-        # Crear caché para ubicaciones ya consultadas
-        cache_meteo = {}
-        
-        # Agrupar ubicaciones similares (misma lat/lon redondeada)
-        print("   Agrupando ubicaciones similares...")
-        df['lat_redondeada'] = df['latitude'].round(1)  # Redondear a ~11km
-        df['lon_redondeada'] = df['longitude'].round(1)
-        
-        # Obtener ubicaciones únicas
-        ubicaciones_unicas = df[['lat_redondeada', 'lon_redondeada']].drop_duplicates()
-        print(f"   {len(ubicaciones_unicas)} ubicaciones únicas de {len(df)} incendios")
-        
-        datos_meteo = []
-        
-        # Procesar ubicaciones únicas
-        for i, (idx, row) in enumerate(ubicaciones_unicas.iterrows()):
-            if i % 10 == 0:
-                print(f"   Procesando ubicación {i+1}/{len(ubicaciones_unicas)}...")
-            
-            lat, lon = row['lat_redondeada'], row['lon_redondeada']
-            
-            # Verificar caché primero
-            cache_key = f"{lat:.1f}_{lon:.1f}"
-            if cache_key in cache_meteo:
-                datos_meteo.append(cache_meteo[cache_key])
-                continue
-            
-            try:
-                # Obtener datos meteorológicos para esta ubicación
-                meteo = self.obtener_datos_meteorologicos(lat, lon)
-                
-                # Calcular riesgo
-                indice_riesgo = self.calcular_riesgo_fwi(
-                    meteo['viento_kmh'],
-                    meteo['humedad_relativa'],
-                    meteo['lluvia_7d_mm'],
-                    meteo['temperatura_c']
-                )
-                
-                nivel_riesgo = self.clasificar_riesgo(indice_riesgo)
-                
-                # Datos para esta ubicación
-                datos_ubicacion = {
-                    'lat_redondeada': lat,
-                    'lon_redondeada': lon,
-                    'viento_kmh': meteo['viento_kmh'],
-                    'humedad_relativa': meteo['humedad_relativa'],
-                    'temperatura_c': meteo['temperatura_c'],
-                    'lluvia_7d_mm': meteo['lluvia_7d_mm'],
-                    'indice_riesgo': indice_riesgo,
-                    'nivel_riesgo': nivel_riesgo
-                }
-                
-                # Guardar en caché
-                cache_meteo[cache_key] = datos_ubicacion
-                datos_meteo.append(datos_ubicacion)
-                
-                # Pequeña pausa para no saturar API
-                if i % 20 == 0 and i > 0:
-                    time.sleep(0.1)
-                    
-            except Exception as e:
-                print(f"⚠️  Error en ubicación {lat},{lon}: {e}")
-                # Datos por defecto
-                datos_default = {
-                    'lat_redondeada': lat,
-                    'lon_redondeada': lon,
-                    'viento_kmh': 10.0,
-                    'humedad_relativa': 50.0,
-                    'temperatura_c': 20.0,
-                    'lluvia_7d_mm': 0.0,
-                    'indice_riesgo': 25.0,
-                    'nivel_riesgo': "MODERADO"
-                }
-                cache_meteo[cache_key] = datos_default
-                datos_meteo.append(datos_default)
-        
-        # Crear DataFrame de datos meteorológicos únicos
-        df_meteo_unicos = pd.DataFrame(datos_meteo)
-        
-        # Unir con el DataFrame original
-        df_completo = pd.merge(
-            df,
-            df_meteo_unicos,
-            on=['lat_redondeada', 'lon_redondeada'],
-            how='left'
-        )
-        
-        # Eliminar columnas temporales
-        df_completo = df_completo.drop(columns=['lat_redondeada', 'lon_redondeada'])
-        
-        print(f"✅ Datos meteorológicos agregados a {len(df)} incendios")
-        print(f"   📊 Llamadas API reducidas: de {len(df)} a {len(ubicaciones_unicas)}")
-        
-        # Mostrar resumen de riesgos
+    def mostrar_distribucion_riesgo(self, df_completo):
+        """Muestra resumen de riesgos"""
         distribucion = df_completo['nivel_riesgo'].value_counts()
         print("\n📊 Distribución de riesgos:")
         for nivel, cantidad in distribucion.items():
@@ -223,14 +380,92 @@ class AnalizadorIncendiosHistorico:
             print(f"   {nivel}: {cantidad} incendios ({porcentaje:.1f}%)")
         
         print(f"   📈 Índice de riesgo promedio: {df_completo['indice_riesgo'].mean():.1f}/100")
+    
+    def obtener_grilla_riesgo(self, paso=0.1, ubicaciones_por_pedido=100):
+        """
+        Riesgo de la hora actual en TODA la zona de monitoreo (no sólo donde ya hay focos)
+        Open-Meteo acepta varias coordenadas por pedido: la grilla de 0.1° se consulta
+        en lotes de ubicaciones_por_pedido celdas
+        """
+        grilla = GrillaRiesgo.desde_bounds(self.zona_bounds, paso)
+        grilla.hora = self.ahora().strftime('%Y-%m-%dT%H:00')
+        lat, lon = grilla.centros()
+        print(f"\n🗺️  Calculando grilla de riesgo: {grilla.filas}x{grilla.columnas} celdas de {paso}°...")
+        
+        variables = list(METEO_POR_DEFECTO)
+        valores = {v: np.empty(len(grilla)) for v in variables}
+        diarios = [None] * len(grilla)
+        lotes = range(0, len(grilla), ubicaciones_por_pedido)
+        errores = 0
+        
+        for numero, desde in enumerate(lotes, 1):
+            hasta = min(desde + ubicaciones_por_pedido, len(grilla))
+            params = {
+                'latitude': ','.join(f"{v:.1f}" for v in lat[desde:hasta]),
+                'longitude': ','.join(f"{v:.1f}" for v in lon[desde:hasta]),
+                'hourly': 'temperature_2m,relative_humidity_2m,wind_speed_10m,precipitation',
+                'wind_speed_unit': 'ms',
+                'past_days': 7,
+                'forecast_days': 0,
+                'timezone': 'auto'
+            }
+            try:
+                data = json.loads(self._get_texto(self.openmeteo_url, params, timeout=30))
+                # Con una sola coordenada Open-Meteo responde un objeto en lugar de una lista
+                ubicaciones = data if isinstance(data, list) else [data]
+                meteo = [self._meteo_desde_horario(u['hourly']) for u in ubicaciones]
+                diarios[desde:hasta] = [self._meteo_diario_desde_horario(u['hourly']) for u in ubicaciones]
+            except RespuestaNoArchivada:
+                raise
+            except Exception as e:
+                print(f"⚠️  Error en lote {numero}/{len(lotes)} de la grilla: {type(e).__name__}")
+                errores += 1
+                meteo = [METEO_POR_DEFECTO] * (hasta - desde)
+            
+            for v in variables:
+                valores[v][desde:hasta] = [m[v] for m in meteo]
+            
+            self._evento('meteo', resueltas=hasta, total=len(grilla))
+            self._pausa(0.1)
+        
+        for v in variables:
+            grilla.valores[v] = valores[v].astype(np.float32)
+        self.calcular_fwi_grilla(grilla, diarios, lat)
         
+        # Índice 0-100 desde el FWI; las celdas sin serie diaria usan la fórmula ponderada
+        ponderado = self.calcular_riesgo_vectorizado(
+            valores['viento_kmh'], valores['humedad_relativa'],
+            valores['lluvia_7d_mm'], valores['temperatura_c']
+        )
+        indice_fwi = np.round(fwi.indice_desde_fwi(grilla.valores['fwi']), 1)
+        indice = np.where(np.isnan(grilla.valores['fwi']), ponderado, indice_fwi)
+        # La alerta 30-30-30 (condiciones de la hora actual) se superpone al FWI
+        alerta = ((valores['temperatura_c'] >= 30) & (valores['humedad_relativa'] <= 30)
+                  & (valores['viento_kmh'] >= 30))
+        grilla.valores['indice_riesgo'] = np.where(alerta, 100.0, indice).astype(np.float32)
+        
+        print(f"✅ Grilla de riesgo: {len(grilla)} celdas en {len(lotes)} pedidos"
+              + (f" ({errores} lotes con datos por defecto)" if errores else ""))
+        print(f"   📈 Índice promedio en la zona: {np.nanmean(grilla.valores['indice_riesgo']):.1f}/100"
+              f" (FWI promedio {np.nanmean(grilla.valores['fwi']):.1f})")
+        return grilla
+    
+    def asignar_riesgo_grilla(self, df, grilla):
+        """Toma los datos meteorológicos y el riesgo de cada incendio de su celda en la grilla"""
+        celdas = grilla.celda(df['latitude'].to_numpy(), df['longitude'].to_numpy())
+        columnas = {}
+        for variable, valores in grilla.valores.items():
+            # float32 → float con un decimal
+            columnas[variable] = np.round(valores[celdas].astype(float), 1)
+        df_completo = df.assign(**columnas)
+        df_completo['nivel_riesgo'] = df_completo['indice_riesgo'].map(self.clasificar_riesgo)
         return df_completo
     
-    def obtener_datos_rango_fechas(self, fecha_inicio, fecha_fin, fuente="VIIRS_SNPP_NRT"):
+    def _bloques_firms(self, fecha_inicio, fecha_fin, fuente="VIIRS_SNPP_NRT", fallidos=None):
         """
-        Descarga datos dividiendo el rango en bloques de 5 días
+        Descarga el rango en bloques de 5 días y genera el DataFrame de cada bloque con datos
+        fallidos: lista donde se agrega (desde, hasta) de cada bloque que no se pudo descargar
         """
-        todos_los_datos = []
         fecha_actual = fecha_inicio
         
         print(f"\n📅 Descargando datos desde {fecha_inicio.strftime('%Y-%m-%d')} hasta {fecha_fin.strftime('%Y-%m-%d')}")
@@ -240,6 +475,7 @@ class AnalizadorIncendiosHistorico:
         print("-" * 70)
         
         bloque_num = 1
+        total_bloques = -(-((fecha_fin - fecha_inicio).days + 1) // 5)
         
         while fecha_actual <= fecha_fin:
             # Calcular el fin del bloque (máximo 5 días o hasta fecha_fin)
@@ -254,37 +490,55 @@ class AnalizadorIncendiosHistorico:
             url = f"https://firms.modaps.eosdis.nasa.gov/api/area/csv/{self.map_key}/{fuente}/{self.zona_bounds}/{dias_bloque}/{fecha_str}"
             
             print(f"Bloque {bloque_num}: {fecha_actual.strftime('%Y-%m-%d')} → {fecha_fin_bloque.strftime('%Y-%m-%d')} ({dias_bloque} días)")
+            df_bloque = None
+            fallido = False
             
             try:
-                response = requests.get(url, timeout=30)
-                response.raise_for_status()
-                
-                respuesta_texto = response.text.strip()
+                respuesta_texto = self._get_texto(url, timeout=30).strip()
                 
                 # Verificar si hay errores
                 if "Invalid" in respuesta_texto or "Error" in respuesta_texto:
                     print(f"   ⚠️  Error de API: {respuesta_texto[:100]}")
+                    fallido = True
                 else:
                     # Leer CSV
                     df_bloque = pd.read_csv(StringIO(respuesta_texto))
                     
                     if len(df_bloque) > 0 and 'acq_date' in df_bloque.columns:
-                        todos_los_datos.append(df_bloque)
                         print(f"   ✓ {len(df_bloque)} detecciones descargadas")
                     else:
                         print(f"   • Sin incendios en este período")
+                        df_bloque = None
                 
                 # Pausa para no saturar la API
-                time.sleep(0.5)
+                self._pausa(0.5)
                 
+            except RespuestaNoArchivada:
+                raise
             except Exception as e:
                 print(f"   ✗ Error: {e}")
+                fallido = True
+            
+            if fallido and fallidos is not None:
+                fallidos.append((fecha_str, fecha_fin_bloque.strftime('%Y-%m-%d')))
+            
+            self._evento('bloque_firms', bloque=bloque_num, total=total_bloques,
+                         desde=fecha_str, detecciones=len(df_bloque) if df_bloque is not None else 0)
+            
+            if df_bloque is not None:
+                yield df_bloque
             
             # Avanzar al siguiente bloque
             fecha_actual = fecha_fin_bloque + timedelta(days=1)
             bloque_num += 1
         
         print("-" * 70)
+    
+    def obtener_datos_rango_fechas(self, fecha_inicio, fecha_fin, fuente="VIIRS_SNPP_NRT"):
+        """
+        Descarga datos dividiendo el rango en bloques de 5 días
+        """
+        todos_los_datos = list(self._bloques_firms(fecha_inicio, fecha_fin, fuente))
         
         # Combinar todos los DataFrames
         if len(todos_los_datos) > 0:
@@ -300,12 +554,43 @@ class AnalizadorIncendiosHistorico:
             print(f"\n⚠️  No se encontraron datos")
             return None
     
+    def ingerir_en_almacen(self, almacen, fecha_inicio, fecha_fin, fuente="VIIRS_SNPP_NRT"):
+        """
+        Descarga un rango (pueden ser varias temporadas) directo al almacén particionado
+        Cada mes se escribe apenas los bloques lo completan: en memoria queda a lo sumo un mes
+        Retorna (detecciones nuevas, [(desde, hasta) de los bloques que fallaron]); volver a
+        ingerir el rango completa los que faltan sin duplicar lo ya guardado
+        """
+        pendientes = {}  # partición → bloques aún no escritos
+        nuevas = 0
+        fallidos = []
+        
+        def escribir(particiones):
+            nonlocal nuevas
+            for particion in particiones:
+                nuevas += almacen.agregar(pd.concat(pendientes.pop(particion), ignore_index=True))
+        
+        for df_bloque in self._bloques_firms(fecha_inicio, fecha_fin, fuente, fallidos):
+            df_bloque['acq_date'] = pd.to_datetime(df_bloque['acq_date'])
+            meses = df_bloque['acq_date'].dt.strftime('%Y-%m')
+            # Los bloques avanzan en el tiempo: los meses anteriores al bloque ya están completos
+            escribir([p for p in pendientes if p < meses.min()])
+            for particion, grupo in df_bloque.groupby(meses):
+                pendientes.setdefault(particion, []).append(grupo)
+        escribir(sorted(pendientes))
+        
+        print(f"\n✅ Almacén actualizado: {nuevas} detecciones nuevas en {almacen.directorio}/")
+        if fallidos:
+            print(f"⚠️  {len(fallidos)} bloques sin descargar: "
+                  + ", ".join(f"{desde} → {hasta}" for desde, hasta in fallidos))
+        return nuevas, fallidos
+    
     def obtener_datos_actualizados(self, fuente="VIIRS_SNPP_NRT"):
         """
         Descarga datos desde el 1 de enero hasta hoy
         Solo para la zona de la Patagonia (Argentina)
         """
-        fecha_fin = datetime.now()
+        fecha_fin = self.ahora()
         
         print("\n" + "="*70)
         print("🔥 DESCARGA DE DATOS HISTÓRICOS DE INCENDIOS")
@@ -317,17 +602,40 @@ class AnalizadorIncendiosHistorico:
         
         # Filtrar solo Argentina de forma más precisa
         if df is not None and len(df) > 0:
-            df_original = len(df)
-            df = df[df['longitude'] > -72.2].copy()
-            if len(df) < df_original:
-                focos_excluidos = df_original - len(df)
-                print(f"\n🇦🇷 Filtrado Chile: {len(df)} detecciones ({focos_excluidos} focos excluidos por estar en territorio chileno)")
+            df = self.filtrar_territorio(df)
             
             print(f"📍 Rango de longitudes: {df['longitude'].min():.2f}° a {df['longitude'].max():.2f}°")
             print(f"📍 Rango de latitudes: {df['latitude'].min():.2f}° a {df['latitude'].max():.2f}°")
         
         return df
     
+    def filtrar_territorio(self, df):
+        """
+        Conserva los focos dentro de Argentina y agrega la provincia de cada uno
+        Sin archivo de límites (ver territorio.py) se usa el corte aproximado por
+        longitud, sin columna 'provincia', y se avisa (una vez por proceso)
+        """
+        df_original = len(df)
+        limites = territorio.cargar_territorio(self.zona_bounds)
+        if limites is None:
+            if not getattr(self, '_aviso_limites', False):
+                self._aviso_limites = True
+                print(f"\n⚠️  FILTRO POR LÍMITES DESACTIVADO: no existe {territorio.ARCHIVO_LIMITES}")
+                print("   Se usa el corte aproximado longitude > -72.2: puede incluir focos en Chile o excluir")
+                print("   focos argentinos cerca de la cordillera, y no se asigna provincia (ver territorio.py)")
+                self._evento('aviso', mensaje="Filtro por límites provinciales desactivado (falta el archivo de límites)")
+            df = df[df['longitude'] > -72.2].copy()
+            print(f"   Corte por longitud: {len(df)} detecciones ({df_original - len(df)} excluidas)")
+            return df
+        
+        provincias = limites.provincias(df['latitude'].to_numpy(), df['longitude'].to_numpy())
+        dentro = pd.notna(provincias)
+        df = df.loc[dentro].assign(provincia=provincias[dentro])
+        print(f"\n🇦🇷 Filtrado por límites: {len(df)} detecciones ({df_original - len(df)} focos fuera de Argentina)")
+        for provincia, cantidad in df['provincia'].value_counts().items():
+            print(f"   {provincia}: {cantidad} focos")
+        return df
+    
     def filtrar_por_confianza(self, df, confianza_minima=70):
         """Filtra detecciones por nivel de confianza"""
         if df is None or len(df) == 0:
@@ -339,19 +647,17 @@ class AnalizadorIncendiosHistorico:
             'l': 30, 'n': 60, 'h': 90
         }
         
-        def convertir_confidence(val):
-            try:
-                # Intentamos convertir directamente a número
-                return float(val)
-            except (ValueError, TypeError):
-                # Si es texto (como 'high'), buscamos en el mapa
-                return confidence_map.get(str(val).lower(), 50)
-        
-        # 2. Aplicar la conversión y FORZAR tipo flotante
-        df['confidence'] = df['confidence'].apply(convertir_confidence).astype(float)
+        # 2. Convertir a número; los textos (como 'high') se buscan en el mapa
+        original = df['confidence']
+        confianza = pd.to_numeric(original, errors='coerce')
+        es_texto = confianza.isna() & original.notna()
+        if es_texto.any():
+            confianza[es_texto] = original[es_texto].astype(str).str.lower().map(confidence_map).fillna(50)
+        confianza = confianza.astype(float)
         
-        # 3. Filtrado final (Ahora sí comparamos número vs número)
-        df_filtrado = df[df['confidence'] >= confianza_minima].copy()
+        # 3. Filtrado final: una sola copia, sin modificar el DataFrame original
+        seleccion = confianza >= confianza_minima
+        df_filtrado = df.loc[seleccion].assign(confidence=confianza[seleccion])
         
         if len(df) > 0:
             porcentaje = (len(df_filtrado) / len(df)) * 100
@@ -369,6 +675,10 @@ class AnalizadorIncendiosHistorico:
     
     def analizar_evolucion_diaria(self, df):
         """Analiza evolución día por día"""
+        return self._acumular_evolucion(self._agregar_por_dia(df))
+    
+    def _agregar_por_dia(self, df):
+        """Totales por día (un día nunca queda repartido entre particiones mensuales)"""
         evolucion = df.groupby('acq_date').agg({
             'latitude': 'count',
             'frp': ['sum', 'mean', 'max'],
@@ -376,14 +686,134 @@ class AnalizadorIncendiosHistorico:
         }).round(2)
         
         evolucion.columns = ['focos_nuevos', 'frp_total', 'frp_promedio', 'frp_maximo', 'confianza']
-        evolucion = evolucion.reset_index()
+        return evolucion.reset_index()
+    
+    def _acumular_evolucion(self, evolucion):
+        """Agrega acumulados a los totales diarios ordenados por fecha"""
         evolucion['focos_acumulados'] = evolucion['focos_nuevos'].cumsum()
         evolucion['superficie_estimada_ha'] = evolucion['focos_acumulados'] * 14
-        
         return evolucion
     
-    def crear_mapa_interactivo(self, df, nombre_archivo='mapa_incendios_historico.html'):
-        """Crea mapa con todos los incendios desde el 1 de enero"""
+    def procesar_particion(self, df, confianza_minima=70, grilla=None):
+        """Filtrado, columnas de tiempo y (si hay grilla) riesgo de una partición"""
+        df = self.filtrar_por_confianza(df, confianza_minima)
+        if len(df) == 0:
+            return df
+        df = self.agregar_informacion_temporal(df)
+        if grilla is not None:
+            df = self.asignar_riesgo_grilla(df, grilla)
+        return df
+    
+    def generar_reporte_particionado(self, almacen, destino, confianza_minima=70,
+                                     desde=None, hasta=None, grilla=None):
+        """
+        Versión del reporte para historiales que no entran en memoria
+        Procesa el almacén mes por mes (filtrado → tiempo → riesgo → destino) y arma
+        la evolución diaria con los totales de cada partición
+        """
+        particiones = almacen.particiones(desde, hasta)
+        if not particiones:
+            print("\n❌ El almacén no tiene detecciones en el rango pedido")
+            return None
+        
+        print(f"\n🗄️  Procesando {len(particiones)} particiones mensuales "
+              f"({particiones[0]} → {particiones[-1]})...")
+        diarios = []
+        frp_maximo = 0.0
+        
+        def procesar(df):
+            nonlocal frp_maximo
+            df = self.procesar_particion(df, confianza_minima, grilla)
+            if len(df) > 0:
+                diarios.append(self._agregar_por_dia(df))
+                frp_maximo = max(frp_maximo, df['frp'].max())
+            return df
+        
+        escritas = almacen.procesar(procesar, destino, desde, hasta)
+        if not diarios:
+            print(f"\n⚠️  No hay detecciones con confianza >={confianza_minima}%")
+            return None
+        
+        evolucion = self._acumular_evolucion(pd.concat(diarios, ignore_index=True))
+        total = int(evolucion['focos_nuevos'].sum())
+        
+        print(f"\n✅ {len(escritas)} particiones procesadas en {destino.directorio}/")
+        print(f"📅 Período: {evolucion['acq_date'].min().strftime('%d/%m/%Y')} → {evolucion['acq_date'].max().strftime('%d/%m/%Y')}")
+        print(f"🔥 Total detecciones: {total:,}")
+        print(f"📊 Día con más focos: {evolucion.loc[evolucion['focos_nuevos'].idxmax(), 'acq_date'].strftime('%d/%m/%Y')} ({evolucion['focos_nuevos'].max()} focos)")
+        print(f"⚡ FRP máximo registrado: {frp_maximo:.1f} MW")
+        print(f"📈 FRP promedio general: {evolucion['frp_total'].sum() / total:.1f} MW")
+        
+        return {
+            'particiones': escritas,
+            'evolucion': evolucion
+        }
+    
+    def exportar_capas_temporales(self, df, directorio='capas_mapa', modo_temporal='dia'):
+        """
+        Divide las detecciones en un archivo JSON compacto por día (o semana)
+        Cada capa es columnar para que el navegador la descargue sólo al pedirla
+        Los archivos llevan el hash del contenido en el nombre, así pueden cachearse indefinidamente
+        Retorna el nombre del archivo índice
+        """
+        if modo_temporal not in FORMATOS_PERIODO:
+            raise ValueError(f"modo_temporal inválido: {modo_temporal} (usar 'dia' o 'semana')")
+        
+        os.makedirs(directorio, exist_ok=True)
+        # Limpiar capas de ejecuciones anteriores
+        for nombre in os.listdir(directorio):
+            if nombre.endswith('.json'):
+                os.remove(os.path.join(directorio, nombre))
+        
+        def guardar(base, datos):
+            contenido = json.dumps(datos, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+            nombre = f"{base}.{hashlib.sha256(contenido).hexdigest()[:16]}.json"
+            with open(os.path.join(directorio, nombre), 'wb') as f:
+                f.write(contenido)
+            return nombre
+        
+        periodos = df['acq_date'].dt.strftime(FORMATOS_PERIODO[modo_temporal])
+        # Niveles fuera de la tabla de colores (ej. "EXTREMO (30-30-30)") se agregan al final en gris
+        niveles = list(COLORES_RIESGO.keys())
+        niveles += sorted(set(df['nivel_riesgo'].dropna()) - set(niveles))
+        colores = [COLORES_RIESGO.get(n, 'gray') for n in niveles]
+        codigos = {n: i for i, n in enumerate(niveles)}
+        
+        indice = []
+        for periodo, grupo in df.groupby(periodos, sort=True):
+            capa = {
+                'lat': grupo['latitude'].round(4).tolist(),
+                'lon': grupo['longitude'].round(4).tolist(),
+                'fecha': grupo['acq_date'].dt.strftime('%d/%m/%Y').tolist(),
+                'hora': grupo['acq_time'].astype(str).tolist(),
+                'frp': grupo['frp'].round(1).tolist(),
+                'conf': grupo['confidence'].round(0).astype(int).tolist(),
+                'viento': grupo['viento_kmh'].tolist(),
+                'humedad': grupo['humedad_relativa'].tolist(),
+                'temp': grupo['temperatura_c'].tolist(),
+                'lluvia': grupo['lluvia_7d_mm'].tolist(),
+                'indice': grupo['indice_riesgo'].tolist(),
+                # Nivel codificado como posición en la tabla de niveles (-1 = desconocido)
+                'nivel': [codigos.get(n, -1) for n in grupo['nivel_riesgo']]
+            }
+            indice.append({'periodo': periodo, 'focos': len(grupo), 'archivo': guardar(periodo, capa)})
+        
+        archivo_indice = guardar('indice', {
+            'modo': modo_temporal, 'niveles': niveles, 'colores': colores, 'periodos': indice
+        })
+        
+        print(f"✓ {len(indice)} capas temporales ({modo_temporal}) guardadas en {directorio}/")
+        return archivo_indice
+    
+    def crear_mapa_interactivo(self, df, nombre_archivo='mapa_incendios_historico.html',
+                               modo_temporal=None, directorio_capas='capas_mapa', url_capas=None,
+                               grilla=None):
+        """
+        Crea mapa con todos los incendios desde el 1 de enero
+        Con modo_temporal='dia' o 'semana' el mapa no incluye los puntos: exporta una capa
+        por período en directorio_capas y un slider las descarga bajo demanda desde url_capas
+        Con una grilla de riesgo agrega la superficie de riesgo horario como capa de imagen
+        """
         if len(df) == 0:
             print("⚠️  No hay datos para mapear")
             return
@@ -397,6 +827,61 @@ class AnalizadorIncendiosHistorico:
             tiles='OpenStreetMap'
         )
         
+        if modo_temporal is not None:
+            archivo_indice = self.exportar_capas_temporales(df, directorio_capas, modo_temporal)
+            ControlTemporal(url_capas or directorio_capas, archivo_indice).add_to(mapa)
+        else:
+            self._agregar_marcadores(mapa, df)
+        
+        if grilla is not None:
+            if modo_temporal is not None:
+                self._agregar_capa_riesgo(mapa, grilla, directorio_capas, url_capas or directorio_capas)
+            else:
+                self._agregar_capa_riesgo(mapa, grilla)
+            folium.LayerControl(collapsed=True).add_to(mapa)
+        
+        self._agregar_leyenda(mapa, df)
+        
+        # Ids fijos en lugar de uuid aleatorios: mismo contenido → mismo archivo (y mismo hash al publicar)
+        self._fijar_ids(mapa)
+        mapa.save(nombre_archivo)
+        print(f"✓ Mapa guardado: {nombre_archivo}")
+        
+        return mapa
+    
+    def _fijar_ids(self, mapa):
+        """Reemplaza los ids aleatorios de folium por un contador determinístico"""
+        pendientes = [mapa.get_root()]
+        elementos = []
+        vistos = set()
+        while pendientes:
+            elemento = pendientes.pop(0)
+            if id(elemento) in vistos:
+                continue
+            vistos.add(id(elemento))
+            elementos.append(elemento)
+            pendientes.extend(elemento._children.values())
+            # Los popups guardan su contenido en header/html/script propios, fuera de _children
+            for parte in ('header', 'html', 'script'):
+                hijo = getattr(elemento, parte, None)
+                if hasattr(hijo, '_children'):
+                    pendientes.append(hijo)
+        
+        # Las claves de _children que eran el nombre del hijo se usan en los templates: renombrarlas también
+        renombrar = {
+            id(elemento): [(clave == hijo.get_name(), clave, hijo) for clave, hijo in elemento._children.items()]
+            for elemento in elementos
+        }
+        for contador, elemento in enumerate(elementos):
+            elemento._id = f"{contador:032x}"
+        for elemento in elementos:
+            elemento._children = type(elemento._children)(
+                (hijo.get_name() if por_nombre else clave, hijo)
+                for por_nombre, clave, hijo in renombrar[id(elemento)]
+            )
+    
+    def _agregar_marcadores(self, mapa, df):
+        """Agrega mapa de calor y marcadores agrupados con todas las detecciones"""
         # Mapa de calor
         datos_calor = df[['latitude', 'longitude', 'frp']].values.tolist()
         HeatMap(datos_calor, radius=15, blur=20, max_zoom=13).add_to(mapa)
@@ -404,18 +889,9 @@ class AnalizadorIncendiosHistorico:
         # Marcadores agrupados por riesgo
         marker_cluster = MarkerCluster().add_to(mapa)
         
-        # Colores según riesgo
-        colores_riesgo = {
-            "BAJO": "green",
-            "MODERADO": "lightgreen",
-            "ALTO": "orange",
-            "MUY ALTO": "red",
-            "EXTREMO": "purple"
-        }
-        
         for idx, row in df.iterrows():
             # Color según riesgo
-            color = colores_riesgo.get(row['nivel_riesgo'], 'gray')
+            color = COLORES_RIESGO.get(row['nivel_riesgo'], 'gray')
             
             popup_text = f"""
             <b>🔥 Incendio - Riesgo: {row['nivel_riesgo']}</b><br>
@@ -439,7 +915,43 @@ class AnalizadorIncendiosHistorico:
                 icon=folium.Icon(color=color, icon='fire', prefix='fa'),
                 tooltip=f"Riesgo: {row['nivel_riesgo']} - FRP: {row['frp']:.1f} MW"
             ).add_to(marker_cluster)
-        
+    
+    def _agregar_capa_riesgo(self, mapa, grilla, directorio=None, url=None):
+        """
+        Superficie de riesgo horario como imagen (un píxel por celda, color del nivel)
+        Con directorio la imagen se guarda como PNG con hash en el nombre y el mapa la
+        referencia desde url; sin directorio va embebida en el HTML
+        """
+        from folium.raster_layers import ImageOverlay
+        from folium.utilities import write_png
+        
+        indice = grilla.matriz('indice_riesgo')
+        niveles = np.digitize(np.nan_to_num(indice), UMBRALES_RIESGO)
+        paleta = np.array([RGB_COLORES[c] + (255,) for c in COLORES_RIESGO.values()], dtype=np.uint8)
+        imagen = paleta[niveles]
+        imagen[np.isnan(indice)] = 0  # celdas sin datos: transparentes
+        
+        if directorio is not None:
+            os.makedirs(directorio, exist_ok=True)
+            for nombre in os.listdir(directorio):
+                if nombre.startswith('riesgo.') and nombre.endswith('.png'):
+                    os.remove(os.path.join(directorio, nombre))
+            contenido = write_png(imagen, origin='upper')
+            nombre = f"riesgo.{hashlib.sha256(contenido).hexdigest()[:16]}.png"
+            with open(os.path.join(directorio, nombre), 'wb') as f:
+                f.write(contenido)
+            imagen = f"{url}/{nombre}"
+        
+        ImageOverlay(
+            image=imagen,
+            bounds=grilla.bounds(),
+            opacity=0.45,
+            name=f"Riesgo horario ({grilla.hora})",
+            show=False
+        ).add_to(mapa)
+    
+    def _agregar_leyenda(self, mapa, df):
+        """Agrega la leyenda de niveles de riesgo y totales"""
         # Leyenda actualizada con riesgo
         leyenda_html = f'''
         <div style="position: fixed; 
@@ -470,14 +982,13 @@ class AnalizadorIncendiosHistorico:
         </div>
         '''
         mapa.get_root().html.add_child(folium.Element(leyenda_html))
-        
-        mapa.save(nombre_archivo)
-        print(f"✓ Mapa guardado: {nombre_archivo}")
-        
-        return mapa
     
-    def crear_graficos_evolucion(self, evolucion, nombre_archivo='evolucion_historica.html'):
-        """Crea gráficos de evolución temporal con estilo dark mode"""
+    def crear_graficos_evolucion(self, evolucion, nombre_archivo='evolucion_historica.html', linea_base=None):
+        """
+        Crea gráficos de evolución temporal con estilo dark mode
+        Con una línea de base (climatologia.py) agrega la banda normal (p10-p90) y la mediana
+        de temporadas anteriores en focos diarios y acumulados
+        """
         fig = make_subplots(
             rows=3, cols=1,
             subplot_titles=(
@@ -537,6 +1048,9 @@ class AnalizadorIncendiosHistorico:
             ),
             row=3, col=1
         )
+        
+        if linea_base is not None:
+            self._agregar_linea_base(fig, evolucion, linea_base)
                 
         # Actualizar ejes con estilo oscuro
         fig.update_xaxes(
@@ -612,15 +1126,53 @@ class AnalizadorIncendiosHistorico:
         for annotation in fig['layout']['annotations']:
             annotation['font'] = dict(size=14, color='#cbd5e1', family='Inter, sans-serif')
         
-        fig.write_html(nombre_archivo)
+        # div_id fijo para que el HTML no cambie entre ejecuciones con los mismos datos
+        fig.write_html(nombre_archivo, div_id='graficos-evolucion')
         print(f"✓ Gráficos guardados: {nombre_archivo}")
         
         return fig
     
-    def exportar_excel_completo(self, df, evolucion, nombre_archivo=None):
+    def _agregar_linea_base(self, fig, evolucion, linea_base):
+        """Banda p10-p90 y mediana de temporadas anteriores detrás de las series actuales"""
+        base = linea_base_en_fechas(linea_base, evolucion['acq_date'])
+        temporadas = f"{linea_base['temporadas'][0]}-{linea_base['temporadas'][-1]}"
+        
+        for fila, serie in ((1, 'focos'), (2, 'acumulado')):
+            fig.add_trace(
+                go.Scatter(
+                    x=base['acq_date'], y=base[f'{serie}_p90'],
+                    mode='lines', line=dict(width=0), hoverinfo='skip',
+                    name=f'Normal p90 ({temporadas})'
+                ),
+                row=fila, col=1
+            )
+            fig.add_trace(
+                go.Scatter(
+                    x=base['acq_date'], y=base[f'{serie}_p10'],
+                    mode='lines', line=dict(width=0),
+                    fill='tonexty', fillcolor='rgba(148, 163, 184, 0.18)',
+                    name=f'Normal p10-p90 ({temporadas})',
+                    hovertemplate='Normal: %{y:,.0f} – ' + '%{customdata:,.0f}<extra></extra>',
+                    customdata=base[f'{serie}_p90']
+                ),
+                row=fila, col=1
+            )
+            fig.add_trace(
+                go.Scatter(
+                    x=base['acq_date'], y=base[f'{serie}_p50'],
+                    mode='lines', line=dict(color='#94a3b8', width=2, dash='dash'),
+                    name=f'Mediana {temporadas}',
+                    hovertemplate='Mediana: %{y:,.0f}<extra></extra>'
+                ),
+                row=fila, col=1
+            )
+    
+    def exportar_excel_completo(self, df, evolucion, nombre_archivo=None, resumen=None):
         """Exporta TODO en un solo archivo Excel con múltiples pestañas"""
         print("\n📂 Generando archivo Excel completo...")
         
+        if resumen is None:
+            resumen = calcular_resumen(df, evolucion, self.ahora())
         if nombre_archivo is None:
             fecha_str = datetime.now().strftime("%Y%m%d_%H%M")
             nombre_archivo = f'analisis_incendios_completo_{fecha_str}.xlsx'
@@ -631,9 +1183,6 @@ class AnalizadorIncendiosHistorico:
                 
                 # PESTAÑA 1: Detalle completo CON DATOS METEOROLÓGICOS
                 print("   📋 Generando pestaña 'Detalle' con datos meteorológicos...")
-                df_export = df.copy()
-                df_export['acq_date'] = df_export['acq_date'].dt.strftime('%Y-%m-%d')
-                
                 # Reordenar columnas para mejor visualización
                 column_order = [
                     'acq_date', 'acq_time', 'latitude', 'longitude',
@@ -643,10 +1192,11 @@ class AnalizadorIncendiosHistorico:
                 ]
                 
                 # Mantener otras columnas si existen
-                otras_columnas = [col for col in df_export.columns if col not in column_order]
+                otras_columnas = [col for col in df.columns if col not in column_order]
                 column_order.extend(otras_columnas)
                 
-                df_export = df_export[column_order]
+                # Selección y formato de fecha en una sola copia
+                df_export = df[column_order].assign(acq_date=df['acq_date'].dt.strftime('%Y-%m-%d'))
                 df_export.to_excel(writer, sheet_name='Detalle', index=False)
                 
                 # PESTAÑA 2: Evolución diaria
@@ -699,19 +1249,13 @@ class AnalizadorIncendiosHistorico:
                         'Lluvia 7d promedio (mm)'
                     ],
                     'Valor': [
-                        len(df),
-                        f"{df['indice_riesgo'].mean():.1f}",
-                        df['nivel_riesgo'].mode()[0] if len(df['nivel_riesgo'].mode()) > 0 else "N/A",
-                        len(df[df['nivel_riesgo'] == 'BAJO']),
-                        len(df[df['nivel_riesgo'] == 'MODERADO']),
-                        len(df[df['nivel_riesgo'] == 'ALTO']),
-                        len(df[df['nivel_riesgo'] == 'MUY ALTO']),
-                        len(df[df['nivel_riesgo'] == 'EXTREMO']),
-                        f"{len(df[df['indice_riesgo'] >= 40]) / len(df) * 100:.1f}%",
-                        f"{df['viento_kmh'].mean():.1f}",
-                        f"{df['humedad_relativa'].mean():.1f}",
-                        f"{df['temperatura_c'].mean():.1f}",
-                        f"{df['lluvia_7d_mm'].mean():.1f}"
+                        resumen['total_detecciones'],
+                        f"{resumen['indice_riesgo_promedio']:.1f}",
+                        resumen['nivel_predominante'],
+                        *(resumen['focos_por_nivel'][nivel] for nivel in COLORES_RIESGO),
+                        f"{resumen['porcentaje_riesgo_alto']:.1f}%",
+                        *(f"{resumen['meteo_promedio'][columna]:.1f}"
+                          for columna in ('viento_kmh', 'humedad_relativa', 'temperatura_c', 'lluvia_7d_mm'))
                     ]
                 }
                 riesgo_df = pd.DataFrame(riesgo_data)
@@ -737,20 +1281,20 @@ class AnalizadorIncendiosHistorico:
                         'Última actualización'
                     ],
                     'Valor': [
-                        df['acq_date'].min().strftime('%d/%m/%Y'),
-                        df['acq_date'].max().strftime('%d/%m/%Y'),
-                        (df['acq_date'].max() - df['acq_date'].min()).days + 1,
-                        len(df),
-                        len(df[df['confidence'] >= 70]),
-                        f"{evolucion['superficie_estimada_ha'].iloc[-1]:,.0f}",
-                        f"{df['frp'].mean():.1f}",
-                        f"{df['frp'].max():.1f}",
-                        f"{df['confidence'].mean():.1f}",
-                        evolucion.loc[evolucion['focos_nuevos'].idxmax(), 'acq_date'].strftime('%d/%m/%Y'),
-                        evolucion['focos_nuevos'].max(),
-                        f"{df['indice_riesgo'].mean():.1f}/100",
-                        df['nivel_riesgo'].mode()[0] if len(df['nivel_riesgo'].mode()) > 0 else "N/A",
-                        datetime.now().strftime('%d/%m/%Y %H:%M')
+                        fecha_corta(resumen['fecha_inicio']),
+                        fecha_corta(resumen['fecha_fin']),
+                        resumen['dias_totales'],
+                        resumen['total_detecciones'],
+                        resumen['detecciones_alta_confianza'],
+                        f"{resumen['superficie_estimada_ha']:,.0f}",
+                        f"{resumen['frp_promedio']:.1f}",
+                        f"{resumen['frp_maximo']:.1f}",
+                        f"{resumen['confianza_promedio']:.1f}",
+                        fecha_corta(resumen['dia_mas_focos']),
+                        resumen['max_focos_dia'],
+                        f"{resumen['indice_riesgo_promedio']:.1f}/100",
+                        resumen['nivel_predominante'],
+                        datetime.fromisoformat(resumen['generado']).strftime('%d/%m/%Y %H:%M')
                     ]
                 }
                 resumen_df = pd.DataFrame(resumen_data)
@@ -819,8 +1363,10 @@ class AnalizadorIncendiosHistorico:
         print("\n⚙️  Procesando datos temporales...")
         df_filtrado = self.agregar_informacion_temporal(df_filtrado)
         
-        # 4. Agregar datos meteorológicos y calcular riesgo (MÉTODO RÁPIDO)
-        df_filtrado = self.agregar_datos_meteorologicos_rapido(df_filtrado)
+        # 4. Riesgo FWI de la grilla asignado a cada incendio (como la etapa 'risk' del pipeline)
+        grilla = self.obtener_grilla_riesgo()
+        df_filtrado = self.asignar_riesgo_grilla(df_filtrado, grilla)
+        self.mostrar_distribucion_riesgo(df_filtrado)
         
         # 5. Analizar evolución
         evolucion = self.analizar_evolucion_diaria(df_filtrado)
@@ -832,33 +1378,31 @@ class AnalizadorIncendiosHistorico:
         archivo_excel = None
         
         # 8. Resumen final
+        resumen = calcular_resumen(df_filtrado, evolucion, self.ahora())
         print("\n" + "="*70)
         print("📋 RESUMEN FINAL")
         print("="*70)
-        print(f"📅 Período: {df_filtrado['acq_date'].min().strftime('%d/%m/%Y')} → {df_filtrado['acq_date'].max().strftime('%d/%m/%Y')}")
-        print(f"📆 Días totales: {(df_filtrado['acq_date'].max() - df_filtrado['acq_date'].min()).days + 1}")
-        print(f"🔥 Total detecciones: {len(df_filtrado):,}")
+        print(f"📅 Período: {fecha_corta(resumen['fecha_inicio'])} → {fecha_corta(resumen['fecha_fin'])}")
+        print(f"📆 Días totales: {resumen['dias_totales']}")
+        print(f"🔥 Total detecciones: {resumen['total_detecciones']:,}")
         
         # Resumen de riesgo
-        riesgo_promedio = df_filtrado['indice_riesgo'].mean()
-        nivel_predominante = df_filtrado['nivel_riesgo'].mode()[0] if len(df_filtrado['nivel_riesgo'].mode()) > 0 else "N/A"
-        focos_alto_riesgo = len(df_filtrado[df_filtrado['indice_riesgo'] >= 40])
-        
-        print(f"⚠️  Índice de riesgo promedio: {riesgo_promedio:.1f}/100 ({nivel_predominante})")
-        print(f"🚨 Focos con riesgo ALTO o superior: {focos_alto_riesgo} ({focos_alto_riesgo/len(df_filtrado)*100:.1f}%)")
+        print(f"⚠️  Índice de riesgo promedio: {resumen['indice_riesgo_promedio']:.1f}/100 ({resumen['nivel_predominante']})")
+        print(f"🚨 Focos con riesgo ALTO o superior: {resumen['focos_riesgo_alto']} ({resumen['porcentaje_riesgo_alto']:.1f}%)")
         
         # Condiciones meteorológicas promedio
+        meteo = resumen['meteo_promedio']
         print(f"🌤️  Condiciones promedio:")
-        print(f"   💨 Viento: {df_filtrado['viento_kmh'].mean():.1f} km/h")
-        print(f"   💧 Humedad: {df_filtrado['humedad_relativa'].mean():.1f}%")
-        print(f"   🌡️ Temperatura: {df_filtrado['temperatura_c'].mean():.1f}°C")
-        print(f"   🌧️ Lluvia 7d: {df_filtrado['lluvia_7d_mm'].mean():.1f} mm")
+        print(f"   💨 Viento: {meteo['viento_kmh']:.1f} km/h")
+        print(f"   💧 Humedad: {meteo['humedad_relativa']:.1f}%")
+        print(f"   🌡️ Temperatura: {meteo['temperatura_c']:.1f}°C")
+        print(f"   🌧️ Lluvia 7d: {meteo['lluvia_7d_mm']:.1f} mm")
         
-        print(f"📊 Día con más focos: {evolucion.loc[evolucion['focos_nuevos'].idxmax(), 'acq_date'].strftime('%d/%m/%Y')} ({evolucion['focos_nuevos'].max()} focos)")
-        print(f"📏 Superficie estimada total: {evolucion['superficie_estimada_ha'].iloc[-1]:,.0f} hectáreas")
-        print(f"⚡ FRP máximo registrado: {df_filtrado['frp'].max():.1f} MW")
-        print(f"📈 FRP promedio general: {df_filtrado['frp'].mean():.1f} MW")
-        print(f"✅ Confianza promedio: {df_filtrado['confidence'].mean():.1f}%")
+        print(f"📊 Día con más focos: {fecha_corta(resumen['dia_mas_focos'])} ({resumen['max_focos_dia']} focos)")
+        print(f"📏 Superficie estimada total: {resumen['superficie_estimada_ha']:,.0f} hectáreas")
+        print(f"⚡ FRP máximo registrado: {resumen['frp_maximo']:.1f} MW")
+        print(f"📈 FRP promedio general: {resumen['frp_promedio']:.1f} MW")
+        print(f"✅ Confianza promedio: {resumen['confianza_promedio']:.1f}%")
         
         print("\n📂 ARCHIVOS GENERADOS:")
         print("   🗺️  mapa_incendios_historico.html - Mapa interactivo con riesgo")
@@ -880,7 +1424,8 @@ class AnalizadorIncendiosHistorico:
         
         return {
             'datos': df_filtrado,
-            'evolucion': evolucion
+            'evolucion': evolucion,
+            'resumen': resumen
         }
 
 
@@ -890,6 +1435,7 @@ class AnalizadorIncendiosHistorico:
 if __name__ == "__main__":
     import os
     from supabase import create_client
+    from historial import agregar_al_historial
     
     MAP_KEY = os.environ.get("MAP_KEY", "a66ff23e6b0f370791cb4bd2dd3123d0")
     SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://sglrflawktvymwujppqt.supabase.co")
@@ -901,39 +1447,21 @@ if __name__ == "__main__":
     resultados = analizador.generar_reporte_completo()
     df = resultados['datos']
     evolucion = resultados['evolucion']
+    resumen = resultados['resumen']
     
     # 2. GUARDAR EN SUPABASE
     print("Generando archivos en carpeta static...")
     analizador.crear_mapa_interactivo(df, nombre_archivo='mapa_generado.html')
     analizador.crear_graficos_evolucion(evolucion, nombre_archivo='evolucion_historica.html')
-    analizador.exportar_excel_completo(df, evolucion, nombre_archivo='detalle_incendios.xlsx')
+    analizador.exportar_excel_completo(df, evolucion, nombre_archivo='detalle_incendios.xlsx', resumen=resumen)
     
     # 3. ACTUALIZAR SUPABASE
     try:
         sb = create_client(SUPABASE_URL, SUPABASE_KEY)
-        total = len(df)
-        
-        # CALCULOS NUEVOS
-        # Obtenemos la última fila de la evolución para tener el total de hectáreas
-        superficie_total = evolucion['superficie_estimada_ha'].iloc[-1] if not evolucion.empty else 0
-        # Calculamos el promedio de FRP
-        frp_promedio = df['frp'].mean() if not df.empty else 0
-        
-        riesgo = df['nivel_riesgo'].mode()[0] if not df.empty else "N/A"
-
-        ahora_argentina = datetime.now() - timedelta(hours=3)
-        fecha_dashboard = ahora_argentina.strftime("%d/%m/%Y %H:%M")
-
-        nuevos_stats = {
-            "id": 1,
-            "total_focos": str(total),
-            "riesgo_avg": riesgo,
-            "intensidad_max": f"{frp_promedio:.1f} MW",     # Reemplazado por Promedio + MW
-            "area_critica": f"{superficie_total:,.0f} ha",  # Reemplazado por Suma de Hectáreas
-            "ultima_actualizacion": fecha_dashboard
-        }
+        nuevos_stats = fila_stats(resumen)
         
         sb.table("stats").upsert(nuevos_stats).execute()
+        agregar_al_historial(sb, resumen)
         print("\n🚀 ¡Métricas actualizadas! Hectáreas y FRP promedio enviados.")
         
     except Exception as e:
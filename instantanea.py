@@ -0,0 +1,210 @@
+"""
+Instantánea binaria de las detecciones, compartida por los workers vía mmap
+
+El pipeline escribe las detecciones enriquecidas como un arreglo estructurado
+de numpy con disposición fija: cada columna de texto se guarda como códigos
+enteros y su diccionario va en el encabezado JSON. Formato del archivo:
+
+    MAGICO (8 bytes) | largo del encabezado (8 bytes, little endian) | encabezado JSON
+    | relleno hasta múltiplo de ALINEACION | filas del arreglo estructurado
+
+Los workers abren el archivo con np.memmap en sólo lectura: no se copia nada al
+heap de cada proceso, todos comparten las mismas páginas del page cache. Una
+versión nueva se escribe en un temporal y se reemplaza con os.replace; cada
+worker la detecta por el cambio de inodo y reabre, mientras los pedidos en curso
+siguen leyendo la versión anterior (el mapeo mantiene vivo el archivo viejo).
+
+numpy se importa recién al abrir la instantánea, no al arrancar la app web.
+"""
+import os
+import json
+import struct
+import threading
+from datetime import datetime, timezone
+
+ARCHIVO_INSTANTANEA = os.environ.get(
+    "INSTANTANEA_DETECCIONES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos_export", "detecciones.bin")
+)
+
+MAGICO = b'FOCOS01\n'
+ALINEACION = 64
+
+# Columnas que conservan doble precisión (el resto de los flotantes va en float32)
+COLUMNAS_DOBLE_PRECISION = ('latitude', 'longitude')
+
+
+# ============================================================
+# LADO PIPELINE: escribir la instantánea
+# ============================================================
+
+def _columna(serie):
+    """(dtype numpy, valores, diccionario o None) para una columna del DataFrame"""
+    import numpy as np
+    import pandas as pd
+
+    if pd.api.types.is_bool_dtype(serie):
+        return np.dtype('?'), serie.fillna(False).to_numpy(dtype='?'), None
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return np.dtype('M8[s]'), serie.to_numpy(dtype='M8[s]'), None
+    if pd.api.types.is_float_dtype(serie):
+        tipo = np.dtype('f8') if serie.name in COLUMNAS_DOBLE_PRECISION else np.dtype('f4')
+        return tipo, serie.to_numpy(dtype=tipo, na_value=np.nan), None
+    if pd.api.types.is_integer_dtype(serie):
+        maximo = serie.abs().max()
+        tipo = np.dtype('i8') if pd.notna(maximo) and maximo >= 2 ** 31 else np.dtype('i4')
+        return tipo, serie.to_numpy(dtype=tipo, na_value=0), None
+
+    # Texto y categorías: códigos enteros (-1 = vacío) + diccionario
+    categorias = pd.Categorical(serie.astype('string'))
+    diccionario = [str(c) for c in categorias.categories]
+    tipo = np.dtype('i2') if len(diccionario) < 2 ** 15 else np.dtype('i4')
+    return tipo, categorias.codes.astype(tipo), diccionario
+
+
+def guardar_instantanea(df, ruta=ARCHIVO_INSTANTANEA):
+    """Escribe el DataFrame como instantánea y la reemplaza de forma atómica"""
+    import numpy as np
+
+    campos, valores, diccionarios = [], {}, {}
+    for nombre in df.columns:
+        tipo, datos, diccionario = _columna(df[nombre])
+        campos.append((str(nombre), tipo))
+        valores[str(nombre)] = datos
+        if diccionario is not None:
+            diccionarios[str(nombre)] = diccionario
+
+    arreglo = np.empty(len(df), dtype=np.dtype(campos))
+    for nombre, datos in valores.items():
+        arreglo[nombre] = datos
+
+    encabezado = json.dumps({
+        'generado': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'filas': len(df),
+        'dtype': np.lib.format.dtype_to_descr(arreglo.dtype),
+        'diccionarios': diccionarios
+    }, ensure_ascii=False).encode('utf-8')
+    inicio = len(MAGICO) + 8 + len(encabezado)
+    relleno = -inicio % ALINEACION
+
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + '.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(MAGICO)
+        f.write(struct.pack('<Q', len(encabezado)))
+        f.write(encabezado)
+        f.write(b' ' * relleno)
+        f.write(arreglo.tobytes())
+    os.replace(temporal, ruta)
+    return ruta
+
+
+# ============================================================
+# LADO WEB: abrir y consultar
+# ============================================================
+
+class Instantanea:
+    """Detecciones mapeadas en memoria (sólo lectura, sin copia)"""
+
+    def __init__(self, ruta=ARCHIVO_INSTANTANEA):
+        import numpy as np
+
+        with open(ruta, 'rb') as f:
+            self.inodo = os.fstat(f.fileno()).st_ino
+            if f.read(len(MAGICO)) != MAGICO:
+                raise ValueError(f"{ruta} no es una instantánea de detecciones")
+            largo, = struct.unpack('<Q', f.read(8))
+            self.encabezado = json.loads(f.read(largo))
+        inicio = len(MAGICO) + 8 + largo
+        inicio += -inicio % ALINEACION
+
+        self.ruta = ruta
+        self.filas = self.encabezado['filas']
+        self.generado = self.encabezado['generado']
+        self.diccionarios = self.encabezado['diccionarios']
+        tipo = np.lib.format.descr_to_dtype(self.encabezado['dtype'])
+        # np.memmap no admite largo 0: una instantánea vacía es un arreglo vacío
+        self.datos = (np.memmap(ruta, dtype=tipo, mode='r', offset=inicio, shape=(self.filas,))
+                      if self.filas else np.empty(0, dtype=tipo))
+
+    def __len__(self):
+        return self.filas
+
+    def columna(self, nombre):
+        """Vista (sin copia) de una columna"""
+        return self.datos[nombre]
+
+    def codigos(self, nombre, valores):
+        """Códigos del diccionario de una columna de texto para los valores pedidos"""
+        diccionario = self.diccionarios.get(nombre, [])
+        return [diccionario.index(v) for v in valores if v in diccionario]
+
+    def texto(self, nombre, codigos):
+        """Decodifica códigos de una columna de texto"""
+        diccionario = self.diccionarios[nombre]
+        return [diccionario[c] if c >= 0 else None for c in codigos]
+
+    def mascara(self, filtros):
+        """Filas que cumplen los filtros de exportacion.leer_filtros"""
+        import numpy as np
+
+        mascara = np.ones(self.filas, dtype=bool)
+        if 'bbox' in filtros:
+            oeste, sur, este, norte = filtros['bbox']
+            lat, lon = self.columna('latitude'), self.columna('longitude')
+            mascara &= (lat >= sur) & (lat <= norte) & (lon >= oeste) & (lon <= este)
+        if 'desde' in filtros:
+            mascara &= self.columna('acq_date') >= np.datetime64(filtros['desde'], 's')
+        if 'hasta' in filtros:
+            mascara &= self.columna('acq_date') < np.datetime64(filtros['hasta'], 's')
+        if 'riesgo_min' in filtros:
+            mascara &= self.columna('indice_riesgo') >= filtros['riesgo_min']
+        if 'nivel' in filtros:
+            mascara &= np.isin(self.columna('nivel_riesgo'), self.codigos('nivel_riesgo', filtros['nivel']))
+        return mascara
+
+
+_actual = None
+_cerrojo = threading.Lock()
+
+
+def instantanea_actual(ruta=ARCHIVO_INSTANTANEA):
+    """
+    Instantánea vigente del proceso, reabierta cuando el pipeline la reemplaza
+    (cambio de inodo). None si todavía no se generó
+    """
+    global _actual
+    try:
+        inodo = os.stat(ruta).st_ino
+    except OSError:
+        return None
+    with _cerrojo:
+        if _actual is None or _actual.ruta != ruta or _actual.inodo != inodo:
+            _actual = Instantanea(ruta)
+        return _actual
+
+
+def consultar(filtros, ruta=ARCHIVO_INSTANTANEA):
+    """Conteos de las detecciones filtradas por nivel de riesgo, por día y por provincia"""
+    import numpy as np
+
+    instantanea = instantanea_actual(ruta)
+    if instantanea is None:
+        return None
+    seleccion = instantanea.mascara(filtros)
+
+    codigos, cantidades = np.unique(instantanea.columna('nivel_riesgo')[seleccion], return_counts=True)
+    dias, por_dia = np.unique(instantanea.columna('acq_date')[seleccion].astype('M8[D]'), return_counts=True)
+    frp = instantanea.columna('frp')[seleccion]
+    por_provincia = {}
+    if 'provincia' in instantanea.diccionarios:
+        codigos_provincia, focos = np.unique(instantanea.columna('provincia')[seleccion], return_counts=True)
+        por_provincia = dict(zip(instantanea.texto('provincia', codigos_provincia), map(int, focos)))
+    return {
+        'generado': instantanea.generado,
+        'total': int(seleccion.sum()),
+        'frp_promedio': round(float(frp.mean()), 1) if len(frp) else None,
+        'por_nivel': dict(zip(instantanea.texto('nivel_riesgo', codigos), map(int, cantidades))),
+        'por_dia': {str(d): int(c) for d, c in zip(dias, por_dia)},
+        'por_provincia': por_provincia
+    }
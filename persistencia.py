@@ -0,0 +1,153 @@
+"""
+Persistencia de las detecciones enriquecidas y de los totales diarios en Supabase
+
+Tablas (esquema en esquema.sql):
+    detecciones      una fila por detección, clave 'id' (hash de posición, fecha y hora)
+    focos_diarios    una fila por día, clave 'fecha'
+
+Las tablas tienen RLS de sólo lectura: se escribe con la clave service_role
+(SUPABASE_SERVICE_KEY, ver publicacion.clave_escritura).
+
+Cada corrida manda sólo las filas nuevas o cambiadas: el estado local
+(PERSISTENCIA_ESTADO) guarda, para cada clave ya escrita, el hash de la fila
+enviada. Las filas viajan en lotes de LOTE_FILAS por pedido con upsert sobre la
+clave, así reintentar un lote o la corrida entera no duplica nada. El estado se
+actualiza después de cada lote confirmado: si un lote falla, el próximo intento
+retoma desde ahí.
+
+El estado va asociado al destino (SUPABASE_URL): contra otra base se empieza de
+cero. Las filas que dejan de existir (por ejemplo, al subir la confianza
+mínima) no se borran de las tablas.
+"""
+import os
+import json
+import hashlib
+
+import pandas as pd
+
+ARCHIVO_ESTADO = os.environ.get("PERSISTENCIA_ESTADO", "persistencia_estado.json")
+
+# Filas por pedido de upsert
+LOTE_FILAS = int(os.environ.get("PERSISTENCIA_LOTE", 1000))
+
+# Columnas de la tabla 'detecciones' (las que falten en el DataFrame no se envían)
+COLUMNAS_DETECCIONES = [
+    'latitude', 'longitude', 'acq_date', 'acq_time', 'fecha_deteccion', 'satellite', 'instrument',
+    'daynight', 'confidence', 'frp', 'bright_ti4', 'bright_ti5', 'provincia',
+    'viento_kmh', 'humedad_relativa', 'temperatura_c', 'lluvia_7d_mm',
+    'ffmc', 'dmc', 'dc', 'isi', 'bui', 'fwi', 'indice_riesgo', 'nivel_riesgo'
+]
+
+# Columnas de 'focos_diarios' tomadas de la evolución diaria
+COLUMNAS_EVOLUCION = ['focos_nuevos', 'focos_acumulados', 'frp_total', 'frp_promedio', 'frp_maximo',
+                      'confianza', 'superficie_estimada_ha']
+
+# Índice a partir del cual un foco cuenta como riesgo ALTO o superior (como en resumen.py)
+UMBRAL_RIESGO_ALTO = 40
+
+
+# ============================================================
+# FILAS
+# ============================================================
+
+def id_deteccion(df):
+    """Id estable de cada detección (las columnas con que se eliminan duplicados al descargar)"""
+    claves = (df['latitude'].map('{:.4f}'.format) + ',' + df['longitude'].map('{:.4f}'.format) + ','
+              + pd.to_datetime(df['acq_date']).dt.strftime('%Y-%m-%d') + ','
+              + df['acq_time'].astype(int).map('{:04d}'.format))
+    return claves.map(lambda clave: hashlib.sha256(clave.encode('utf-8')).hexdigest()[:16])
+
+
+def filas_detecciones(df):
+    """Filas de la tabla 'detecciones' (fechas como texto, hora de adquisición en UTC)"""
+    hora = df['acq_time'].astype(int)
+    fecha = pd.to_datetime(df['acq_date'])
+    filas = df.assign(
+        acq_date=fecha.dt.strftime('%Y-%m-%d'),
+        acq_time=hora,
+        fecha_deteccion=(fecha + pd.to_timedelta(hora // 100, unit='h')
+                         + pd.to_timedelta(hora % 100, unit='m')).dt.strftime('%Y-%m-%dT%H:%M:00Z')
+    )
+    filas = filas[[c for c in COLUMNAS_DETECCIONES if c in filas.columns]]
+    filas.insert(0, 'id', id_deteccion(df))
+    return filas.drop_duplicates('id').reset_index(drop=True)
+
+
+def filas_diarias(df, evolucion):
+    """Filas de la tabla 'focos_diarios': la evolución diaria más el riesgo de cada día"""
+    filas = evolucion[['acq_date'] + [c for c in COLUMNAS_EVOLUCION if c in evolucion.columns]]
+    if 'indice_riesgo' in df:
+        riesgo = df.groupby('acq_date')['indice_riesgo'].agg(
+            indice_riesgo_promedio='mean',
+            focos_riesgo_alto=lambda indice: int((indice >= UMBRAL_RIESGO_ALTO).sum())
+        ).round(1).reset_index()
+        filas = filas.merge(riesgo, on='acq_date', how='left')
+    filas = filas.rename(columns={'acq_date': 'fecha'})
+    filas['fecha'] = pd.to_datetime(filas['fecha']).dt.strftime('%Y-%m-%d')
+    return filas.reset_index(drop=True)
+
+
+def _huellas(filas):
+    """Hash del contenido de cada fila"""
+    return pd.util.hash_pandas_object(filas, index=False).map('{:016x}'.format)
+
+
+# ============================================================
+# ESTADO
+# ============================================================
+
+def _cargar_estado(ruta, destino):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        estado = {}
+    if estado.get('destino') != destino:
+        return {'destino': destino, 'tablas': {}}
+    return estado
+
+
+def _guardar_estado(ruta, estado):
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(estado, f)
+    os.replace(temporal, ruta)
+
+
+# ============================================================
+# ESCRITURA
+# ============================================================
+
+def persistir(cliente, tablas, destino, ruta_estado=ARCHIVO_ESTADO, lote=LOTE_FILAS, completo=False):
+    """
+    Upsert por lotes de las filas nuevas o cambiadas
+    tablas: {tabla: (columna clave, DataFrame de filas)}
+    completo: ignora el estado y vuelve a mandar todas las filas
+    Retorna {tabla: {'filas', 'enviadas', 'lotes'}}
+    """
+    from postgrest.types import ReturnMethod
+
+    estado = _cargar_estado(ruta_estado, destino)
+    resultado = {}
+    for tabla, (clave, filas) in tablas.items():
+        enviadas = {} if completo else estado['tablas'].get(tabla, {})
+        huellas = _huellas(filas)
+        claves = filas[clave].astype(str)
+        cambiadas = (claves.map(enviadas) != huellas).to_numpy()
+        pendientes = filas.loc[cambiadas]
+        lotes = range(0, len(pendientes), lote)
+        print(f"🗃️  {tabla}: {len(pendientes)} filas nuevas o cambiadas de {len(filas)} "
+              f"({len(lotes)} pedidos)")
+
+        for inicio in lotes:
+            parte = pendientes.iloc[inicio:inicio + lote]
+            registros = json.loads(parte.to_json(orient='records', force_ascii=False))
+            cliente.table(tabla).upsert(registros, on_conflict=clave, returning=ReturnMethod.minimal).execute()
+            enviadas.update(zip(claves[parte.index], huellas[parte.index]))
+            estado['tablas'][tabla] = enviadas
+            _guardar_estado(ruta_estado, estado)
+
+        estado['tablas'][tabla] = enviadas
+        resultado[tabla] = {'filas': len(filas), 'enviadas': len(pendientes), 'lotes': len(lotes)}
+    _guardar_estado(ruta_estado, estado)
+    return resultado
@@ -0,0 +1,567 @@
+"""
+Pipeline del dashboard expresado como etapas con nombre
+
+Cada etapa declara sus dependencias, los parámetros que usa y los métodos del
+analizador que ejecuta. Su huella es el hash de: código de esos métodos +
+parámetros + huella de la SALIDA de cada dependencia. Las salidas se guardan
+en disco (.cache_pipeline/), así que al pedir un objetivo sólo se ejecutan las
+etapas invalidadas; si una etapa se recalcula pero produce exactamente la
+misma salida, las etapas siguientes siguen en caché.
+
+Uso:
+    python pipeline.py publish              # ejecutar hasta publicar
+    python pipeline.py charts --dry-run     # mostrar qué se recalcularía
+    python pipeline.py excel --forzar risk  # recalcular 'risk' aunque esté en caché
+"""
+import os
+import sys
+import json
+import glob
+import pickle
+import hashlib
+import inspect
+import argparse
+from datetime import datetime
+
+import eventos
+import bloqueo
+import alertas
+import climatologia
+import resumen
+import instantanea
+import fwi
+import territorio
+import persistencia
+import historial
+from incendios_v2 import AnalizadorIncendiosHistorico
+
+DIRECTORIO_CACHE = os.environ.get("PIPELINE_CACHE", ".cache_pipeline")
+
+# Cantidad de versiones que se conservan por etapa
+VERSIONES_CONSERVADAS = 3
+
+
+class PipelineSinDatos(Exception):
+    """No hay detecciones para continuar el pipeline"""
+
+
+class Etapa:
+    """Definición de una etapa: función, dependencias, parámetros y métodos usados"""
+
+    def __init__(self, nombre, funcion, dependencias=(), parametros=(), metodos=(), archivos=False,
+                 funciones=()):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.dependencias = tuple(dependencias)
+        self.parametros = tuple(parametros)
+        self.metodos = tuple(metodos)
+        # Funciones de otros módulos cuyo código también forma parte de la huella
+        self.funciones = tuple(funciones)
+        # Las etapas de archivos escriben en su propia carpeta y retornan {nombre: ruta}
+        self.archivos = archivos
+
+    def version_codigo(self):
+        """Hash del código fuente de la etapa y de los métodos del analizador que llama"""
+        fuentes = [inspect.getsource(self.funcion)]
+        fuentes += [inspect.getsource(getattr(AnalizadorIncendiosHistorico, m)) for m in self.metodos]
+        fuentes += [inspect.getsource(f) for f in self.funciones]
+        return hashlib.sha256("\n".join(fuentes).encode('utf-8')).hexdigest()
+
+
+# ============================================================
+# ETAPAS
+# ============================================================
+
+def _ingest(analizador, params, entradas, destino):
+    return analizador.obtener_datos_actualizados(params['fuente'])
+
+
+def _alerts(analizador, params, entradas, destino):
+    # Acompaña a 'publish' (ACOMPANANTES): corre apenas termina la descarga y, si falla, no frena la publicación
+    return alertas.procesar_alertas(entradas['ingest'], ahora=analizador.ahora(), notificar=analizador.eventos)
+
+
+def _filter(analizador, params, entradas, destino):
+    df = entradas['ingest']
+    if df is None or len(df) == 0:
+        raise PipelineSinDatos("No se encontraron datos de incendios")
+    df_filtrado = analizador.filtrar_por_confianza(df, params['confianza_minima'])
+    if len(df_filtrado) == 0:
+        raise PipelineSinDatos(f"No hay detecciones con confianza >={params['confianza_minima']}%")
+    return df_filtrado
+
+
+def _temporal(analizador, params, entradas, destino):
+    return analizador.agregar_informacion_temporal(entradas['filter'].copy())
+
+
+def _risk_grid(analizador, params, entradas, destino):
+    return analizador.obtener_grilla_riesgo()
+
+
+def _risk(analizador, params, entradas, destino):
+    df = analizador.asignar_riesgo_grilla(entradas['temporal'], entradas['risk_grid'])
+    analizador.mostrar_distribucion_riesgo(df)
+    return df
+
+
+def _evolution(analizador, params, entradas, destino):
+    return analizador.analizar_evolucion_diaria(entradas['temporal'])
+
+
+def _baseline(analizador, params, entradas, destino):
+    # Agregados precalculados por climatologia.py: no se recorre el historial
+    linea_base = climatologia.cargar_linea_base()
+    if linea_base is None:
+        print("ℹ️  Sin línea de base (climatologia.py calcular): se omite la comparación con lo normal")
+    return linea_base
+
+
+def _dataset(analizador, params, entradas, destino):
+    from exportacion import guardar_dataset
+
+    # Dataset local que /api/export filtra y envía por lotes
+    df = entradas['risk']
+    ruta = guardar_dataset(df)
+    print(f"✓ Dataset para exportación: {ruta} ({len(df)} detecciones)")
+    # Instantánea que los workers web consultan por mmap (/api/consulta)
+    ruta_instantanea = instantanea.guardar_instantanea(df)
+    print(f"✓ Instantánea para consultas: {ruta_instantanea}")
+    return {'ruta': ruta, 'instantanea': ruta_instantanea, 'filas': len(df)}
+
+
+def _map(analizador, params, entradas, destino):
+    from publicacion import STORAGE_URL
+
+    ruta = os.path.join(destino, 'mapa_generado.html')
+    capas = os.path.join(destino, 'capas_mapa')
+    # El mapa usa capas diarias que el navegador descarga desde Storage sólo al mover el slider
+    analizador.crear_mapa_interactivo(entradas['risk'], nombre_archivo=ruta,
+                                      modo_temporal='dia', directorio_capas=capas,
+                                      url_capas=f"{STORAGE_URL}/capas_mapa",
+                                      grilla=entradas['risk_grid'])
+    return {'mapa_generado.html': ruta, 'capas_mapa': capas}
+
+
+def _charts(analizador, params, entradas, destino):
+    ruta = os.path.join(destino, 'evolucion_historica.html')
+    analizador.crear_graficos_evolucion(entradas['evolution'], nombre_archivo=ruta,
+                                        linea_base=entradas['baseline'])
+    return {'evolucion_historica.html': ruta}
+
+
+def _summary(analizador, params, entradas, destino):
+    # Un único resumen que leen el Excel, la tabla 'stats' y el dashboard (resumen.json)
+    datos = resumen.calcular_resumen(entradas['risk'], entradas['evolution'], analizador.ahora())
+    datos['vs_normal'] = climatologia.comparar_con_linea_base(entradas['evolution'], entradas['baseline'],
+                                                              params['fecha_referencia'])
+    ruta = os.path.join(destino, 'resumen.json')
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+    return {'resumen.json': ruta}
+
+
+def _leer_resumen(entradas):
+    with open(entradas['summary']['resumen.json'], encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _excel(analizador, params, entradas, destino):
+    ruta = os.path.join(destino, 'detalle_incendios.xlsx')
+    if analizador.exportar_excel_completo(entradas['risk'], entradas['evolution'], nombre_archivo=ruta,
+                                          resumen=_leer_resumen(entradas)) is None:
+        raise RuntimeError("No se pudo generar el Excel")
+    return {'detalle_incendios.xlsx': ruta}
+
+
+def _persist(analizador, params, entradas, destino):
+    # Detecciones y totales diarios en tablas consultables: sólo viaja lo nuevo o cambiado
+    from supabase import create_client
+    from publicacion import clave_escritura
+
+    cliente = create_client(params['supabase_url'], clave_escritura())
+    tablas = {
+        'detecciones': ('id', persistencia.filas_detecciones(entradas['risk'])),
+        'focos_diarios': ('fecha', persistencia.filas_diarias(entradas['risk'], entradas['evolution']))
+    }
+    # Acompaña a 'publish': un error no frena la publicación ni queda en caché;
+    # lo no confirmado queda pendiente en el estado de persistencia y se envía al reintentar
+    return persistencia.persistir(cliente, tablas, destino=params['supabase_url'])
+
+
+def _publish(analizador, params, entradas, destino):
+    from supabase import create_client
+    from publicacion import clave_escritura, publicar_artefactos
+
+    df = entradas['risk']
+    evolucion = entradas['evolution']
+    cliente = create_client(params['supabase_url'], clave_escritura())
+
+    # Publicar sólo lo que cambió, con nombres direccionados por contenido
+    # (manifest.json se escribe en la carpeta de la etapa antes de subirlo)
+    print("☁️ Publicando archivos en Supabase Storage...")
+    os.makedirs(destino, exist_ok=True)
+    manifiesto = publicar_artefactos(
+        cliente,
+        {
+            'mapa_generado.html': entradas['map']['mapa_generado.html'],
+            'evolucion_historica.html': entradas['charts']['evolucion_historica.html'],
+            'detalle_incendios.xlsx': entradas['excel']['detalle_incendios.xlsx'],
+            'resumen.json': entradas['summary']['resumen.json']
+        },
+        destino,
+        directorios_inmutables={'capas_mapa': entradas['map']['capas_mapa']},
+        filas={'detecciones': len(df), 'dias': len(evolucion)},
+        notificar=analizador.eventos
+    )
+    if manifiesto is None:
+        raise RuntimeError("No se pudieron publicar los artefactos")
+
+    # Actualización de estadísticas en tabla 'stats'
+    print("💾 Actualizando estadísticas...")
+    datos = _leer_resumen(entradas)
+    comparacion = datos['vs_normal']
+    nuevos_stats = resumen.fila_stats(datos)
+    if comparacion is not None:
+        # Requiere la columna vs_normal (text) en la tabla stats
+        nuevos_stats["vs_normal"] = f"{comparacion['texto']} ({comparacion['temporadas']})"
+    try:
+        cliente.table("stats").upsert(nuevos_stats).execute()
+    except Exception as e:
+        if "vs_normal" not in nuevos_stats:
+            raise
+        print(f"⚠️  No se pudo guardar vs_normal ({e}); se actualizan las demás estadísticas")
+        nuevos_stats.pop("vs_normal")
+        cliente.table("stats").upsert(nuevos_stats).execute()
+
+    return {'generado': manifiesto['generado'], 'stats': nuevos_stats}
+
+
+ETAPAS = {etapa.nombre: etapa for etapa in [
+    Etapa('ingest', _ingest, parametros=('fuente', 'corte', 'territorio'),
+          metodos=('obtener_datos_actualizados', 'obtener_datos_rango_fechas', '_bloques_firms',
+                   'filtrar_territorio'),
+          funciones=(territorio.Territorio, territorio.cargar_territorio)),
+    Etapa('alerts', _alerts, ['ingest'],
+          funciones=(alertas.procesar_alertas, alertas.Referencias, alertas.id_alerta)),
+    Etapa('filter', _filter, ['ingest'], parametros=('confianza_minima',),
+          metodos=('filtrar_por_confianza',)),
+    Etapa('temporal', _temporal, ['filter'], metodos=('agregar_informacion_temporal',)),
+    # La grilla no depende de las detecciones: se recalcula una vez por hora ('corte')
+    Etapa('risk_grid', _risk_grid, parametros=('corte',),
+          metodos=('obtener_grilla_riesgo', '_meteo_desde_horario', 'calcular_riesgo_vectorizado',
+                   '_meteo_diario_desde_horario', 'calcular_fwi_grilla'),
+          funciones=(fwi.ffmc, fwi.dmc, fwi.dc, fwi.isi, fwi.bui, fwi.fwi,
+                     fwi.paso_diario, fwi.calcular_serie, fwi.indice_desde_fwi)),
+    Etapa('risk', _risk, ['temporal', 'risk_grid'],
+          metodos=('asignar_riesgo_grilla', 'clasificar_riesgo', 'mostrar_distribucion_riesgo')),
+    Etapa('evolution', _evolution, ['temporal'],
+          metodos=('analizar_evolucion_diaria', '_agregar_por_dia', '_acumular_evolucion')),
+    Etapa('baseline', _baseline, parametros=('linea_base',), funciones=(climatologia.cargar_linea_base,)),
+    Etapa('dataset', _dataset, ['risk'],
+          funciones=(instantanea.guardar_instantanea, instantanea._columna)),
+    Etapa('map', _map, ['risk', 'risk_grid'], archivos=True,
+          metodos=('crear_mapa_interactivo', 'exportar_capas_temporales', '_agregar_marcadores',
+                   '_agregar_capa_riesgo', '_agregar_leyenda', '_fijar_ids')),
+    Etapa('charts', _charts, ['evolution', 'baseline'], archivos=True,
+          metodos=('crear_graficos_evolucion', '_agregar_linea_base'),
+          funciones=(climatologia.linea_base_en_fechas, climatologia.dia_temporada)),
+    Etapa('summary', _summary, ['risk', 'evolution', 'baseline'], archivos=True, parametros=('fecha_referencia',),
+          funciones=(resumen.calcular_resumen, resumen._valor, climatologia.comparar_con_linea_base,
+                     climatologia.dia_temporada)),
+    Etapa('excel', _excel, ['risk', 'evolution', 'summary'], archivos=True, metodos=('exportar_excel_completo',),
+          funciones=(resumen.fecha_corta,)),
+    Etapa('persist', _persist, ['risk', 'evolution'], parametros=('supabase_url',),
+          funciones=(persistencia.persistir, persistencia.filas_detecciones, persistencia.filas_diarias,
+                     persistencia.id_deteccion, persistencia._huellas)),
+    Etapa('publish', _publish, ['dataset', 'map', 'charts', 'excel', 'summary', 'risk', 'evolution'],
+          parametros=('supabase_url',),
+          funciones=(resumen.fila_stats,)),
+]}
+
+# Etapas que corren junto con un objetivo sin ser dependencias suyas: si fallan se
+# informa y el objetivo se completa igual. Como no quedan en caché, la próxima
+# corrida las reintenta
+ACOMPANANTES = {
+    'publish': ['alerts', 'persist']
+}
+
+
+# ============================================================
+# EJECUCIÓN
+# ============================================================
+
+def parametros_por_defecto(ahora=None, intervalo_minutos=60):
+    """
+    Parámetros del pipeline
+    'corte' redondea la hora actual (o la de referencia al reproducir un archivo)
+    al intervalo: los datos de FIRMS y Open-Meteo se consideran vigentes dentro
+    de la misma ventana
+    """
+    from publicacion import SUPABASE_URL
+
+    ahora = ahora or datetime.now()
+    minutos = (ahora.hour * 60 + ahora.minute) // intervalo_minutos * intervalo_minutos
+    corte = ahora.replace(hour=minutos // 60, minute=minutos % 60, second=0, microsecond=0)
+    return {
+        'fuente': 'VIIRS_SNPP_NRT',
+        'confianza_minima': 70,
+        'corte': corte.strftime('%Y-%m-%dT%H:%M'),
+        # Día con que se compara la temporada contra la línea de base
+        'fecha_referencia': corte.strftime('%Y-%m-%d'),
+        # Cambia sólo cuando se recalcula la línea de base
+        'linea_base': climatologia.huella_linea_base(),
+        # Cambia sólo cuando se reemplaza el archivo de límites provinciales
+        'territorio': territorio.huella_limites(),
+        # Base de destino de 'persist' y 'publish': otra base no reutiliza lo ya escrito
+        'supabase_url': SUPABASE_URL
+    }
+
+
+def _hash_salida(etapa, salida):
+    """Hash del contenido producido por una etapa (archivos o pickle del objeto)"""
+    h = hashlib.sha256()
+    if etapa.archivos:
+        for nombre, ruta in sorted(salida.items()):
+            rutas = sorted(glob.glob(os.path.join(ruta, '*'))) if os.path.isdir(ruta) else [ruta]
+            for archivo in rutas:
+                h.update(os.path.relpath(archivo, ruta).encode('utf-8'))
+                with open(archivo, 'rb') as f:
+                    h.update(f.read())
+    else:
+        h.update(pickle.dumps(salida, protocol=pickle.HIGHEST_PROTOCOL))
+    return h.hexdigest()
+
+
+class Pipeline:
+    """Resuelve un objetivo ejecutando sólo las etapas cuya huella no está en caché"""
+
+    def __init__(self, analizador, params=None, directorio=DIRECTORIO_CACHE, forzar=()):
+        self.analizador = analizador
+        self.params = params or parametros_por_defecto()
+        self.directorio = directorio
+        self.forzar = set(forzar)
+        self._salidas = {}          # etapa -> salida cargada en memoria
+        self._huellas_salida = {}   # etapa -> hash de la salida
+        self._huellas_entrada = {}  # etapa -> huella de entrada
+        self.ejecutadas = []        # etapas ejecutadas en esta corrida (no tomadas de la caché)
+        os.makedirs(directorio, exist_ok=True)
+
+    def huella_entrada(self, nombre, huellas_dependencias):
+        etapa = ETAPAS[nombre]
+        contenido = {
+            'etapa': nombre,
+            'codigo': etapa.version_codigo(),
+            'parametros': {p: self.params[p] for p in etapa.parametros},
+            'dependencias': huellas_dependencias
+        }
+        return hashlib.sha256(json.dumps(contenido, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _base(self, nombre, huella):
+        return os.path.join(self.directorio, f"{nombre}-{huella[:16]}")
+
+    def _meta_en_cache(self, nombre, huella):
+        """Metadatos de una ejecución previa con la misma huella, o None"""
+        if nombre in self.forzar:
+            return None
+        try:
+            with open(self._base(nombre, huella) + '.json', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def plan(self, objetivo):
+        """
+        Estado de cada etapa necesaria para el objetivo sin ejecutar nada:
+        'cache', 'recalcular' o 'pendiente' (depende de una etapa a recalcular;
+        se recalcula salvo que esa etapa produzca la misma salida)
+        """
+        estados = {}
+        huellas_salida = {}
+
+        def visitar(nombre):
+            if nombre in estados:
+                return
+            etapa = ETAPAS[nombre]
+            for dependencia in etapa.dependencias:
+                visitar(dependencia)
+            if any(huellas_salida.get(d) is None for d in etapa.dependencias):
+                estados[nombre] = 'pendiente'
+                huellas_salida[nombre] = None
+                return
+            huella = self.huella_entrada(nombre, {d: huellas_salida[d] for d in etapa.dependencias})
+            meta = self._meta_en_cache(nombre, huella)
+            estados[nombre] = 'cache' if meta else 'recalcular'
+            huellas_salida[nombre] = meta['huella_salida'] if meta else None
+
+        visitar(objetivo)
+        return estados
+
+    def _resolver_huella(self, nombre):
+        """Hash de la salida de una etapa, ejecutándola sólo si no está en caché"""
+        if nombre in self._huellas_salida:
+            return self._huellas_salida[nombre]
+
+        etapa = ETAPAS[nombre]
+        huellas_dependencias = {d: self._resolver_huella(d) for d in etapa.dependencias}
+        huella = self.huella_entrada(nombre, huellas_dependencias)
+        self._huellas_entrada[nombre] = huella
+
+        meta = self._meta_en_cache(nombre, huella)
+        if meta:
+            print(f"⏩ {nombre}: en caché ({huella[:12]})")
+            self.analizador._evento('etapa', etapa=nombre, estado='cache')
+        else:
+            meta = self._ejecutar(nombre, huella)
+
+        self._huellas_salida[nombre] = meta['huella_salida']
+        return meta['huella_salida']
+
+    def _ejecutar(self, nombre, huella):
+        etapa = ETAPAS[nombre]
+        entradas = {d: self.salida(d) for d in etapa.dependencias}
+        print(f"\n▶️  Etapa {nombre} ({huella[:12]})")
+        self.analizador._evento('etapa', etapa=nombre, estado='inicio')
+        inicio = datetime.now()
+
+        base = self._base(nombre, huella)
+        destino = base + '.d'
+        if etapa.archivos:
+            os.makedirs(destino, exist_ok=True)
+
+        salida = etapa.funcion(self.analizador, self.params, entradas, destino)
+        self._salidas[nombre] = salida
+
+        with open(base + '.pkl', 'wb') as f:
+            pickle.dump(salida, f, protocol=pickle.HIGHEST_PROTOCOL)
+        meta = {
+            'etapa': nombre,
+            'huella_entrada': huella,
+            'huella_salida': _hash_salida(etapa, salida),
+            'ejecutado': datetime.now().isoformat(timespec='seconds')
+        }
+        # El .json se escribe al final: sólo marca en caché las etapas completas
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        
+        self.analizador._evento('etapa', etapa=nombre, estado='fin',
+                                segundos=round((datetime.now() - inicio).total_seconds(), 1))
+        if etapa.archivos:
+            self.analizador._evento('artefacto_generado', etapa=nombre, archivos=sorted(salida))
+
+        self.ejecutadas.append(nombre)
+        self._limpiar(nombre)
+        return meta
+
+    def _limpiar(self, nombre):
+        """Borra las versiones más viejas de una etapa"""
+        metas = sorted(glob.glob(os.path.join(self.directorio, f"{nombre}-*.json")),
+                       key=os.path.getmtime, reverse=True)
+        for viejo in metas[VERSIONES_CONSERVADAS:]:
+            base = viejo[:-len('.json')]
+            for ruta in (viejo, base + '.pkl'):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            if os.path.isdir(base + '.d'):
+                for raiz, carpetas, archivos in os.walk(base + '.d', topdown=False):
+                    for archivo in archivos:
+                        os.remove(os.path.join(raiz, archivo))
+                    for carpeta in carpetas:
+                        os.rmdir(os.path.join(raiz, carpeta))
+                os.rmdir(base + '.d')
+
+    def salida(self, nombre):
+        """Salida de una etapa (desde memoria, desde disco, o ejecutándola)"""
+        if nombre not in self._salidas:
+            self._resolver_huella(nombre)
+            if nombre not in self._salidas:
+                with open(self._base(nombre, self._huellas_entrada[nombre]) + '.pkl', 'rb') as f:
+                    self._salidas[nombre] = pickle.load(f)
+        return self._salidas[nombre]
+
+
+def _agregar_historial(pipeline):
+    """
+    Fila del historial de la publicación recién hecha. Va fuera de la etapa
+    'publish': un efecto así no se memoiza (la caché lo omitiría o lo repetiría)
+    """
+    from supabase import create_client
+    from publicacion import clave_escritura
+
+    cliente = create_client(pipeline.params['supabase_url'], clave_escritura())
+    historial.agregar_al_historial(cliente, _leer_resumen({'summary': pipeline.salida('summary')}))
+
+
+def _acompanante(pipeline, nombre):
+    """Ejecuta una etapa acompañante; retorna el error (texto) si falló, None si no"""
+    # Un error en las dependencias sí corta la corrida: el objetivo también las necesita
+    for dependencia in ETAPAS[nombre].dependencias:
+        pipeline.salida(dependencia)
+    try:
+        pipeline.salida(nombre)
+    except Exception as e:
+        print(f"⚠️  Etapa {nombre} falló ({e}): se continúa y se reintenta en la próxima corrida")
+        pipeline.analizador._evento('etapa', etapa=nombre, estado='fallo', mensaje=str(e))
+        return str(e)
+    return None
+
+
+def ejecutar(objetivo='publish', dry_run=False, forzar=(), params=None, map_key=None):
+    """Ejecuta (o con dry_run sólo muestra) las etapas necesarias para el objetivo"""
+    if objetivo not in ETAPAS:
+        raise ValueError(f"Etapa desconocida: {objetivo} (opciones: {', '.join(ETAPAS)})")
+
+    map_key = map_key or os.environ.get("MAP_KEY", "a66ff23e6b0f370791cb4bd2dd3123d0")
+    analizador = AnalizadorIncendiosHistorico(map_key)
+    params = params or parametros_por_defecto(analizador.ahora())
+    pipeline = Pipeline(analizador, params=params, forzar=forzar)
+
+    if dry_run:
+        estados = {}
+        for nombre in ACOMPANANTES.get(objetivo, []) + [objetivo]:
+            estados.update(pipeline.plan(nombre))
+        iconos = {'cache': '⏩', 'recalcular': '▶️ ', 'pendiente': '❔'}
+        print(f"\n📋 Plan para '{objetivo}':")
+        for nombre, estado in estados.items():
+            print(f"   {iconos[estado]} {nombre}: {estado}")
+        return estados
+
+    # Progreso visible en vivo desde la app web (/api/progreso)
+    analizador.eventos = eventos.emitir
+    eventos.iniciar_corrida(objetivo)
+    try:
+        # Las acompañantes primero: las alertas salen apenas termina la descarga
+        for nombre in ACOMPANANTES.get(objetivo, []):
+            _acompanante(pipeline, nombre)
+        resultado = pipeline.salida(objetivo)
+        # Además de pisar la fila de 'stats', cada publicación nueva queda en el historial
+        if 'publish' in pipeline.ejecutadas:
+            _agregar_historial(pipeline)
+    except Exception as e:
+        eventos.emitir('fallo', mensaje=str(e))
+        raise
+    eventos.emitir('fin', objetivo=objetivo)
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline del dashboard de incendios")
+    parser.add_argument('objetivo', nargs='?', default='publish', choices=list(ETAPAS))
+    parser.add_argument('--dry-run', action='store_true', help="mostrar qué etapas se recalcularían")
+    parser.add_argument('--forzar', nargs='*', default=[], choices=list(ETAPAS),
+                        help="etapas a recalcular aunque estén en caché")
+    args = parser.parse_args()
+
+    # El bloqueo se mantiene hasta que termina el proceso (app.py y planificador.py lo consultan)
+    cerrojo = None
+    if not args.dry_run:
+        cerrojo = bloqueo.tomar_bloqueo()
+        if cerrojo is None:
+            print("⏳ Ya hay un pipeline en curso: no se inicia otro")
+            sys.exit(bloqueo.CODIGO_EN_CURSO)
+
+    try:
+        ejecutar(args.objetivo, dry_run=args.dry_run, forzar=args.forzar)
+    except PipelineSinDatos as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
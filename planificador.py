@@ -0,0 +1,270 @@
+"""
+Planificador de actualizaciones alineado a las pasadas de VIIRS
+
+Los satélites SNPP, NOAA-20 y NOAA-21 tienen órbita heliosincrónica: cruzan la
+zona cerca de la 01:30 y de las 13:30 hora solar local, con NOAA-20 y NOAA-21
+unos minutos antes que SNPP. Los datos NRT llegan a FIRMS unas horas después.
+Los turnos del día son entonces pasada + latencia (en UTC), agrupando los que
+quedan cerca.
+
+En cada turno un sondeo barato (último día de FIRMS para la zona) decide si hay
+filas nuevas; sólo en ese caso se lanza el pipeline completo. Si no hay nada
+nuevo se vuelve a sondear un par de veces (la latencia NRT varía). El estado
+(último turno atendido, huella del último sondeo) se guarda en disco: al
+reiniciar se recupera el último turno perdido.
+
+Uso:
+    python planificador.py               # demonio
+    python planificador.py --horarios    # mostrar los turnos calculados
+    python planificador.py --una-vez     # atender el turno pendiente y salir (cron)
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from bloqueo import CODIGO_EN_CURSO, pipeline_en_curso, lanzar_pipeline
+
+ARCHIVO_ESTADO = os.environ.get("PLANIFICADOR_ESTADO", "planificador_estado.json")
+
+# Desfase aproximado de cada satélite respecto de SNPP en la misma zona (minutos)
+SATELITES = {
+    'SNPP': {'fuente': 'VIIRS_SNPP_NRT', 'desfase_min': 0},
+    'NOAA-20': {'fuente': 'VIIRS_NOAA20_NRT', 'desfase_min': -50},
+    'NOAA-21': {'fuente': 'VIIRS_NOAA21_NRT', 'desfase_min': -25}
+}
+
+# Cruces de la pasada nocturna y diurna (hora solar local)
+HORAS_CRUCE_LOCAL = (1.5, 13.5)
+
+# Demora típica entre la pasada y la disponibilidad NRT en FIRMS
+LATENCIA_NRT_MIN = int(os.environ.get("PLANIFICADOR_LATENCIA_MIN", 180))
+
+# Turnos a menos de este intervalo se atienden juntos (al final del grupo)
+AGRUPAR_MIN = 45
+
+# Sondeos extra cuando un turno no encuentra datos nuevos
+REINTENTOS = 2
+ESPERA_REINTENTO_MIN = 30
+
+# Un turno perdido más viejo que esto ya no se recupera
+RECUPERAR_HORAS = 24
+
+# Historial de turnos guardado en el estado
+HISTORIAL = 50
+
+
+# ============================================================
+# TURNOS
+# ============================================================
+
+def _longitud_centro(zona_bounds):
+    oeste, _, este, _ = (float(v) for v in zona_bounds.split(','))
+    return (oeste + este) / 2
+
+
+def horarios_pasadas(zona_bounds, satelites=tuple(SATELITES), latencia_min=LATENCIA_NRT_MIN):
+    """Minutos del día (UTC) en que conviene actualizar, ordenados"""
+    # Hora solar local = UTC + longitud / 15
+    desfase_utc = -_longitud_centro(zona_bounds) / 15 * 60
+    minutos = sorted(
+        round(hora * 60 + desfase_utc + SATELITES[s]['desfase_min'] + latencia_min) % 1440
+        for s in satelites for hora in HORAS_CRUCE_LOCAL
+    )
+
+    # Un turno por grupo de pasadas cercanas: el último, cuando ya llegaron todas
+    grupos = []
+    for minuto in minutos:
+        if grupos and minuto - grupos[-1][-1] <= AGRUPAR_MIN:
+            grupos[-1].append(minuto)
+        else:
+            grupos.append([minuto])
+    if len(grupos) > 1 and grupos[0][0] + 1440 - grupos[-1][-1] <= AGRUPAR_MIN:
+        grupos[0] = grupos.pop() + grupos[0]
+    return sorted(grupo[-1] for grupo in grupos)
+
+
+def leer_horarios(texto):
+    """'HH:MM,HH:MM' (UTC) → minutos del día"""
+    minutos = []
+    for valor in texto.split(','):
+        horas, _, mins = valor.strip().partition(':')
+        minutos.append(int(horas) * 60 + int(mins or 0))
+    return sorted(minutos)
+
+
+def turnos_entre(horarios, desde, hasta):
+    """Turnos (datetime UTC) en el intervalo (desde, hasta]"""
+    turnos = []
+    dia = datetime(desde.year, desde.month, desde.day, tzinfo=timezone.utc)
+    while dia <= hasta:
+        for minuto in horarios:
+            turno = dia + timedelta(minutes=minuto)
+            if desde < turno <= hasta:
+                turnos.append(turno)
+        dia += timedelta(days=1)
+    return turnos
+
+
+def proximo_turno(horarios, despues):
+    return turnos_entre(horarios, despues, despues + timedelta(days=1, minutes=1))[0]
+
+
+# ============================================================
+# ESTADO
+# ============================================================
+
+def cargar_estado(ruta=ARCHIVO_ESTADO):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar_estado(estado, ruta=ARCHIVO_ESTADO):
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2)
+    os.replace(temporal, ruta)
+
+
+# ============================================================
+# SONDEO Y EJECUCIÓN
+# ============================================================
+
+def sondear_firms(analizador, fuente):
+    """
+    Huella de las detecciones del último día para la zona (None si FIRMS no respondió)
+    Es un solo pedido chico, en lugar de los bloques de 5 días de toda la temporada
+    """
+    url = f"https://firms.modaps.eosdis.nasa.gov/api/area/csv/{analizador.map_key}/{fuente}/{analizador.zona_bounds}/2"
+    try:
+        texto = analizador._get_texto(url, timeout=30).strip()
+    except Exception as e:
+        print(f"⚠️  Sondeo FIRMS falló: {type(e).__name__}")
+        return None
+    if "Invalid" in texto or "Error" in texto:
+        print(f"⚠️  Sondeo FIRMS: {texto[:100]}")
+        return None
+
+    # El orden de las filas no importa
+    lineas = texto.splitlines()
+    filas = sorted(lineas[1:])
+    return {
+        'filas': len(filas),
+        'huella': hashlib.sha256('\n'.join(filas).encode('utf-8')).hexdigest()[:16]
+    }
+
+
+def ejecutar_pipeline():
+    """Corre el pipeline en un proceso aparte y espera; None si ya había una corrida (la de /update_dashboard)"""
+    if pipeline_en_curso():
+        print("⏳ Ya hay un pipeline en curso: se omite este turno")
+        return None
+    # 'ingest' se fuerza: dentro de la misma hora ('corte') quedaría en caché sin los datos nuevos
+    codigo = lanzar_pipeline('publish', '--forzar', 'ingest').wait()
+    if codigo == CODIGO_EN_CURSO:
+        print("⏳ Otro pipeline arrancó al mismo tiempo: se omite este turno")
+        return None
+    return codigo
+
+
+def atender_turno(turno, estado, analizador, fuente, siguiente=None):
+    """Sondea FIRMS y corre el pipeline si hay filas nuevas; registra el resultado en el estado"""
+    print(f"\n🛰️  Turno {turno:%Y-%m-%d %H:%M} UTC")
+    anterior = estado.get('sondeo', {}).get('huella')
+    sondeo = sondear_firms(analizador, fuente)
+    intentos = 0
+    while sondeo is not None and sondeo['huella'] == anterior and intentos < REINTENTOS:
+        # Los reintentos no se superponen con el turno siguiente
+        if siguiente is not None and datetime.now(timezone.utc) + timedelta(minutes=ESPERA_REINTENTO_MIN) >= siguiente:
+            break
+        intentos += 1
+        print(f"💤 Sin detecciones nuevas; nuevo sondeo en {ESPERA_REINTENTO_MIN} min ({intentos}/{REINTENTOS})")
+        time.sleep(ESPERA_REINTENTO_MIN * 60)
+        sondeo = sondear_firms(analizador, fuente)
+
+    if sondeo is not None and sondeo['huella'] == anterior:
+        print(f"💤 Sin detecciones nuevas ({sondeo['filas']} filas en el último día): no se ejecuta el pipeline")
+        resultado = 'sin_cambios'
+    else:
+        # Sin sondeo (FIRMS no respondió) se ejecuta igual: el pipeline decide con lo que pueda descargar
+        print("🔥 Hay detecciones nuevas: ejecutando pipeline..." if sondeo else "❔ Ejecutando pipeline sin sondeo...")
+        codigo = ejecutar_pipeline()
+        resultado = 'omitido' if codigo is None else ('ok' if codigo == 0 else f'error ({codigo})')
+        # La huella se guarda sólo si el pipeline terminó bien: si falló, el próximo turno reintenta
+        if codigo == 0 and sondeo is not None:
+            estado['sondeo'] = sondeo
+        print(f"{'✅' if codigo == 0 else '⚠️ '} Pipeline: {resultado}")
+
+    estado['ultimo_turno'] = turno.isoformat()
+    estado.setdefault('historial', []).append({
+        'turno': turno.isoformat(),
+        'atendido': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'resultado': resultado,
+        'filas_sondeo': sondeo['filas'] if sondeo else None
+    })
+    estado['historial'] = estado['historial'][-HISTORIAL:]
+    guardar_estado(estado)
+    return resultado
+
+
+def turnos_pendientes(horarios, estado, ahora):
+    """Turnos vencidos desde el último atendido (recuperación acotada a RECUPERAR_HORAS)"""
+    limite = ahora - timedelta(hours=RECUPERAR_HORAS)
+    ultimo = datetime.fromisoformat(estado['ultimo_turno']) if estado.get('ultimo_turno') else ahora
+    return turnos_entre(horarios, max(ultimo, limite), ahora)
+
+
+def correr(horarios, analizador, fuente, una_vez=False):
+    estado = cargar_estado()
+    if not estado.get('ultimo_turno') and not una_vez:
+        # Primer arranque: se empieza por el próximo turno, sin recuperar nada
+        estado['ultimo_turno'] = datetime.now(timezone.utc).isoformat()
+        guardar_estado(estado)
+
+    while True:
+        ahora = datetime.now(timezone.utc)
+        pendientes = turnos_pendientes(horarios, estado, ahora)
+        if una_vez and not pendientes:
+            pendientes = turnos_entre(horarios, ahora - timedelta(days=1), ahora)[-1:]
+        if pendientes:
+            # Varios turnos perdidos se recuperan con una sola ejecución
+            if len(pendientes) > 1:
+                print(f"\n⏪ Recuperando {len(pendientes)} turnos perdidos")
+            atender_turno(pendientes[-1], estado, analizador, fuente,
+                          siguiente=proximo_turno(horarios, ahora))
+            if una_vez:
+                return
+            continue
+
+        siguiente = proximo_turno(horarios, ahora)
+        # Dormir de a tramos cortos: un cambio de hora del sistema no desfasa el turno
+        time.sleep(min(60, max(1, (siguiente - ahora).total_seconds())))
+
+
+if __name__ == "__main__":
+    from incendios_v2 import AnalizadorIncendiosHistorico
+    from pipeline import parametros_por_defecto
+
+    parser = argparse.ArgumentParser(description="Planificador de actualizaciones según pasadas de VIIRS")
+    parser.add_argument('--horarios', action='store_true', help="mostrar los turnos y salir")
+    parser.add_argument('--una-vez', action='store_true', help="atender el turno pendiente (o el último) y salir")
+    args = parser.parse_args()
+
+    analizador = AnalizadorIncendiosHistorico(os.environ.get("MAP_KEY", "a66ff23e6b0f370791cb4bd2dd3123d0"))
+    fuente = parametros_por_defecto()['fuente']
+    if os.environ.get("PLANIFICADOR_HORARIOS"):
+        horarios = leer_horarios(os.environ["PLANIFICADOR_HORARIOS"])
+    else:
+        satelites = [s.strip() for s in os.environ.get("PLANIFICADOR_SATELITES", ','.join(SATELITES)).split(',')]
+        horarios = horarios_pasadas(analizador.zona_bounds, satelites)
+
+    print(f"🗓️  Turnos (UTC): {', '.join(f'{m // 60:02d}:{m % 60:02d}' for m in horarios)} — sondeo de {fuente}")
+    if args.horarios:
+        sys.exit(0)
+    correr(horarios, analizador, fuente, una_vez=args.una_vez)
@@ -0,0 +1,457 @@
+"""
+Prueba de carga de la app web contra un Supabase local
+
+Levanta un servidor HTTP local que imita las dos APIs de Supabase que usa la
+app (la tabla 'stats' vía PostgREST y la lectura pública de Storage, con un
+manifiesto y artefactos sintéticos; también acepta los upserts por lotes de
+persistencia.py), arranca gunicorn con gunicorn.conf.py apuntando a ese
+servidor y golpea cada endpoint con N clientes concurrentes.
+Reporta pedidos por segundo y latencias p50/p95/p99 por endpoint. Si algún
+endpoint tuvo errores sale con código 1 (un endpoint que falla rápido no
+puede pasar por uno rápido).
+
+Uso:
+    python prueba_carga.py                                  # 20 clientes, 10 s por endpoint
+    python prueba_carga.py --concurrencia 100 --duracion 30 --workers 4
+    python prueba_carga.py --latencia-storage-ms 80         # simular la distancia a Supabase
+    python prueba_carga.py --guardar base.json              # guardar resultados
+    python prueba_carga.py --comparar base.json             # exit 1 si p95 empeora más de la tolerancia
+    python prueba_carga.py --permitir-errores               # no salir con 1 si algún pedido falló
+    python prueba_carga.py --url http://localhost:10000     # usar una app ya levantada
+    python prueba_carga.py --persistencia                   # verificar los upserts incrementales de persistencia.py
+
+Con --persistencia no se levanta gunicorn: se corre persistencia.persistir contra
+el Supabase local tres veces (primera corrida, repetición sin cambios y una fila
+cambiada) y se controla cuántos pedidos y filas llegaron en cada una.
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import hashlib
+import argparse
+import threading
+import subprocess
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tempfile
+
+import requests
+
+from publicacion import SUPABASE_KEY, tipo_mime
+
+DIRECTORIO_APP = os.path.dirname(os.path.abspath(__file__))
+
+ENDPOINTS = ['/', '/mapa_embed', '/evolucion_embed', '/descargar', '/api/stats/history']
+
+# Tamaños aproximados de los artefactos sintéticos (bytes)
+TAMANIOS = {
+    'mapa_generado.html': 3_000_000,
+    'evolucion_historica.html': 4_500_000,
+    'detalle_incendios.xlsx': 1_500_000
+}
+
+# Valor de la fila 'stats' del Supabase local: si '/' no lo muestra, la página se armó con el fallback de error
+TOTAL_FOCOS_LOCAL = "12345"
+
+# Detecciones sintéticas y filas por lote de la prueba de persistencia
+FILAS_PERSISTENCIA = 3500
+LOTE_PERSISTENCIA = 1000
+
+# Empeoramiento de p95 tolerado al comparar contra una corrida anterior
+TOLERANCIA = 0.20
+
+
+# ============================================================
+# SUPABASE LOCAL
+# ============================================================
+
+def artefactos_sinteticos(tamanios=TAMANIOS):
+    """{objeto: contenido} con los artefactos direccionados por contenido y su manifiesto"""
+    objetos = {}
+    manifiesto = {'generado': '2026-01-01T00:00:00+00:00', 'artefactos': {}, 'inmutables': [], 'filas': {}}
+    for nombre, tamanio in tamanios.items():
+        base, extension = os.path.splitext(nombre)
+        relleno = f"<!-- {nombre} -->\n".encode('utf-8')
+        contenido = (relleno * (tamanio // len(relleno) + 1))[:tamanio]
+        digest = hashlib.sha256(contenido).hexdigest()
+        objeto = f"{base}.{digest[:16]}{extension}"
+        objetos[objeto] = contenido
+        manifiesto['artefactos'][nombre] = {'objeto': objeto, 'sha256': digest, 'bytes': tamanio}
+    objetos['manifest.json'] = json.dumps(manifiesto).encode('utf-8')
+    return objetos
+
+
+class SupabaseLocal:
+    """Servidor HTTP en un hilo que responde como PostgREST (tabla stats) y Storage público"""
+
+    def __init__(self, objetos, latencia_ms=0):
+        self.objetos = objetos
+        self.etags = {objeto: f'"{hashlib.md5(contenido).hexdigest()}"' for objeto, contenido in objetos.items()}
+        self.latencia = latencia_ms / 1000
+        self.stats = [{
+            "id": 1, "total_focos": TOTAL_FOCOS_LOCAL, "riesgo_avg": "ALTO", "intensidad_max": "18.2 MW",
+            "area_critica": "172,830 ha", "ultima_actualizacion": "01/01/2026 00:00"
+        }]
+        # Tablas escritas por el pipeline (persistencia.py): {tabla: {clave: fila}}
+        self.tablas = {}
+        self.filas_recibidas = 0
+        self.pedidos = 0
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), self._manejador())
+        self.servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}"
+
+    def _manejador(self):
+        local = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def responder(self, estado, cuerpo, tipo, cabeceras=None):
+                self.send_response(estado)
+                self.send_header('Content-Type', tipo)
+                self.send_header('Content-Length', str(len(cuerpo)))
+                for nombre, valor in (cabeceras or {}).items():
+                    self.send_header(nombre, valor)
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(cuerpo)
+
+            def responder_objeto(self, objeto, contenido):
+                """Objeto de Storage con ETag y Range de un solo tramo, como el Storage real"""
+                tipo = tipo_mime(objeto)
+                cabeceras = {'Accept-Ranges': 'bytes',
+                             'ETag': local.etags[objeto],
+                             'Cache-Control': 'max-age=31536000'}
+                if self.headers.get('If-None-Match') == cabeceras['ETag']:
+                    return self.responder(304, b'', tipo, cabeceras)
+                rango = self.headers.get('Range', '')
+                if rango.startswith('bytes='):
+                    desde, _, hasta = rango[6:].partition('-')
+                    if not desde:
+                        desde, hasta = len(contenido) - int(hasta), len(contenido) - 1
+                    desde, hasta = int(desde), min(int(hasta or len(contenido) - 1), len(contenido) - 1)
+                    if desde >= len(contenido) or desde > hasta:
+                        cabeceras['Content-Range'] = f'bytes */{len(contenido)}'
+                        return self.responder(416, b'', tipo, cabeceras)
+                    cabeceras['Content-Range'] = f'bytes {desde}-{hasta}/{len(contenido)}'
+                    return self.responder(206, contenido[desde:hasta + 1], tipo, cabeceras)
+                self.responder(200, contenido, tipo, cabeceras)
+
+            def do_GET(self):
+                local.pedidos += 1
+                if local.latencia:
+                    time.sleep(local.latencia)
+                ruta = urlparse(self.path).path
+                if ruta == '/rest/v1/stats':
+                    return self.responder(200, json.dumps(local.stats).encode('utf-8'), 'application/json')
+                if ruta.startswith('/rest/v1/'):
+                    filas = list(local.tablas.get(ruta.rsplit('/', 1)[-1], {}).values())
+                    return self.responder(200, json.dumps(filas).encode('utf-8'), 'application/json')
+                if ruta.startswith('/storage/v1/object/public/'):
+                    objeto = ruta.split('/', 6)[-1]
+                    if objeto in local.objetos:
+                        return self.responder_objeto(objeto, local.objetos[objeto])
+                self.responder(404, b'{"error":"not found"}', 'application/json')
+
+            do_HEAD = do_GET
+
+            def do_POST(self):
+                """Insert o upsert de PostgREST (con on_conflict fusiona por esa columna)"""
+                local.pedidos += 1
+                if local.latencia:
+                    time.sleep(local.latencia)
+                url = urlparse(self.path)
+                cuerpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if not url.path.startswith('/rest/v1/'):
+                    return self.responder(404, b'{"error":"not found"}', 'application/json')
+                clave = parse_qs(url.query).get('on_conflict', [None])[0]
+                filas = json.loads(cuerpo or b'[]')
+                filas = filas if isinstance(filas, list) else [filas]
+                if clave and any(clave not in fila for fila in filas):
+                    return self.responder(400, json.dumps({'message': f'falta la clave {clave}'}).encode('utf-8'),
+                                          'application/json')
+                tabla = local.tablas.setdefault(url.path.rsplit('/', 1)[-1], {})
+                for fila in filas:
+                    # Sin on_conflict es un insert: clave autoincremental, como una columna identity
+                    valor = fila[clave] if clave else len(tabla) + 1
+                    tabla[valor] = {**tabla.get(valor, {}), **fila}
+                local.filas_recibidas += len(filas)
+                respuesta = b'' if 'return=minimal' in self.headers.get('Prefer', '') else json.dumps(filas).encode('utf-8')
+                self.responder(201, respuesta, 'application/json')
+
+        return Manejador
+
+    def iniciar(self):
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+# ============================================================
+# APP BAJO PRUEBA
+# ============================================================
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def levantar_app(url_supabase, workers, worker_class, espera=30):
+    """Arranca gunicorn con la configuración del repo; retorna (proceso, url)"""
+    puerto = puerto_libre()
+    entorno = dict(os.environ, SUPABASE_URL=url_supabase, PORT=str(puerto),
+                   WEB_CONCURRENCY=str(workers), GUNICORN_WORKER_CLASS=worker_class)
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=DIRECTORIO_APP, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    url = f"http://127.0.0.1:{puerto}"
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"gunicorn terminó al arrancar:\n{proceso.stderr.read().decode(errors='replace')}")
+        try:
+            requests.get(f"{url}/api/resumen", timeout=1)
+            return proceso, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proceso.terminate()
+    raise RuntimeError("gunicorn no respondió a tiempo")
+
+
+# ============================================================
+# CARGA
+# ============================================================
+
+def percentil(ordenados, p):
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not ordenados:
+        return None
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def cargar_endpoint(url, concurrencia, duracion, esperado=None):
+    """
+    N clientes pidiendo el endpoint en bucle durante 'duracion' segundos
+    esperado: bytes que deben aparecer en la respuesta (si no, cuenta como error)
+    """
+    latencias = [[] for _ in range(concurrencia)]
+    errores = [0] * concurrencia
+    bytes_recibidos = [0] * concurrencia
+    fin = time.monotonic() + duracion
+
+    def cliente(i):
+        sesion = requests.Session()
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            try:
+                # /descargar redirige a Storage: se mide sólo la respuesta de la app
+                respuesta = sesion.get(url, timeout=30, allow_redirects=False)
+                bytes_recibidos[i] += len(respuesta.content)
+                if respuesta.status_code >= 400 or (esperado and esperado not in respuesta.content):
+                    errores[i] += 1
+            except requests.RequestException:
+                errores[i] += 1
+            latencias[i].append((time.perf_counter() - inicio) * 1000)
+        sesion.close()
+
+    hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(concurrencia)]
+    inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.monotonic() - inicio
+
+    ordenadas = sorted(l for parcial in latencias for l in parcial)
+    return {
+        'pedidos': len(ordenadas),
+        'errores': sum(errores),
+        'pedidos_por_segundo': round(len(ordenadas) / transcurrido, 1),
+        'mb_por_segundo': round(sum(bytes_recibidos) / transcurrido / 1e6, 2),
+        'p50_ms': round(percentil(ordenadas, 50) or 0, 1),
+        'p95_ms': round(percentil(ordenadas, 95) or 0, 1),
+        'p99_ms': round(percentil(ordenadas, 99) or 0, 1)
+    }
+
+
+def mostrar(resultados):
+    print(f"\n{'endpoint':<18}{'pedidos':>9}{'errores':>9}{'ped/s':>9}{'MB/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, r in resultados.items():
+        print(f"{endpoint:<18}{r['pedidos']:>9}{r['errores']:>9}{r['pedidos_por_segundo']:>9}"
+              f"{r['mb_por_segundo']:>8}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
+
+
+def comparar(resultados, ruta_base, tolerancia=TOLERANCIA):
+    """Lista de regresiones de p95 (o de errores) respecto de una corrida guardada"""
+    with open(ruta_base, encoding='utf-8') as f:
+        base = json.load(f)['endpoints']
+    regresiones = []
+    for endpoint, actual in resultados.items():
+        anterior = base.get(endpoint)
+        if anterior is None:
+            continue
+        if actual['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia):
+            regresiones.append(f"{endpoint}: p95 {anterior['p95_ms']} → {actual['p95_ms']} ms")
+        if actual['errores'] > anterior['errores']:
+            regresiones.append(f"{endpoint}: errores {anterior['errores']} → {actual['errores']}")
+    return regresiones
+
+
+# ============================================================
+# PERSISTENCIA
+# ============================================================
+
+def detecciones_sinteticas(filas=FILAS_PERSISTENCIA):
+    """(detecciones, evolución diaria) con las columnas que usa persistencia.py"""
+    import pandas as pd
+
+    indices = pd.RangeIndex(filas)
+    df = pd.DataFrame({
+        'latitude': -38.0 - (indices % 500) * 0.01,
+        'longitude': -70.0 - (indices // 500) * 0.01,
+        'acq_date': pd.Timestamp('2026-01-01') + pd.to_timedelta(indices % 30, unit='D'),
+        'acq_time': (indices % 24) * 100,
+        'confidence': 80,
+        'frp': 10.0 + indices % 7,
+        'indice_riesgo': 20.0 + indices % 60
+    })
+    evolucion = (df.groupby('acq_date').agg(focos_nuevos=('frp', 'size'), frp_total=('frp', 'sum'))
+                 .reset_index())
+    evolucion['focos_acumulados'] = evolucion['focos_nuevos'].cumsum()
+    return df, evolucion
+
+
+def prueba_persistencia(filas=FILAS_PERSISTENCIA, lote=LOTE_PERSISTENCIA):
+    """
+    persistir contra el Supabase local: primera corrida, repetición sin cambios y una
+    fila cambiada. Retorna la lista de controles que no se cumplieron
+    """
+    from supabase import create_client
+    import persistencia
+
+    df, evolucion = detecciones_sinteticas(filas)
+    supabase = SupabaseLocal({}).iniciar()
+    cliente = create_client(supabase.url, SUPABASE_KEY)
+    fallas = []
+
+    def corrida(nombre, df, pedidos_esperados, filas_esperadas):
+        tablas = {
+            'detecciones': ('id', persistencia.filas_detecciones(df)),
+            'focos_diarios': ('fecha', persistencia.filas_diarias(df, evolucion))
+        }
+        pedidos, recibidas = supabase.pedidos, supabase.filas_recibidas
+        inicio = time.perf_counter()
+        persistencia.persistir(cliente, tablas, destino=supabase.url, ruta_estado=ruta_estado, lote=lote)
+        pedidos, recibidas = supabase.pedidos - pedidos, supabase.filas_recibidas - recibidas
+        ok = pedidos == pedidos_esperados and recibidas == filas_esperadas
+        print(f"{'✅' if ok else '❌'} {nombre}: {pedidos} pedidos y {recibidas} filas "
+              f"(esperados {pedidos_esperados} y {filas_esperadas}) en {time.perf_counter() - inicio:.2f} s")
+        if not ok:
+            fallas.append(nombre)
+
+    dias = len(evolucion)
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta_estado = os.path.join(directorio, 'persistencia_estado.json')
+            corrida("primera corrida", df, -(-filas // lote) + -(-dias // lote), filas + dias)
+            if len(supabase.tablas.get('detecciones', {})) != filas:
+                fallas.append("filas en la tabla detecciones")
+            corrida("repetición sin cambios", df, 0, 0)
+
+            cambiado = df.copy()
+            cambiado.loc[0, 'frp'] += 1
+            corrida("una detección cambiada", cambiado, 1, 1)
+            fila = supabase.tablas['detecciones'].get(persistencia.id_deteccion(cambiado.iloc[:1])[0], {})
+            if fila.get('frp') != cambiado.loc[0, 'frp']:
+                fallas.append("valor actualizado en la tabla detecciones")
+    finally:
+        supabase.detener()
+    return fallas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de los endpoints de la app")
+    parser.add_argument('--concurrencia', type=int, default=20, help="clientes simultáneos")
+    parser.add_argument('--duracion', type=float, default=10, help="segundos por endpoint")
+    parser.add_argument('--endpoints', nargs='*', default=ENDPOINTS)
+    parser.add_argument('--workers', type=int, default=2, help="workers de gunicorn")
+    parser.add_argument('--worker-class', default='gevent')
+    parser.add_argument('--latencia-storage-ms', type=float, default=0,
+                        help="demora agregada a cada respuesta del Supabase local")
+    parser.add_argument('--url', help="app ya levantada (no se arranca gunicorn ni el Supabase local)")
+    parser.add_argument('--guardar', help="guardar los resultados en un JSON")
+    parser.add_argument('--comparar', help="JSON de una corrida anterior")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA)
+    parser.add_argument('--permitir-errores', action='store_true',
+                        help="terminar con código 0 aunque haya pedidos con error")
+    parser.add_argument('--persistencia', action='store_true',
+                        help="verificar los upserts incrementales de persistencia.py en lugar de la carga")
+    args = parser.parse_args()
+
+    if args.persistencia:
+        fallas = prueba_persistencia()
+        if fallas:
+            print("\n❌ Controles de persistencia fallidos:")
+            for falla in fallas:
+                print(f"   {falla}")
+            sys.exit(1)
+        print("\n✅ Persistencia incremental verificada")
+        sys.exit(0)
+
+    supabase = proceso = None
+    if args.url:
+        url = args.url.rstrip('/')
+    else:
+        supabase = SupabaseLocal(artefactos_sinteticos(), args.latencia_storage_ms).iniciar()
+        print(f"🗄️  Supabase local en {supabase.url}")
+        proceso, url = levantar_app(supabase.url, args.workers, args.worker_class)
+        print(f"🚀 gunicorn ({args.workers} workers {args.worker_class}) en {url}")
+
+    resultados = {}
+    try:
+        for endpoint in args.endpoints:
+            print(f"🔨 {endpoint}: {args.concurrencia} clientes durante {args.duracion:g} s...")
+            # La página principal atrapa los errores de Supabase y responde 200: se valida el contenido
+            esperado = TOTAL_FOCOS_LOCAL.encode() if endpoint == '/' and supabase is not None else None
+            resultados[endpoint] = cargar_endpoint(url + endpoint, args.concurrencia, args.duracion, esperado)
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait(timeout=10)
+        if supabase is not None:
+            supabase.detener()
+
+    mostrar(resultados)
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump({'parametros': vars(args), 'endpoints': resultados}, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.guardar}")
+    fallidos = [f"{endpoint}: {r['errores']} de {r['pedidos']} pedidos con error"
+                for endpoint, r in resultados.items() if r['errores']]
+    if fallidos:
+        print("\n❌ Endpoints con errores:")
+        for fallido in fallidos:
+            print(f"   {fallido}")
+    if args.comparar:
+        regresiones = comparar(resultados, args.comparar, args.tolerancia)
+        if regresiones:
+            print("\n❌ Regresiones:")
+            for regresion in regresiones:
+                print(f"   {regresion}")
+            sys.exit(1)
+        print(f"\n✅ Sin regresiones respecto de {args.comparar}")
+    if fallidos and not args.permitir_errores:
+        sys.exit(1)
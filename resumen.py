@@ -0,0 +1,104 @@
+"""
+Resumen único de una corrida
+
+calcular_resumen recorre las detecciones una sola vez (describe + value_counts)
+y la evolución diaria una vez (idxmax). El resultado es un dict serializable a
+JSON que leen el reporte de consola, las pestañas de resumen del Excel, la fila
+de la tabla 'stats' y el dashboard (resumen.json publicado en Storage).
+"""
+from datetime import datetime, timedelta
+
+# Columnas numéricas resumidas con describe()
+COLUMNAS_NUMERICAS = ['frp', 'confidence', 'indice_riesgo',
+                      'viento_kmh', 'humedad_relativa', 'temperatura_c', 'lluvia_7d_mm']
+
+# Niveles siempre presentes en el conteo (aunque tengan 0 focos)
+NIVELES = ['BAJO', 'MODERADO', 'ALTO', 'MUY ALTO', 'EXTREMO']
+
+# Índice a partir del cual un foco cuenta como riesgo ALTO o superior
+UMBRAL_RIESGO_ALTO = 40
+
+
+def _valor(x, decimales=1):
+    """float redondeado (None si no es un número)"""
+    try:
+        return round(float(x), decimales)
+    except (TypeError, ValueError):
+        return None
+
+
+def calcular_resumen(df, evolucion, ahora=None):
+    """Agregados de la corrida en una sola pasada"""
+    ahora = ahora or datetime.now()
+    total = len(df)
+    numericas = [c for c in COLUMNAS_NUMERICAS if c in df.columns]
+    estadisticas = df[numericas].describe() if total else None
+
+    def estadistica(columna, fila='mean', decimales=1):
+        if estadisticas is None or columna not in estadisticas:
+            return None
+        return _valor(estadisticas.at[fila, columna], decimales)
+
+    # Conteo por nivel; el predominante es el más frecuente (en empate, el primero alfabético, como mode())
+    conteo = df['nivel_riesgo'].value_counts() if 'nivel_riesgo' in df else None
+    if conteo is not None and len(conteo):
+        predominante = conteo[conteo == conteo.max()].index.min()
+    else:
+        predominante = "N/A"
+    focos_por_nivel = {nivel: 0 for nivel in NIVELES}
+    if conteo is not None:
+        focos_por_nivel.update({str(nivel): int(cantidad) for nivel, cantidad in conteo.items()})
+
+    focos_riesgo_alto = int((df['indice_riesgo'] >= UMBRAL_RIESGO_ALTO).sum()) if 'indice_riesgo' in df else 0
+    resumen = {
+        'generado': ahora.isoformat(timespec='seconds'),
+        'total_detecciones': total,
+        'detecciones_alta_confianza': int((df['confidence'] >= 70).sum()) if total else 0,
+        'fecha_inicio': df['acq_date'].min().strftime('%Y-%m-%d') if total else None,
+        'fecha_fin': df['acq_date'].max().strftime('%Y-%m-%d') if total else None,
+        'dias_totales': (df['acq_date'].max() - df['acq_date'].min()).days + 1 if total else 0,
+        'frp_promedio': estadistica('frp'),
+        'frp_maximo': estadistica('frp', 'max'),
+        'confianza_promedio': estadistica('confidence'),
+        'indice_riesgo_promedio': estadistica('indice_riesgo'),
+        'nivel_predominante': predominante,
+        'focos_por_nivel': focos_por_nivel,
+        # Sólo con límites provinciales cargados (ver territorio.py)
+        'focos_por_provincia': ({str(p): int(c) for p, c in df['provincia'].value_counts().items()}
+                                if 'provincia' in df else {}),
+        'focos_riesgo_alto': focos_riesgo_alto,
+        'porcentaje_riesgo_alto': _valor(focos_riesgo_alto / total * 100) if total else 0.0,
+        'meteo_promedio': {
+            columna: estadistica(columna)
+            for columna in ('viento_kmh', 'humedad_relativa', 'temperatura_c', 'lluvia_7d_mm')
+        },
+        'superficie_estimada_ha': 0,
+        'dia_mas_focos': None,
+        'max_focos_dia': 0
+    }
+
+    if evolucion is not None and not evolucion.empty:
+        pico = evolucion['focos_nuevos'].idxmax()
+        resumen['superficie_estimada_ha'] = _valor(evolucion['superficie_estimada_ha'].iloc[-1], 0)
+        resumen['dia_mas_focos'] = evolucion.at[pico, 'acq_date'].strftime('%Y-%m-%d')
+        resumen['max_focos_dia'] = int(evolucion.at[pico, 'focos_nuevos'])
+
+    return resumen
+
+
+def fecha_corta(iso):
+    """'AAAA-MM-DD' → 'DD/MM/AAAA' (o 'N/A')"""
+    return datetime.strptime(iso, '%Y-%m-%d').strftime('%d/%m/%Y') if iso else "N/A"
+
+
+def fila_stats(resumen):
+    """Fila de la tabla 'stats' que muestra el dashboard"""
+    return {
+        "id": 1,
+        "total_focos": str(resumen['total_detecciones']),
+        "riesgo_avg": resumen['nivel_predominante'],
+        "intensidad_max": f"{resumen['frp_promedio'] or 0:.1f} MW",
+        "area_critica": f"{resumen['superficie_estimada_ha'] or 0:,.0f} ha",
+        # Hora de Argentina (UTC-3)
+        "ultima_actualizacion": (datetime.now() - timedelta(hours=3)).strftime("%d/%m/%Y %H:%M")
+    }
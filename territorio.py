@@ -0,0 +1,184 @@
+"""
+Clasificación de detecciones por país y provincia con los polígonos de límites
+
+Los límites se leen de un GeoJSON local (LIMITES_PROVINCIAS, por defecto
+datos/provincias.geojson): una Feature Polygon o MultiPolygon por provincia,
+con la propiedad 'nombre'. Un punto está en Argentina si cae en alguna
+provincia. Sirve la capa de provincias del IGN exportada a GeoJSON,
+conviene simplificada a ~100 m: el test exacto recorre todos los vértices.
+
+El archivo no viene con el repositorio: hay que descargarlo y copiarlo en
+cada despliegue. Mientras falte, incendios_v2.filtrar_territorio avisa en cada
+corrida y usa el corte aproximado por longitud, sin provincias.
+
+Al cargar se precalcula una grilla sobre la zona de monitoreo: cada celda queda
+dentro de una provincia, fuera de todas, o de borde (la toca algún lado de un
+polígono). Los puntos de celdas interiores o exteriores se resuelven con una
+consulta a la grilla; sólo los de celdas de borde (o fuera de la grilla) pagan
+el test exacto de punto en polígono (geometria.dentro_anillo).
+"""
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from geometria import dentro_anillo
+
+DIRECTORIO_DATOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos')
+ARCHIVO_LIMITES = os.environ.get("LIMITES_PROVINCIAS", os.path.join(DIRECTORIO_DATOS, 'provincias.geojson'))
+
+# Lado de las celdas de la grilla precalculada (grados)
+PASO_GRILLA = 0.05
+
+# Tope de la matriz puntos × vértices de cada test exacto (define el tamaño de los lotes)
+ELEMENTOS_POR_LOTE = 2_000_000
+
+# Valores de la grilla que no son una provincia
+FUERA = -1
+BORDE = -2
+
+_cargados = {}
+
+
+class Territorio:
+    """Provincias con una grilla precalculada de celdas interiores, exteriores y de borde"""
+
+    def __init__(self, provincias, bounds, paso=PASO_GRILLA):
+        """
+        provincias: lista de (nombre, [polígono, ...]); cada polígono es [exterior, agujero, ...]
+                    con anillos (m, 2) [lon, lat] como en GeoJSON
+        bounds: 'oeste,sur,este,norte' de la grilla (la zona de monitoreo)
+        """
+        self.nombres = [nombre for nombre, _ in provincias]
+        self.poligonos = [poligonos for _, poligonos in provincias]
+        self.paso = paso
+        self.lon_min, self.lat_min, lon_max, lat_max = (float(v) for v in bounds.split(','))
+        self.columnas = int(np.ceil((lon_max - self.lon_min) / paso))
+        self.filas = int(np.ceil((lat_max - self.lat_min) / paso))
+        # Índice FUERA (-1) → None: provincia de cada clasificación por indexado directo
+        self._nombres_o_nada = np.array(self.nombres + [None], dtype=object)
+        self.celdas = self._precalcular()
+
+    @classmethod
+    def desde_geojson(cls, ruta, bounds):
+        with open(ruta, encoding='utf-8') as f:
+            features = json.load(f).get('features', [])
+        provincias = []
+        for feature in features:
+            geometria = feature.get('geometry') or {}
+            if geometria.get('type') == 'Polygon':
+                partes = [geometria['coordinates']]
+            elif geometria.get('type') == 'MultiPolygon':
+                partes = geometria['coordinates']
+            else:
+                continue
+            propiedades = feature.get('properties') or {}
+            nombre = propiedades.get('nombre') or propiedades.get('name') or f"provincia {len(provincias) + 1}"
+            provincias.append((nombre, [[np.asarray(anillo, dtype=float)[:, :2] for anillo in poligono]
+                                        for poligono in partes]))
+        return cls(provincias, bounds) if provincias else None
+
+    def _celda(self, lat, lon):
+        return (np.floor((np.asarray(lat) - self.lat_min) / self.paso).astype(int),
+                np.floor((np.asarray(lon) - self.lon_min) / self.paso).astype(int))
+
+    def _anillos(self):
+        for poligonos in self.poligonos:
+            for poligono in poligonos:
+                yield from poligono
+
+    def _precalcular(self):
+        forma = (self.filas, self.columnas)
+        borde = np.zeros(forma, dtype=bool)
+
+        # Celdas de borde: las de la caja de cada lado (los lados largos marcan de más, nunca de menos)
+        for anillo in self._anillos():
+            siguiente = np.roll(anillo, -1, axis=0)
+            f0, c0 = self._celda(np.minimum(anillo[:, 1], siguiente[:, 1]), np.minimum(anillo[:, 0], siguiente[:, 0]))
+            f1, c1 = self._celda(np.maximum(anillo[:, 1], siguiente[:, 1]), np.maximum(anillo[:, 0], siguiente[:, 0]))
+            f0, c0 = np.clip(f0, 0, self.filas), np.clip(c0, 0, self.columnas)
+            f1, c1 = np.clip(f1, -1, self.filas - 1), np.clip(c1, -1, self.columnas - 1)
+            alto, ancho = f1 - f0, c1 - c0
+            chicos = (alto <= 2) & (ancho <= 2)
+            for df in range(3):
+                for dc in range(3):
+                    marcar = chicos & (df <= alto) & (dc <= ancho)
+                    borde[f0[marcar] + df, c0[marcar] + dc] = True
+            for i in np.flatnonzero(~chicos & (alto >= 0) & (ancho >= 0)):
+                borde[f0[i]:f1[i] + 1, c0[i]:c1[i] + 1] = True
+
+        # Un tramo horizontal de celdas libres no lo cruza ningún lado: un solo test por tramo
+        libres = ~borde
+        inicios = libres & ~np.concatenate([np.zeros((self.filas, 1), dtype=bool), libres[:, :-1]], axis=1)
+        filas, columnas = np.nonzero(inicios)
+        if not len(filas):
+            return np.full(forma, BORDE, dtype=np.int16)
+        clases = self._exacto(self.lat_min + (filas + 0.5) * self.paso,
+                              self.lon_min + (columnas + 0.5) * self.paso)
+        tramo = np.cumsum(inicios.ravel()).reshape(forma) - 1
+        return np.where(libres, clases[tramo], BORDE).astype(np.int16)
+
+    def _exacto(self, lat, lon):
+        """Test exacto de punto en polígono: índice de provincia o FUERA"""
+        lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+        resultado = np.full(len(lat), FUERA, dtype=np.int16)
+        for indice, poligonos in enumerate(self.poligonos):
+            for poligono in poligonos:
+                exterior = poligono[0]
+                (oeste, sur), (este, norte) = exterior.min(axis=0), exterior.max(axis=0)
+                candidatos = np.flatnonzero((resultado == FUERA) & (lat >= sur) & (lat <= norte)
+                                            & (lon >= oeste) & (lon <= este))
+                lote = max(1, ELEMENTOS_POR_LOTE // len(exterior))
+                for inicio in range(0, len(candidatos), lote):
+                    puntos = candidatos[inicio:inicio + lote]
+                    adentro = dentro_anillo(lat[puntos], lon[puntos], exterior)
+                    for agujero in poligono[1:]:
+                        adentro &= ~dentro_anillo(lat[puntos], lon[puntos], agujero)
+                    resultado[puntos[adentro]] = indice
+        return resultado
+
+    def clasificar(self, lat, lon):
+        """Índice de provincia de cada punto (FUERA si no está en ninguna)"""
+        lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+        filas, columnas = self._celda(lat, lon)
+        en_grilla = (filas >= 0) & (filas < self.filas) & (columnas >= 0) & (columnas < self.columnas)
+        resultado = np.full(len(lat), BORDE, dtype=np.int16)
+        resultado[en_grilla] = self.celdas[filas[en_grilla], columnas[en_grilla]]
+        exactos = np.flatnonzero(resultado == BORDE)
+        resultado[exactos] = self._exacto(lat[exactos], lon[exactos])
+        return resultado
+
+    def provincias(self, lat, lon):
+        """Nombre de la provincia de cada punto (None fuera de Argentina)"""
+        return self._nombres_o_nada[self.clasificar(lat, lon)]
+
+    def resumen(self):
+        bordes = int((self.celdas == BORDE).sum())
+        return (f"{len(self.nombres)} provincias, grilla de {self.filas}x{self.columnas} celdas "
+                f"({bordes / self.celdas.size:.0%} de borde)")
+
+
+def huella_limites(ruta=ARCHIVO_LIMITES):
+    """Hash del archivo de límites (None si no existe): invalida las etapas que lo usan"""
+    try:
+        with open(ruta, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except OSError:
+        return None
+
+
+def cargar_territorio(bounds, ruta=ARCHIVO_LIMITES):
+    """
+    Territorio para una zona, precalculado una vez por proceso y por versión del archivo
+    None si no hay archivo de límites
+    """
+    huella = huella_limites(ruta)
+    if huella is None:
+        return None
+    clave = (ruta, huella, bounds)
+    if clave not in _cargados:
+        _cargados[clave] = Territorio.desde_geojson(ruta, bounds)
+        if _cargados[clave] is not None:
+            print(f"🗺️  Límites provinciales: {_cargados[clave].resumen()}")
+    return _cargados[clave]
@@ -0,0 +1,55 @@
+"""
+Cliente de Supabase para los workers web (gunicorn con gevent)
+
+El cliente de supabase usa httpx, y el transporte por defecto de httpx (httpcore)
+importa trio si está instalado. Con gevent, trio no se puede importar: el módulo
+'select' parchado no tiene epoll. El resultado es que todas las consultas fallan.
+Este cliente le da a httpx un transporte sobre requests, que ya usa la app para
+Storage. Así httpcore no se importa nunca, y los sockets de requests ceden el
+control al hub de gevent como cualquier otro.
+
+El pipeline corre fuera de gevent y sigue usando el cliente por defecto.
+"""
+import httpx
+import requests
+
+# (conexión, lectura) en segundos cuando el pedido no trae su propio timeout
+TIMEOUT_POR_DEFECTO = (5, 30)
+
+
+class TransporteRequests(httpx.BaseTransport):
+    """Transporte síncrono de httpx que hace cada pedido con una sesión de requests"""
+
+    def __init__(self):
+        self.sesion = requests.Session()
+
+    def handle_request(self, pedido):
+        limites = pedido.extensions.get('timeout') or {}
+        timeout = (limites.get('connect') or TIMEOUT_POR_DEFECTO[0], limites.get('read') or TIMEOUT_POR_DEFECTO[1])
+        try:
+            respuesta = self.sesion.request(
+                pedido.method, str(pedido.url),
+                headers=dict(pedido.headers), data=pedido.read() or None,
+                timeout=timeout, allow_redirects=False
+            )
+        except requests.Timeout as e:
+            raise httpx.TimeoutException(str(e), request=pedido) from e
+        except requests.RequestException as e:
+            raise httpx.ConnectError(str(e), request=pedido) from e
+        # requests ya descomprimió el cuerpo: no se pasan las cabeceras que lo describían comprimido
+        cabeceras = [(nombre, valor) for nombre, valor in respuesta.headers.items()
+                     if nombre.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')]
+        return httpx.Response(respuesta.status_code, headers=cabeceras, content=respuesta.content,
+                              request=pedido)
+
+    def close(self):
+        self.sesion.close()
+
+
+def crear_cliente(url, clave):
+    """Cliente de Supabase cuyas consultas (PostgREST, Storage, Auth) van por TransporteRequests"""
+    from supabase import create_client, ClientOptions
+
+    timeout = httpx.Timeout(TIMEOUT_POR_DEFECTO[1], connect=TIMEOUT_POR_DEFECTO[0])
+    http = httpx.Client(transport=TransporteRequests(), timeout=timeout)
+    return create_client(url, clave, options=ClientOptions(httpx_client=http))
@@ -0,0 +1,81 @@
+"""
+Control del tiempo de arranque de la app web
+
+Importa app.py en un proceso limpio con `python -X importtime` y falla (exit 1)
+si el import supera el presupuesto o si arrastra módulos pesados que deben
+quedar en el proceso del pipeline.
+
+Uso:
+    python verificar_arranque.py                  # presupuesto por defecto
+    python verificar_arranque.py --presupuesto-ms 300 --repeticiones 5
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Módulos que el worker web no debe importar al arrancar
+MODULOS_PROHIBIDOS = ('pandas', 'numpy', 'pyarrow', 'folium', 'plotly', 'supabase', 'openpyxl',
+                      'incendios_v2', 'pipeline')
+
+PRESUPUESTO_MS = int(os.environ.get("PRESUPUESTO_ARRANQUE_MS", 400))
+
+
+def medir_import(modulo='app'):
+    """Milisegundos acumulados del import y lista de módulos cargados"""
+    codigo = f"import json, sys; import {modulo}; print(json.dumps(sorted(sys.modules)))"
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True
+    )
+    if resultado.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {modulo}:\n{resultado.stderr}")
+
+    # Formato de -X importtime: "import time: <propio> | <acumulado> | <módulo>"
+    total_us = None
+    for linea in resultado.stderr.splitlines():
+        partes = linea.split('|')
+        if len(partes) == 3 and partes[2].strip() == modulo:
+            total_us = int(partes[1].strip())
+    if total_us is None:
+        raise RuntimeError(f"No se encontró la medición de {modulo} en la salida de importtime")
+
+    return total_us / 1000, json.loads(resultado.stdout.strip().splitlines()[-1])
+
+
+def verificar(presupuesto_ms=PRESUPUESTO_MS, repeticiones=3):
+    """Retorna True si el arranque respeta el presupuesto y no importa módulos pesados"""
+    mediciones = []
+    modulos = []
+    for _ in range(repeticiones):
+        ms, modulos = medir_import()
+        mediciones.append(ms)
+
+    # El mínimo descarta ruido de caché de disco y otros procesos
+    mejor = min(mediciones)
+    prohibidos = sorted({m.split('.')[0] for m in modulos} & set(MODULOS_PROHIBIDOS))
+
+    print(f"⏱️  import app: {mejor:.1f} ms (mediciones: {', '.join(f'{m:.0f}' for m in mediciones)} ms)")
+    print(f"   Presupuesto: {presupuesto_ms} ms")
+
+    ok = True
+    if mejor > presupuesto_ms:
+        print(f"❌ El arranque supera el presupuesto por {mejor - presupuesto_ms:.1f} ms")
+        ok = False
+    if prohibidos:
+        print(f"❌ Módulos pesados importados al arrancar: {', '.join(prohibidos)}")
+        ok = False
+    if ok:
+        print("✅ Arranque dentro del presupuesto")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Control del tiempo de arranque de app.py")
+    parser.add_argument('--presupuesto-ms', type=int, default=PRESUPUESTO_MS)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    sys.exit(0 if verificar(args.presupuesto_ms, args.repeticiones) else 1)